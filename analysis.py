@@ -1,70 +1,179 @@
-import torch
-from transformers import pipeline
-from utils import log_error, clean_input_text
+import os
+from utils import log_error, clean_input_text, is_usable_author, incrementar_contador
 from file_types import RESPUESTA_IA_NO_ENCONTRADA, QUESTIONS_AUTHOR_VARIATIONS
+from models import registrar_modelo, obtener_modelo
+from metrics import medir
+from author_rules import extraer_autor_reglas, UMBRAL_CONFIANZA_REGLAS
+from context_selector import seleccionar_contexto, estimar_tokens, PRESUPUESTO_TOKENS_CONTEXTO
 
 QUESTION_AUTHOR = "¿Quién es el autor del libro?"
 MAX_CHARACTERS = 15000
+QA_MODEL = "mrm8488/bert-base-spanish-wwm-cased-finetuned-spa-squad2-es"
+NER_MODEL = "dccuchile/bert-base-spanish-wwm-cased-finetuned-ner"
+# Niveles de la cascada, del más barato al más caro, con los que se puede resolver un autor
+ETAPAS_AUTOR = ['metadata', 'reglas', 'qa', 'ner', 'reglas_baja_confianza', 'sin_autor', 'error']
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-torch.backends.cudnn.benchmark = True
-if device == "cuda":
-    torch.cuda.set_per_process_memory_fraction(0.9)
-else:
-    torch.set_num_threads(os.cpu_count())
-
-tqa_pipeline = pipeline(
-    "question-answering",
-    model="mrm8488/bert-base-spanish-wwm-cased-finetuned-spa-squad2-es",
-    tokenizer="mrm8488/bert-base-spanish-wwm-cased-finetuned-spa-squad2-es",
-    device=0 if device == "cuda" else -1,
-    clean_up_tokenization_spaces=False
-)
-
-ner_pipeline = pipeline(
-    "ner",
-    model="dccuchile/bert-base-spanish-wwm-cased-finetuned-ner",
-    device=0 if device == "cuda" else -1
-)
+# Backend de inferencia en CPU: PyTorch normal, PyTorch con capas lineales cuantizadas a int8
+# o una sesión de ONNX Runtime exportada con optimum
+BACKENDS_INFERENCIA = ['eager', 'int8', 'onnx']
+ONNX_DIR = 'modelos_onnx'
+backend_inferencia = 'eager'
+# Hilos intra-op de inferencia; None usa todos los núcleos
+hilos_inferencia = None
 
-def extract_author_using_ner(text):
-    ner_results = ner_pipeline(text)
+def configurar_inferencia(backend='eager', hilos=None):
+    # Debe llamarse antes de la primera carga de 'qa' o 'ner'; los workers creados después heredan la configuración
+    global backend_inferencia, hilos_inferencia
+    if backend not in BACKENDS_INFERENCIA:
+        raise ValueError(f"Backend de inferencia desconocido: {backend}")
+    backend_inferencia = backend
+    hilos_inferencia = hilos
+
+def _threads():
+    return hilos_inferencia or os.cpu_count()
+
+def _configure_device():
+    import torch
+    device = "cuda" if torch.cuda.is_available() and backend_inferencia == 'eager' else "cpu"
+    torch.backends.cudnn.benchmark = True
+    if device == "cuda":
+        torch.cuda.set_per_process_memory_fraction(0.9)
+    else:
+        torch.set_num_threads(_threads())
+    return device
+
+def _load_onnx(model_class, model_name):
+    import onnxruntime
+    from optimum import onnxruntime as optimum_ort
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = _threads()
+    options.inter_op_num_threads = 1
+    ort_class = getattr(optimum_ort, f"ORT{model_class}")
+    export_dir = os.path.join(ONNX_DIR, model_name.replace('/', '__'))
+    # The export runs once; later loads read the saved ONNX graph
+    if os.path.isdir(export_dir):
+        return ort_class.from_pretrained(export_dir, session_options=options)
+    model = ort_class.from_pretrained(model_name, export=True, session_options=options)
+    model.save_pretrained(export_dir)
+    return model
+
+def _load_pipeline(task, model_name, model_class, **kwargs):
+    import transformers
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+    if backend_inferencia == 'onnx':
+        return transformers.pipeline(task, model=_load_onnx(model_class, model_name), tokenizer=tokenizer, **kwargs)
+
+    device = _configure_device()
+    model = getattr(transformers, f"Auto{model_class}").from_pretrained(model_name)
+    if backend_inferencia == 'int8':
+        import torch
+        # Dynamic quantization only runs on CPU
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return transformers.pipeline(task, model=model, tokenizer=tokenizer, device=0 if device == "cuda" else -1, **kwargs)
+
+def _load_qa():
+    return _load_pipeline("question-answering", QA_MODEL, "ModelForQuestionAnswering", clean_up_tokenization_spaces=False)
+
+def _load_ner():
+    return _load_pipeline("ner", NER_MODEL, "ModelForTokenClassification")
+
+registrar_modelo('qa', _load_qa)
+registrar_modelo('ner', _load_ner)
+
+def authors_from_ner_results(ner_results):
     author_candidates = [entity['word'] for entity in ner_results if 'PER' in entity['entity']]
     if author_candidates:
         return ' '.join(author_candidates)
     return None
 
-def extract_authors_batch(text, author, ruta_archivo, metadata, batch_size):
-    try:
-        if author:
-            log_error(ruta_archivo, "Author metadata already provided.")
-            return author
-
-        text = clean_input_text(text)
-        if len(text) < 100:
-            log_error(ruta_archivo, "Text too short for meaningful analysis.")
-            return None
-
-        context_with_metadata = f"Título: {metadata.get('title', '')}, Archivo: {metadata.get('filename', '')}\n\n{text}"
-
-        for question in QUESTIONS_AUTHOR_VARIATIONS:
-            qa_inputs = {'context': context_with_metadata, 'question': question}
-
-            try:
-                answer = tqa_pipeline(qa_inputs).get('answer', None)
-                if answer and answer.lower() not in RESPUESTA_IA_NO_ENCONTRADA:
-                    log_error(ruta_archivo, f"Answer found with question '{question}'")
-                    return answer
-            except Exception as e:
-                log_error(ruta_archivo, f"Error processing QA for question '{question}': {e}")
-
-        author_from_ner = extract_author_using_ner(text)
-        if author_from_ner:
-            log_error(ruta_archivo, "Author found using NER.")
-            return author_from_ner
-
-        log_error(ruta_archivo, "No se pudo determinar el autor.")
-        return None
-    except Exception as e:
-        log_error(ruta_archivo, f"Exception in extract_authors_batch: {e}")
-        return None
+def extract_author_using_ner(text):
+    return authors_from_ner_results(obtener_modelo('ner')(text))
+
+def extract_authors_batch(textos, autores, rutas_archivos, metadatas, batch_size, presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO):
+    resultados = [(None, 'error')] * len(textos)
+    pendientes = {}
+    # Candidatos de las reglas que no alcanzaron el umbral; se usan si los modelos tampoco encuentran autor
+    candidatos_reglas = {}
+
+    for idx, (text, author, ruta_archivo, metadata) in enumerate(zip(textos, autores, rutas_archivos, metadatas)):
+        try:
+            if is_usable_author(author):
+                log_error(ruta_archivo, "Author metadata already provided.")
+                resultados[idx] = (author, 'metadata')
+                continue
+
+            with medir('reglas', ruta_archivo):
+                autor_reglas, confianza, reglas = extraer_autor_reglas(text or '', metadata.get('filename') or os.path.basename(ruta_archivo))
+            if confianza >= UMBRAL_CONFIANZA_REGLAS:
+                log_error(ruta_archivo, f"Author found using rules ({', '.join(reglas)}, confidence {confianza}).")
+                resultados[idx] = (autor_reglas, 'reglas')
+                continue
+            if autor_reglas:
+                candidatos_reglas[idx] = autor_reglas
+
+            text = clean_input_text(text, solo_ascii=False)
+            if len(clean_input_text(text)) < 100:
+                log_error(ruta_archivo, "Text too short for meaningful analysis.")
+                resultados[idx] = (candidatos_reglas[idx], 'reglas_baja_confianza') if idx in candidatos_reglas else (None, 'sin_autor')
+                continue
+
+            # Only the highest-ranked windows go to the models, so QA and NER see a few hundred tokens instead of the whole text.
+            # Windows are scored before the non-ASCII stripping so '©' and accented cues and names still count.
+            contexto, tokens = seleccionar_contexto(text, presupuesto_tokens)
+            contexto = clean_input_text(contexto)
+            incrementar_contador("contexto_documentos")
+            incrementar_contador("contexto_tokens_originales", estimar_tokens(text))
+            incrementar_contador("contexto_tokens_enviados", tokens)
+            pendientes[idx] = (contexto, f"Título: {metadata.get('title', '')}, Archivo: {metadata.get('filename', '')}\n\n{contexto}")
+        except Exception as e:
+            log_error(ruta_archivo, f"Exception in extract_authors_batch: {e}")
+
+    # Each question is asked to every still-unresolved document in a single batched call,
+    # so documents answered by an earlier question are not sent again.
+    for question in QUESTIONS_AUTHOR_VARIATIONS:
+        if not pendientes:
+            break
+        indices = list(pendientes)
+        qa_inputs = [{'context': pendientes[idx][1], 'question': question} for idx in indices]
+        try:
+            with medir('qa', archivos=len(qa_inputs)):
+                answers = obtener_modelo('qa')(qa_inputs, batch_size=batch_size)
+            if isinstance(answers, dict):
+                answers = [answers]
+        except Exception as e:
+            for idx in indices:
+                log_error(rutas_archivos[idx], f"Error processing QA for question '{question}': {e}")
+            continue
+
+        for idx, result in zip(indices, answers):
+            answer = result.get('answer', None)
+            if answer and answer.lower() not in RESPUESTA_IA_NO_ENCONTRADA:
+                log_error(rutas_archivos[idx], f"Answer found with question '{question}'")
+                resultados[idx] = (answer, 'qa')
+                del pendientes[idx]
+
+    if pendientes:
+        indices = list(pendientes)
+        try:
+            with medir('ner', archivos=len(indices)):
+                ner_batch = obtener_modelo('ner')([pendientes[idx][0] for idx in indices], batch_size=batch_size)
+            if len(indices) == 1 and (not ner_batch or isinstance(ner_batch[0], dict)):
+                ner_batch = [ner_batch]
+        except Exception as e:
+            for idx in indices:
+                log_error(rutas_archivos[idx], f"Exception in extract_authors_batch: {e}")
+            return resultados
+
+        for idx, ner_results in zip(indices, ner_batch):
+            author_from_ner = authors_from_ner_results(ner_results)
+            if author_from_ner:
+                log_error(rutas_archivos[idx], "Author found using NER.")
+                resultados[idx] = (author_from_ner, 'ner')
+            elif idx in candidatos_reglas:
+                log_error(rutas_archivos[idx], "Author found using low-confidence rules.")
+                resultados[idx] = (candidatos_reglas[idx], 'reglas_baja_confianza')
+            else:
+                log_error(rutas_archivos[idx], "No se pudo determinar el autor.")
+                resultados[idx] = (None, 'sin_autor')
+
+    return resultados
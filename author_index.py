@@ -0,0 +1,84 @@
+import os
+import json
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+SIMILARITY_THRESHOLD = 0.8
+
+def _bigrams(name):
+    return {name[i:i + 2] for i in range(len(name) - 1)}
+
+class AuthorIndex:
+    # With a threshold of at least 0.8, two names of two or more characters can only
+    # exceed it if they share a bigram, so blocking on bigrams never loses a match.
+    # Names shorter than two characters can only match each other.
+
+    def __init__(self, authors=()):
+        self.authors = []
+        self.ids = {}
+        self.postings = defaultdict(list)
+        self.short_ids = []
+        for author in authors:
+            self.add(author)
+
+    def add(self, name):
+        if name in self.ids:
+            return
+        author_id = len(self.authors)
+        self.authors.append(name)
+        self.ids[name] = author_id
+        if len(name) < 2:
+            self.short_ids.append(author_id)
+        else:
+            for bigram in _bigrams(name):
+                self.postings[bigram].append(author_id)
+
+    def _candidates(self, name):
+        if len(name) < 2:
+            return self.short_ids
+        length = len(name)
+        candidates = set()
+        for bigram in _bigrams(name):
+            for author_id in self.postings.get(bigram, ()):
+                if author_id in candidates:
+                    continue
+                other_length = len(self.authors[author_id])
+                if 2.0 * min(length, other_length) / (length + other_length) > SIMILARITY_THRESHOLD:
+                    candidates.add(author_id)
+        return sorted(candidates)
+
+    def best_match(self, name):
+        if name in self.ids:
+            return name
+
+        best_match = None
+        highest_similarity = 0.0
+        for author_id in self._candidates(name):
+            matcher = SequenceMatcher(None, name, self.authors[author_id])
+            if matcher.real_quick_ratio() <= highest_similarity or matcher.quick_ratio() <= highest_similarity:
+                continue
+            sim = matcher.ratio()
+            if sim > highest_similarity:
+                highest_similarity = sim
+                best_match = self.authors[author_id]
+
+        if highest_similarity > SIMILARITY_THRESHOLD:
+            return best_match
+        self.add(name)
+        return name
+
+    def __len__(self):
+        return len(self.authors)
+
+    def save(self, path):
+        temporal = f"{path}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump({'authors': self.authors}, archivo, ensure_ascii=False)
+        os.replace(temporal, path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as archivo:
+            return cls(json.load(archivo).get('authors', []))
@@ -0,0 +1,101 @@
+import os
+import re
+import unicodedata
+from utils import is_usable_author, normalize_author_name
+
+# Confianza mínima para aceptar el autor de las reglas sin consultar a los modelos
+UMBRAL_CONFIANZA_REGLAS = 0.8
+# Solo se examinan las primeras páginas, donde están la portada y la página de créditos
+MAX_CARACTERES_REGLAS = 4000
+# Distancia máxima, en caracteres, entre un © y un ISBN para considerarlos parte de la página de créditos
+DISTANCIA_BLOQUE_ISBN = 400
+
+# Palabra capitalizada o inicial; exigir minúsculas evita tragarse siglas como ISBN en el texto sin saltos de línea
+_PALABRA_NOMBRE = r"(?:[A-ZÁÉÍÓÚÑÜ][a-záéíóúñü'-]+|[A-Z]\.)"
+_PARTICULA = r"(?:de|del|la|las|los|y|da|van|von|di)"
+NOMBRE = rf"{_PALABRA_NOMBRE}(?:\s+(?:{_PARTICULA}\s+)*{_PALABRA_NOMBRE}){{1,4}}"
+
+PATRON_ARCHIVO = re.compile(r"^\s*(?P<autor>[^-–—_()\[\]]{3,80}?)\s+[-–—]\s+\S.*$")
+PATRON_NOMBRE_COMPLETO = re.compile(NOMBRE)
+PATRON_APELLIDO_NOMBRE = re.compile(r"^\s*(?P<apellido>[^,]+),\s*(?P<nombre>[^,]+)$")
+PATRON_ETIQUETA = re.compile(rf"\b(?:Autor(?:a|es)?|Author|Escrito por|Written by)\s*:?\s*(?P<autor>{NOMBRE})")
+PATRON_POR = re.compile(rf"\b(?:por|by)\s+(?P<autor>{NOMBRE})")
+PATRON_COPYRIGHT = re.compile(rf"(?:©|\([cC]\)|\b(?:Copyright|COPYRIGHT|copyright)\b)\s*(?:\d{{4}}\s*[,.-]?\s*)*(?:by\s+|por\s+)?(?P<autor>{NOMBRE})")
+PATRON_ISBN = re.compile(r"\bISBN(?:-1[03])?\s*:?\s*[\dXx][\d\s-]{8,}")
+# Titulares de derechos que no son personas
+PATRON_EDITORIAL = re.compile(r"\b(?:editorial|ediciones|editores|publishing|publishers|press|books|libros|s\.?\s?a\.?|s\.?\s?l\.?|inc|ltd|grupo)\b", re.IGNORECASE)
+
+def _sin_acentos_combinados(texto):
+    # El texto llega normalizado NFKD; se quitan las marcas combinadas para que los patrones vean palabras completas
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+def _parece_nombre(candidato):
+    palabras = candidato.split()
+    if not 2 <= len(palabras) <= 6 or len(candidato) > 60:
+        return False
+    if any(c.isdigit() for c in candidato) or PATRON_EDITORIAL.search(candidato):
+        return False
+    return is_usable_author(candidato)
+
+def regla_nombre_archivo(texto, nombre_archivo):
+    # Muchos archivos se nombran "Título - Autor" o "Título - Subtítulo", así que el nombre de archivo por sí solo
+    # queda por debajo del umbral; solo lo supera si otra regla encuentra en el texto el mismo autor.
+    base = _sin_acentos_combinados(os.path.splitext(nombre_archivo)[0].replace('_', ' '))
+    coincidencia = PATRON_ARCHIVO.match(base)
+    if not coincidencia:
+        return None
+    autor = coincidencia.group('autor').strip()
+    invertido = PATRON_APELLIDO_NOMBRE.match(autor)
+    if invertido:
+        autor = f"{invertido.group('nombre').strip()} {invertido.group('apellido').strip()}"
+    if not PATRON_NOMBRE_COMPLETO.fullmatch(autor):
+        return None
+    return (autor, 0.6) if _parece_nombre(autor) else None
+
+def regla_etiqueta_autor(texto, nombre_archivo):
+    coincidencia = PATRON_ETIQUETA.search(texto)
+    return (coincidencia.group('autor'), 0.9) if coincidencia else None
+
+def regla_por(texto, nombre_archivo):
+    coincidencia = PATRON_POR.search(texto)
+    return (coincidencia.group('autor'), 0.75) if coincidencia else None
+
+def regla_copyright(texto, nombre_archivo):
+    for coincidencia in PATRON_COPYRIGHT.finditer(texto):
+        autor = coincidencia.group('autor')
+        if not _parece_nombre(autor):
+            continue
+        # Un © seguido de un ISBN es la página de créditos, donde el titular suele ser el autor
+        cerca = texto[max(0, coincidencia.start() - DISTANCIA_BLOQUE_ISBN):coincidencia.end() + DISTANCIA_BLOQUE_ISBN]
+        return (autor, 0.8 if PATRON_ISBN.search(cerca) else 0.65)
+    return None
+
+REGLAS = [
+    ('archivo', regla_nombre_archivo),
+    ('etiqueta', regla_etiqueta_autor),
+    ('por', regla_por),
+    ('copyright', regla_copyright),
+]
+
+def extraer_autor_reglas(texto, nombre_archivo):
+    # Devuelve (autor, confianza, reglas) con el candidato de mayor confianza. Cuando varias reglas
+    # coinciden en el mismo nombre, sus confianzas se combinan como evidencias independientes.
+    texto = _sin_acentos_combinados(texto[:MAX_CARACTERES_REGLAS])
+    candidatos = {}
+    for nombre_regla, regla in REGLAS:
+        resultado = regla(texto, nombre_archivo)
+        if resultado is None or not _parece_nombre(resultado[0]):
+            continue
+        autor, confianza = resultado
+        clave = normalize_author_name(autor)
+        anterior = candidatos.get(clave)
+        if anterior is None:
+            candidatos[clave] = [autor, confianza, [nombre_regla]]
+        else:
+            anterior[1] = 1 - (1 - anterior[1]) * (1 - confianza)
+            anterior[2].append(nombre_regla)
+
+    if not candidatos:
+        return None, 0.0, []
+    autor, confianza, reglas = max(candidatos.values(), key=lambda candidato: candidato[1])
+    return autor, round(confianza, 3), reglas
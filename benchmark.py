@@ -0,0 +1,295 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import importlib.util
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from file_types import EXTENSIONES_SOPORTADAS
+from corpus_sintetico import generar_corpus, FORMATOS, TAMANOS, NOMBRES, APELLIDOS
+
+ETAPAS = ['process_file', 'pandoc', 'ocr', 'extract_authors', 'matching', 'organize', 'end_to_end']
+TAMANOS_CATALOGO = [100, 1000, 10000]
+CONSULTAS_MATCHING = 100
+MODOS_BENCHMARK_ORGANIZACION = ['copia', 'hardlink', 'symlink']
+TOLERANCIA_REGRESION = 0.10
+
+def _percentil(valores, percentil):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(percentil / 100 * (len(ordenados) - 1))))]
+
+def _resumen(latencias, segundos_totales, fallos=0, archivos=None):
+    archivos = len(latencias) if archivos is None else archivos
+    return {
+        'archivos': archivos,
+        'fallos': fallos,
+        'archivos_por_segundo': round(archivos / segundos_totales, 3) if segundos_totales > 0 else None,
+        'p50_ms': round(_percentil(latencias, 50) * 1000, 3) if latencias else None,
+        'p90_ms': round(_percentil(latencias, 90) * 1000, 3) if latencias else None,
+        'p99_ms': round(_percentil(latencias, 99) * 1000, 3) if latencias else None,
+    }
+
+def _pico_rss_mb():
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(propio, hijos) / 1024, 1)
+
+def _archivos_corpus(carpeta, formato=None):
+    archivos = []
+    for subcarpeta in sorted(os.listdir(carpeta)):
+        if formato is not None and subcarpeta != formato:
+            continue
+        ruta_subcarpeta = os.path.join(carpeta, subcarpeta)
+        if not os.path.isdir(ruta_subcarpeta):
+            continue
+        for nombre in sorted(os.listdir(ruta_subcarpeta)):
+            ext = os.path.splitext(nombre)[1].lower()
+            if ext in EXTENSIONES_SOPORTADAS:
+                archivos.append((os.path.join(ruta_subcarpeta, nombre), ext, subcarpeta))
+    return archivos
+
+def _qa_stub(inputs, batch_size=1):
+    respuestas = []
+    for entrada in inputs:
+        coincidencia = re.search(r'por ([A-Z][a-z]+(?: [A-Z][a-z]+)+)', entrada['context'])
+        respuestas.append({'answer': coincidencia.group(1) if coincidencia else 'no', 'score': 1.0})
+    return respuestas[0] if len(respuestas) == 1 else respuestas
+
+def _ner_stub(textos, batch_size=1):
+    return [[{'word': palabra, 'entity': 'B-PER'} for palabra in re.findall(r'\b[A-Z][a-z]{3,}\b', texto)[:2]] for texto in textos]
+
+class _LectorOcrStub:
+    def readtext_batched(self, imagenes, n_width=None, n_height=None, batch_size=1, detail=0):
+        return [[] for _ in imagenes]
+
+def instalar_modelos_stub():
+    from models import registrar_modelo
+    registrar_modelo('qa', lambda: _qa_stub)
+    registrar_modelo('ner', lambda: _ner_stub)
+    registrar_modelo('ocr', _LectorOcrStub)
+
+def _preparar_proceso(modelos):
+    os.environ['TQDM_DISABLE'] = '1'
+    import file_reader, ocr, analysis  # registran los cargadores reales antes de sustituirlos
+    if modelos == 'stub':
+        instalar_modelos_stub()
+
+def bench_process_file(corpus, formato):
+    from file_reader import process_file
+    latencias = []
+    fallos = 0
+    inicio = time.perf_counter()
+    for ruta_archivo, ext, _ in _archivos_corpus(corpus, formato):
+        inicio_archivo = time.perf_counter()
+        texto, _ = process_file(ruta_archivo, ext)
+        latencias.append(time.perf_counter() - inicio_archivo)
+        fallos += texto is None
+    return _resumen(latencias, time.perf_counter() - inicio, fallos)
+
+def bench_pandoc(corpus, formato):
+    # Ruta anterior de DOC/RTF (un proceso pandoc por archivo), como referencia para los lectores en proceso
+    import pypandoc
+    latencias = []
+    fallos = 0
+    inicio = time.perf_counter()
+    for ruta_archivo, _, _ in _archivos_corpus(corpus, formato):
+        inicio_archivo = time.perf_counter()
+        try:
+            pypandoc.convert_file(ruta_archivo, 'plain', format=formato)
+        except Exception:
+            fallos += 1
+        latencias.append(time.perf_counter() - inicio_archivo)
+    if latencias and fallos == len(latencias):
+        # Sin ninguna conversión correcta (p. ej. pandoc no instalado) los tiempos solo miden el error: no hay referencia
+        return {**_resumen([], 0, fallos, archivos=len(latencias)), 'valido': False}
+    return _resumen(latencias, time.perf_counter() - inicio, fallos)
+
+def bench_ocr(corpus):
+    from file_reader import process_file
+    from ocr import process_ocr
+    pendientes = []
+    for ruta_archivo, ext, _ in _archivos_corpus(corpus, 'pdf_escaneado'):
+        texto, metadata = process_file(ruta_archivo, ext)
+        if metadata is not None and metadata.get('paginas_ocr'):
+            pendientes.append((ruta_archivo, texto, metadata))
+
+    latencias = []
+    fallos = 0
+    inicio = time.perf_counter()
+    for ruta_archivo, texto, metadata in pendientes:
+        inicio_archivo = time.perf_counter()
+        resultado, _ = process_ocr(ruta_archivo, texto, metadata)
+        latencias.append(time.perf_counter() - inicio_archivo)
+        fallos += resultado is None
+    return _resumen(latencias, time.perf_counter() - inicio, fallos)
+
+def bench_extract_authors(corpus, batch_size=16):
+    from file_reader import process_file
+    from analysis import extract_authors_batch
+    documentos = []
+    for ruta_archivo, ext, _ in _archivos_corpus(corpus):
+        texto, metadata = process_file(ruta_archivo, ext)
+        if texto:
+            metadata['author'] = ''
+            documentos.append((texto, '', ruta_archivo, metadata))
+
+    latencias = []
+    fallos = 0
+    inicio = time.perf_counter()
+    for i in range(0, len(documentos), batch_size):
+        lote = documentos[i:i + batch_size]
+        inicio_lote = time.perf_counter()
+        resultados = extract_authors_batch(*(list(columna) for columna in zip(*lote)), batch_size)
+        latencias.extend([(time.perf_counter() - inicio_lote) / len(lote)] * len(lote))
+        fallos += sum(1 for autor, _ in resultados if not autor)
+    return _resumen(latencias, time.perf_counter() - inicio, fallos)
+
+def _nombres_sinteticos(cantidad, semilla):
+    rng = random.Random(semilla)
+    nombres = []
+    for _ in range(cantidad):
+        # Sufijo aleatorio para que los catálogos grandes no se llenen de nombres repetidos
+        sufijo = ''.join(rng.choice('aeioulmnrst') for _ in range(4))
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}{sufijo}"
+        nombres.append(''.join(c for c in nombre.lower() if c.isalpha() or c == ' '))
+    return nombres
+
+def bench_matching(tamano_catalogo, usar_indice):
+    from author_index import AuthorIndex
+    from utils import get_best_matching_author
+    catalogo = _nombres_sinteticos(tamano_catalogo, semilla=tamano_catalogo)
+    known_authors = AuthorIndex(catalogo) if usar_indice else list(dict.fromkeys(catalogo))
+    consultas = _nombres_sinteticos(CONSULTAS_MATCHING, semilla=1)
+
+    latencias = []
+    inicio = time.perf_counter()
+    for nombre in consultas:
+        inicio_consulta = time.perf_counter()
+        get_best_matching_author(nombre, known_authors)
+        latencias.append(time.perf_counter() - inicio_consulta)
+    return _resumen(latencias, time.perf_counter() - inicio)
+
+def bench_organize(corpus, modo):
+    import organizer
+    archivos = _archivos_corpus(corpus)
+    with tempfile.TemporaryDirectory() as salida:
+        organizer.CARPETA_SALIDA = salida
+        latencias = []
+        inicio = time.perf_counter()
+        for i, (ruta_archivo, _, _) in enumerate(archivos):
+            inicio_archivo = time.perf_counter()
+            organizer.organize_file(ruta_archivo, f"autor {i % 50}", modo)
+            latencias.append(time.perf_counter() - inicio_archivo)
+        return _resumen(latencias, time.perf_counter() - inicio)
+
+def bench_end_to_end(corpus):
+    import main
+    import organizer
+    archivos = len(_archivos_corpus(corpus))
+    with tempfile.TemporaryDirectory() as trabajo:
+        main.CARPETA_ENTRADA = os.path.abspath(corpus)
+        main.CARPETA_SALIDA = organizer.CARPETA_SALIDA = os.path.join(trabajo, 'salida')
+        for constante in ('LOG_FILE', 'CACHE_FILE', 'AUTHORS_INDEX_FILE', 'MANIFEST_FILE', 'EVENTOS_FILE', 'METRICAS_FILE', 'COSTES_FILE'):
+            setattr(main, constante, os.path.join(trabajo, os.path.basename(getattr(main, constante))))
+        inicio = time.perf_counter()
+        main.main(rebuild=True)
+        return _resumen([], time.perf_counter() - inicio, archivos=archivos)
+
+def _ejecutar_medido(modelos, funcion, args):
+    _preparar_proceso(modelos)
+    resultado = funcion(*args)
+    resultado['pico_rss_mb'] = _pico_rss_mb()
+    return resultado
+
+def _aislado(modelos, funcion, *args):
+    # Cada benchmark corre en un proceso nuevo para que el pico de RSS sea solo suyo
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+        return executor.submit(_ejecutar_medido, modelos, funcion, args).result()
+
+def ejecutar_benchmarks(corpus, etapas, modelos):
+    resultados = {}
+    formatos = [formato for formato in FORMATOS if _archivos_corpus(corpus, formato)]
+    if 'process_file' in etapas:
+        for formato in formatos:
+            resultados[f'process_file_{formato}'] = _aislado(modelos, bench_process_file, corpus, formato)
+    if 'pandoc' in etapas and importlib.util.find_spec('pypandoc') is not None:
+        for formato in ('doc', 'rtf'):
+            if formato in formatos:
+                resultados[f'pandoc_{formato}'] = _aislado(modelos, bench_pandoc, corpus, formato)
+    if 'ocr' in etapas and 'pdf_escaneado' in formatos:
+        resultados['ocr'] = _aislado(modelos, bench_ocr, corpus)
+    if 'extract_authors' in etapas:
+        resultados['extract_authors_batch'] = _aislado(modelos, bench_extract_authors, corpus)
+    if 'matching' in etapas:
+        for tamano in TAMANOS_CATALOGO:
+            resultados[f'matching_lista_{tamano}'] = _aislado(modelos, bench_matching, tamano, False)
+            resultados[f'matching_indice_{tamano}'] = _aislado(modelos, bench_matching, tamano, True)
+    if 'organize' in etapas:
+        for modo in MODOS_BENCHMARK_ORGANIZACION:
+            resultados[f'organize_file_{modo}'] = _aislado(modelos, bench_organize, corpus, modo)
+    if 'end_to_end' in etapas:
+        resultados['end_to_end'] = _aislado(modelos, bench_end_to_end, corpus)
+    return resultados
+
+def comparar_con_base(resultados, base, tolerancia=TOLERANCIA_REGRESION):
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        if anterior.get('archivos_por_segundo') and actual.get('archivos_por_segundo') is not None \
+                and actual['archivos_por_segundo'] < anterior['archivos_por_segundo'] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: {actual['archivos_por_segundo']} archivos/s (base {anterior['archivos_por_segundo']})")
+        if anterior.get('p90_ms') and actual.get('p90_ms') is not None and actual['p90_ms'] > anterior['p90_ms'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p90 {actual['p90_ms']} ms (base {anterior['p90_ms']})")
+        if anterior.get('pico_rss_mb') and actual['pico_rss_mb'] > anterior['pico_rss_mb'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: pico RSS {actual['pico_rss_mb']} MB (base {anterior['pico_rss_mb']})")
+    return regresiones
+
+def imprimir_tabla(resultados):
+    columnas = ['archivos', 'fallos', 'archivos_por_segundo', 'p50_ms', 'p90_ms', 'p99_ms', 'pico_rss_mb']
+    ancho = max(len(nombre) for nombre in resultados) if resultados else 10
+    print(f"{'benchmark':<{ancho}}  " + '  '.join(f"{columna:>20}" for columna in columnas))
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:<{ancho}}  " + '  '.join(f"{str(resultado.get(columna)):>20}" for columna in columnas))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks por etapa y de extremo a extremo del organizador de libros.")
+    parser.add_argument('--corpus', help="Carpeta con el corpus; si no se indica se genera uno sintético temporal.")
+    parser.add_argument('--por-formato', type=int, default=5)
+    parser.add_argument('--tamano', choices=sorted(TAMANOS), default='pequeno')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS)
+    parser.add_argument('--modelos', choices=['stub', 'reales'], default='stub', help="Modelos de QA/NER/OCR a usar.")
+    parser.add_argument('--base', help="Archivo JSON con resultados anteriores contra los que comparar.")
+    parser.add_argument('--guardar-base', help="Guarda los resultados como nueva base en este archivo JSON.")
+    parser.add_argument('--salida', help="Guarda los resultados en este archivo JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporal:
+        corpus = args.corpus
+        if corpus is None or not os.path.isdir(corpus):
+            corpus = corpus or os.path.join(temporal, 'corpus')
+            generar_corpus(corpus, args.por_formato, args.tamano, args.semilla)
+        resultados = ejecutar_benchmarks(corpus, args.etapas, args.modelos)
+
+    imprimir_tabla(resultados)
+    for ruta in (args.salida, args.guardar_base):
+        if ruta:
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=4, ensure_ascii=False)
+
+    if args.base:
+        with open(args.base, 'r', encoding='utf-8') as archivo:
+            regresiones = comparar_con_base(resultados, json.load(archivo))
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        sys.exit(1 if regresiones else 0)
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from threading import Lock
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def calcular_hash(ruta_archivo):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(bloque)
+    return hasher.hexdigest()
+
+class CacheResultados:
+    def __init__(self, ruta_db, usar_hash=False, rebuild=False):
+        self.usar_hash = usar_hash
+        self.lock = Lock()
+        self.conn = sqlite3.connect(ruta_db, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " ruta TEXT PRIMARY KEY,"
+            " tamano INTEGER NOT NULL,"
+            " mtime REAL NOT NULL,"
+            " hash TEXT,"
+            " autor TEXT,"
+            " metadata TEXT,"
+            " etapa TEXT,"
+            " actualizado REAL NOT NULL)"
+        )
+        if rebuild:
+            self.conn.execute("DELETE FROM resultados")
+        self.conn.commit()
+
+    def buscar(self, ruta_archivo, tamano, mtime):
+        with self.lock:
+            fila = self.conn.execute(
+                "SELECT tamano, mtime, hash, autor, metadata, etapa FROM resultados WHERE ruta = ?",
+                (ruta_archivo,)
+            ).fetchone()
+        if fila is None:
+            return None
+
+        tamano_cache, mtime_cache, hash_cache, autor, metadata, etapa = fila
+        if tamano_cache != tamano:
+            return None
+        if mtime_cache != mtime:
+            # Solo un hash de contenido puede confirmar que un archivo "tocado" no cambió
+            if not self.usar_hash or not hash_cache or calcular_hash(ruta_archivo) != hash_cache:
+                return None
+            with self.lock:
+                self.conn.execute("UPDATE resultados SET mtime = ? WHERE ruta = ?", (mtime, ruta_archivo))
+                self.conn.commit()
+
+        return {'author': autor, 'metadata': json.loads(metadata) if metadata else {}, 'etapa': etapa}
+
+    def guardar_lote(self, resultados):
+        filas = []
+        for ruta_archivo, autor, metadata, etapa in resultados:
+            try:
+                stat = os.stat(ruta_archivo)
+                hash_contenido = calcular_hash(ruta_archivo) if self.usar_hash else None
+            except OSError:
+                continue
+            filas.append((
+                ruta_archivo, stat.st_size, stat.st_mtime, hash_contenido, autor,
+                json.dumps(metadata or {}, ensure_ascii=False), etapa, time.time()
+            ))
+
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+            self.conn.commit()
+
+    def purgar_eliminados(self, rutas_vistas, carpeta_entrada):
+        prefijo = os.path.join(carpeta_entrada, '')
+        with self.lock:
+            rutas_cache = [fila[0] for fila in self.conn.execute("SELECT ruta FROM resultados")]
+            eliminadas = [(ruta,) for ruta in rutas_cache if ruta.startswith(prefijo) and ruta not in rutas_vistas]
+            self.conn.executemany("DELETE FROM resultados WHERE ruta = ?", eliminadas)
+            self.conn.commit()
+        return len(eliminadas)
+
+    def cerrar(self):
+        with self.lock:
+            self.conn.close()
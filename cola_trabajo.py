@@ -0,0 +1,148 @@
+import json
+import time
+import sqlite3
+from threading import Lock
+from contextlib import contextmanager
+
+# Segundos que un worker conserva un lote sin renovarlo antes de que otro pueda retomarlo
+DURACION_LEASE = 600
+# Veces que se reparte un lote antes de darlo por fallido
+MAX_INTENTOS = 3
+# Espera máxima por el bloqueo de la base de datos, que comparten todos los hosts
+TIMEOUT_SQLITE = 60
+
+class ColaTrabajo:
+    # Cola de lotes durable en un archivo SQLite del montaje compartido. Cada lote se arrienda a un worker
+    # durante DURACION_LEASE segundos; si el worker no lo renueva ni lo completa, otro lo retoma. Las
+    # transacciones son cortas y usan el journal clásico porque WAL necesita memoria compartida entre
+    # procesos, que no existe entre hosts de un sistema de archivos en red.
+    def __init__(self, ruta_db, timeout=TIMEOUT_SQLITE):
+        self.lock = Lock()
+        self.conn = sqlite3.connect(ruta_db, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS lotes ("
+            " id INTEGER PRIMARY KEY,"
+            " archivos TEXT NOT NULL,"
+            " estado TEXT NOT NULL DEFAULT 'pendiente',"
+            " worker TEXT,"
+            " expira REAL,"
+            " intentos INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " actualizado REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " ruta TEXT PRIMARY KEY,"
+            " autor TEXT,"
+            " metadata TEXT,"
+            " etapa TEXT,"
+            " error TEXT,"
+            " worker TEXT,"
+            " actualizado REAL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS duplicados (ruta TEXT PRIMARY KEY, representante TEXT NOT NULL)")
+
+    @contextmanager
+    def _transaccion(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al empezar, así dos workers no pueden arrendar el mismo lote
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def vacia(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM lotes").fetchone()[0] == 0
+
+    def crear(self, lotes, resultados_previos=(), grupos_duplicados=None):
+        # lotes: listas de (ruta, ext, tamano); resultados_previos: (ruta, autor, etapa) ya resueltos por la caché
+        ahora = time.time()
+        with self._transaccion() as conn:
+            conn.execute("DELETE FROM lotes")
+            conn.execute("DELETE FROM resultados")
+            conn.execute("DELETE FROM duplicados")
+            conn.executemany("INSERT INTO lotes (archivos, actualizado) VALUES (?, ?)",
+                             [(json.dumps(lote, ensure_ascii=False), ahora) for lote in lotes])
+            conn.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, '{}', ?, NULL, 'coordinador', ?)",
+                             [(ruta_archivo, autor, etapa, ahora) for ruta_archivo, autor, etapa in resultados_previos])
+            conn.executemany("INSERT OR REPLACE INTO duplicados VALUES (?, ?)",
+                             [(ruta_archivo, representante) for representante, duplicados in (grupos_duplicados or {}).items()
+                              for ruta_archivo in duplicados])
+
+    def arrendar(self, worker, duracion=DURACION_LEASE):
+        # Devuelve (id, archivos) del siguiente lote libre o con el lease vencido, o None si no hay ninguno
+        ahora = time.time()
+        with self._transaccion() as conn:
+            conn.execute("UPDATE lotes SET estado = 'fallido', actualizado = ? WHERE estado = 'en_curso' AND expira < ? AND intentos >= ?",
+                         (ahora, ahora, MAX_INTENTOS))
+            fila = conn.execute("SELECT id, archivos FROM lotes WHERE estado = 'pendiente' OR (estado = 'en_curso' AND expira < ?) "
+                                "ORDER BY id LIMIT 1", (ahora,)).fetchone()
+            if fila is None:
+                return None
+            conn.execute("UPDATE lotes SET estado = 'en_curso', worker = ?, expira = ?, intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                         (worker, ahora + duracion, ahora, fila[0]))
+        return fila[0], [tuple(item) for item in json.loads(fila[1])]
+
+    def renovar(self, id_lote, worker, duracion=DURACION_LEASE):
+        # Devuelve False si el lease ya no pertenece a este worker
+        with self._transaccion() as conn:
+            cursor = conn.execute("UPDATE lotes SET expira = ? WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+                                  (time.time() + duracion, id_lote, worker))
+            return cursor.rowcount == 1
+
+    def completar(self, id_lote, worker, resultados):
+        # resultados: (ruta, autor, metadata, etapa, error). Solo se guardan si el worker sigue siendo el
+        # titular del lote; si lo perdió, otro worker lo está repitiendo y sus resultados prevalecerán.
+        ahora = time.time()
+        with self._transaccion() as conn:
+            cursor = conn.execute("UPDATE lotes SET estado = 'hecho', expira = NULL, error = NULL, actualizado = ? "
+                                  "WHERE id = ? AND worker = ? AND estado = 'en_curso'", (ahora, id_lote, worker))
+            if cursor.rowcount != 1:
+                return False
+            conn.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (ruta_archivo, autor, json.dumps(metadata or {}, ensure_ascii=False), etapa, error, worker, ahora)
+                for ruta_archivo, autor, metadata, etapa, error in resultados
+            ])
+        return True
+
+    def liberar(self, id_lote, worker, error):
+        # Devuelve el lote a la cola tras un fallo del worker, o lo marca como fallido si agotó los intentos
+        with self._transaccion() as conn:
+            conn.execute("UPDATE lotes SET estado = CASE WHEN intentos >= ? THEN 'fallido' ELSE 'pendiente' END, "
+                         "worker = NULL, expira = NULL, error = ?, actualizado = ? WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+                         (MAX_INTENTOS, error, time.time(), id_lote, worker))
+
+    def estado(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT estado, COUNT(*) FROM lotes GROUP BY estado").fetchall())
+
+    def sin_terminar(self):
+        estado = self.estado()
+        return estado.get('pendiente', 0) + estado.get('en_curso', 0)
+
+    def lotes_fallidos(self):
+        with self.lock:
+            filas = self.conn.execute("SELECT id, archivos, error FROM lotes WHERE estado = 'fallido'").fetchall()
+        return [(id_lote, [tuple(item) for item in json.loads(archivos)], error) for id_lote, archivos, error in filas]
+
+    def resultados(self):
+        with self.lock:
+            filas = self.conn.execute("SELECT ruta, autor, metadata, etapa, error FROM resultados").fetchall()
+        return [(ruta_archivo, autor, json.loads(metadata) if metadata else {}, etapa, error)
+                for ruta_archivo, autor, metadata, etapa, error in filas]
+
+    def duplicados(self):
+        grupos = {}
+        with self.lock:
+            for ruta_archivo, representante in self.conn.execute("SELECT ruta, representante FROM duplicados"):
+                grupos.setdefault(representante, []).append(ruta_archivo)
+        return grupos
+
+    def cerrar(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,50 @@
+import re
+from file_reader import fragment_text
+from author_rules import NOMBRE
+
+# Tokens de contexto por documento que se envían a QA y NER; None envía el texto completo
+PRESUPUESTO_TOKENS_CONTEXTO = 384
+# Tamaño de cada ventana candidata
+VENTANA_TOKENS = 96
+# Estimación de caracteres por token WordPiece en español, evita tokenizar para puntuar
+CARACTERES_POR_TOKEN = 4
+# Las ventanas dentro de estas primeras posiciones reciben un bonus decreciente (portada, créditos)
+VENTANAS_INICIALES = 6
+
+PATRON_PISTAS_AUTOR = re.compile(
+    r"\b(?:autor(?:a|es)?|author|por|by|escrito|edici[oó]n|editorial|traducci[oó]n|t[ií]tulo original|derechos|reservados|isbn|copyright)\b|©",
+    re.IGNORECASE
+)
+PATRON_NOMBRE = re.compile(NOMBRE)
+
+def estimar_tokens(texto):
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+def puntuar_ventana(ventana, posicion, total):
+    puntuacion = 3.0 * max(0.0, 1 - posicion / VENTANAS_INICIALES)
+    puntuacion += 2.0 * min(3, len(PATRON_PISTAS_AUTOR.findall(ventana)))
+    puntuacion += 1.0 * min(3, len(PATRON_NOMBRE.findall(ventana)))
+    if posicion == total - 1:
+        # La última ventana suele ser la contraportada o el colofón
+        puntuacion += 1.0
+    return puntuacion
+
+def seleccionar_contexto(texto, presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO):
+    # Devuelve el contexto a enviar a los modelos y su tamaño estimado en tokens. Las ventanas
+    # elegidas se unen en su orden original para que QA siga viendo el texto en secuencia.
+    if not presupuesto_tokens or estimar_tokens(texto) <= presupuesto_tokens:
+        return texto, estimar_tokens(texto)
+
+    ventanas = fragment_text(texto, VENTANA_TOKENS * CARACTERES_POR_TOKEN)
+    ranking = sorted(range(len(ventanas)), key=lambda i: (-puntuar_ventana(ventanas[i], i, len(ventanas)), i))
+    elegidas = []
+    tokens = 0
+    for i in ranking:
+        tokens_ventana = estimar_tokens(ventanas[i])
+        if tokens + tokens_ventana > presupuesto_tokens:
+            continue
+        elegidas.append(i)
+        tokens += tokens_ventana
+
+    contexto = ' ... '.join(ventanas[i] for i in sorted(elegidas))
+    return contexto, tokens
@@ -0,0 +1,211 @@
+import os
+import random
+import struct
+import zipfile
+import argparse
+
+import fitz
+import docx
+
+NOMBRES = ['Gabriel', 'Isabel', 'Julio', 'Jorge Luis', 'Laura', 'Mario', 'Elena', 'Carlos', 'Ana María', 'Octavio', 'Rosario', 'Juan José']
+APELLIDOS = ['García Márquez', 'Allende', 'Cortázar', 'Borges', 'Esquivel', 'Vargas Llosa', 'Garro', 'Fuentes', 'Matute', 'Paz', 'Castellanos', 'Millás']
+PALABRAS = ('el la de que en los las una por con para como sobre entre ciudad tiempo memoria historia noche río casa '
+            'camino silencio palabra mundo libro familia guerra amor viaje mar sombra luz pueblo recuerdo').split()
+FORMATOS = ['pdf', 'pdf_escaneado', 'epub', 'docx', 'doc', 'rtf']
+TAMANOS = {'pequeno': 3, 'mediano': 30, 'grande': 300}
+CARACTERES_POR_PAGINA = 1800
+
+def _autor(rng):
+    return f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}"
+
+def _titulo(rng):
+    return ' '.join(rng.choice(PALABRAS) for _ in range(rng.randint(2, 5))).capitalize()
+
+def _parrafo(rng, caracteres):
+    palabras = []
+    total = 0
+    while total < caracteres:
+        palabra = rng.choice(PALABRAS)
+        palabras.append(palabra)
+        total += len(palabra) + 1
+    return ' '.join(palabras).capitalize() + '.'
+
+def _paginas(rng, autor, titulo, num_paginas):
+    portada = f"{titulo}\n\npor {autor}\n\n© {rng.randint(1950, 2020)} {autor}. Todos los derechos reservados.\nISBN 978-84-{rng.randint(1000, 9999)}-{rng.randint(100, 999)}-{rng.randint(0, 9)}"
+    return [portada] + [_parrafo(rng, CARACTERES_POR_PAGINA) for _ in range(num_paginas - 1)]
+
+def escribir_pdf(ruta, paginas, autor, titulo, con_metadata):
+    with fitz.open() as documento:
+        for texto in paginas:
+            pagina = documento.new_page()
+            pagina.insert_textbox(fitz.Rect(56, 56, 540, 790), texto, fontsize=10)
+        if con_metadata:
+            documento.set_metadata({'author': autor, 'title': titulo})
+        documento.save(ruta, deflate=True)
+
+def escribir_pdf_escaneado(ruta, paginas, autor, titulo, con_metadata):
+    # Cada página se rasteriza y se inserta como imagen, sin capa de texto
+    with fitz.open() as origen, fitz.open() as documento:
+        for texto in paginas:
+            pagina = origen.new_page()
+            pagina.insert_textbox(fitz.Rect(56, 56, 540, 790), texto, fontsize=10)
+            pixmap = pagina.get_pixmap(dpi=100, colorspace=fitz.csGRAY)
+            nueva = documento.new_page(width=pagina.rect.width, height=pagina.rect.height)
+            nueva.insert_image(nueva.rect, stream=pixmap.tobytes('png'))
+        if con_metadata:
+            documento.set_metadata({'author': autor, 'title': titulo})
+        documento.save(ruta, deflate=True)
+
+def escribir_epub(ruta, paginas, autor, titulo, con_metadata):
+    capitulos = [f'<html xmlns="http://www.w3.org/1999/xhtml"><body><p>{texto}</p></body></html>' for texto in paginas]
+    creador = f'<dc:creator>{autor}</dc:creator>' if con_metadata else ''
+    manifiesto = ''.join(f'<item id="c{i}" href="c{i}.xhtml" media-type="application/xhtml+xml"/>' for i in range(len(capitulos)))
+    spine = ''.join(f'<itemref idref="c{i}"/>' for i in range(len(capitulos)))
+    opf = ('<?xml version="1.0" encoding="utf-8"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">'
+           f'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:identifier id="id">{titulo}</dc:identifier>'
+           f'<dc:title>{titulo}</dc:title>{creador}<dc:language>es</dc:language></metadata>'
+           f'<manifest>{manifiesto}<item id="img" href="portada.bin" media-type="image/png"/></manifest><spine>{spine}</spine></package>')
+    contenedor = ('<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                  '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles></container>')
+    with zipfile.ZipFile(ruta, 'w') as archivo:
+        archivo.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        archivo.writestr('META-INF/container.xml', contenedor, compress_type=zipfile.ZIP_DEFLATED)
+        archivo.writestr('OEBPS/content.opf', opf, compress_type=zipfile.ZIP_DEFLATED)
+        for i, capitulo in enumerate(capitulos):
+            archivo.writestr(f'OEBPS/c{i}.xhtml', capitulo, compress_type=zipfile.ZIP_DEFLATED)
+        # Imagen de relleno para simular libros ilustrados
+        archivo.writestr('OEBPS/portada.bin', bytes(len(paginas) * 20000), compress_type=zipfile.ZIP_STORED)
+
+def escribir_docx(ruta, paginas, autor, titulo, con_metadata):
+    documento = docx.Document()
+    for texto in paginas:
+        for linea in texto.split('\n'):
+            documento.add_paragraph(linea)
+    documento.core_properties.author = autor if con_metadata else ''
+    documento.core_properties.title = titulo
+    documento.save(ruta)
+
+def _escapar_rtf(texto):
+    texto = texto.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
+    return ''.join(c if ord(c) < 128 else f"\\'{ord(c):02x}" if ord(c) < 256 else f"\\u{ord(c)}?" for c in texto)
+
+def escribir_rtf(ruta, paginas, autor, titulo, con_metadata):
+    info = f'{{\\info{{\\title {_escapar_rtf(titulo)}}}{{\\author {_escapar_rtf(autor)}}}}}' if con_metadata else ''
+    cuerpo = '\\page\n'.join('\\par\n'.join(_escapar_rtf(linea) for linea in texto.split('\n')) for texto in paginas)
+    with open(ruta, 'w', encoding='ascii') as archivo:
+        archivo.write(f'{{\\rtf1\\ansi\\ansicpg1252\\deff0{{\\fonttbl{{\\f0 Times New Roman;}}}}{info}\n{cuerpo}\n}}')
+
+OLE_SECTOR = 512
+OLE_FIN_CADENA = 0xFFFFFFFE
+
+def _propiedades_resumen(autor, titulo):
+    # Property set mínimo de \x05SummaryInformation: página de códigos, título y autor
+    propiedades = [(1, struct.pack('<Ih2x', 2, 1252))]
+    for identificador, valor in ((2, titulo), (4, autor)):
+        codificado = valor.encode('cp1252', errors='replace') + b'\x00'
+        propiedades.append((identificador, struct.pack('<II', 30, len(codificado)) + codificado + b'\x00' * (-len(codificado) % 4)))
+    base = 8 + 8 * len(propiedades)
+    cuerpo = b''
+    indice = b''
+    for identificador, datos in propiedades:
+        indice += struct.pack('<II', identificador, base + len(cuerpo))
+        cuerpo += datos
+    cabecera = struct.pack('<HHI16sI', 0xFFFE, 0, 0x00020006, bytes(16), 1)
+    cabecera += bytes.fromhex('e0859ff2f94f6810ab9108002b27b3d9') + struct.pack('<I', 48)
+    return cabecera + struct.pack('<II', base + len(cuerpo), len(propiedades)) + indice + cuerpo
+
+def _word_document(texto):
+    # FIB mínimo con una sola pieza de texto UTF-16 y su tabla de piezas en 1Table
+    documento = bytearray(0x800)
+    struct.pack_into('<HH', documento, 0, 0xA5EC, 0)
+    struct.pack_into('<H', documento, 0x0A, 0x0200)
+    fc = len(documento)
+    documento += texto.encode('utf-16-le')
+    plc = struct.pack('<II', 0, len(texto)) + struct.pack('<HIH', 0, fc, 0)
+    clx = b'\x02' + struct.pack('<I', len(plc)) + plc
+    struct.pack_into('<II', documento, 0x01A2, 0, len(clx))
+    return bytes(documento), clx
+
+def _archivo_ole(streams):
+    # Compound File v3 sin mini stream: cada stream se rellena hasta el tamaño de corte de 4096 bytes
+    sectores = []
+    fat = []
+    entradas = []
+    for nombre, datos in streams:
+        datos = datos.ljust(max(4096, -(-len(datos) // OLE_SECTOR) * OLE_SECTOR), b'\x00')
+        inicio = len(sectores)
+        num = len(datos) // OLE_SECTOR
+        sectores.extend(datos[i * OLE_SECTOR:(i + 1) * OLE_SECTOR] for i in range(num))
+        fat.extend(inicio + i + 1 for i in range(num - 1))
+        fat.append(OLE_FIN_CADENA)
+        entradas.append((nombre, 2, inicio, len(datos)))
+
+    def entrada(nombre, tipo, inicio, tamano):
+        codificado = nombre.encode('utf-16-le') + b'\x00\x00'
+        datos = codificado.ljust(64, b'\x00') + struct.pack('<HBBIII', len(codificado), tipo, 1, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF)
+        return datos.ljust(116, b'\x00') + struct.pack('<III', inicio, tamano, 0)
+
+    directorio = entrada('Root Entry', 5, OLE_FIN_CADENA, 0) + b''.join(entrada(*e) for e in entradas)
+    inicio_directorio = len(fat)
+    num_directorio = -(-len(directorio) // OLE_SECTOR)
+    fat.extend(inicio_directorio + i + 1 for i in range(num_directorio - 1))
+    fat.append(OLE_FIN_CADENA)
+    inicio_fat = len(fat)
+    num_fat = -(-(len(fat) + 1) // (OLE_SECTOR // 4))
+    fat.extend([0xFFFFFFFD] * num_fat)
+    fat.extend([0xFFFFFFFF] * (num_fat * OLE_SECTOR // 4 - len(fat)))
+
+    cabecera = bytearray(OLE_SECTOR)
+    cabecera[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    struct.pack_into('<HHHHH', cabecera, 24, 0x3E, 3, 0xFFFE, 9, 6)
+    struct.pack_into('<II', cabecera, 44, num_fat, inicio_directorio)
+    struct.pack_into('<IIIII', cabecera, 56, 4096, OLE_FIN_CADENA, 0, OLE_FIN_CADENA, 0)
+    struct.pack_into('<109I', cabecera, 76, *([inicio_fat + i for i in range(num_fat)] + [0xFFFFFFFF] * (109 - num_fat)))
+    return bytes(cabecera) + b''.join(sectores) + directorio.ljust(num_directorio * OLE_SECTOR, b'\x00') + struct.pack(f'<{len(fat)}I', *fat)
+
+def escribir_doc(ruta, paginas, autor, titulo, con_metadata):
+    # Word 97 mínimo escrito directamente (una pieza de texto y SummaryInformation), sin depender de LibreOffice
+    documento, tabla = _word_document('\r'.join(texto.replace('\n', '\r') for texto in paginas) + '\r')
+    streams = [('WordDocument', documento), ('1Table', tabla)]
+    if con_metadata:
+        streams.append(('\x05SummaryInformation', _propiedades_resumen(autor, titulo)))
+    with open(ruta, 'wb') as archivo:
+        archivo.write(_archivo_ole(streams))
+
+ESCRITORES = {
+    'pdf': (escribir_pdf, '.pdf'),
+    'pdf_escaneado': (escribir_pdf_escaneado, '.pdf'),
+    'epub': (escribir_epub, '.epub'),
+    'docx': (escribir_docx, '.docx'),
+    'doc': (escribir_doc, '.doc'),
+    'rtf': (escribir_rtf, '.rtf'),
+}
+
+def generar_corpus(carpeta, por_formato=5, tamano='pequeno', semilla=42, formatos=FORMATOS, proporcion_metadata=0.5):
+    rng = random.Random(semilla)
+    num_paginas = TAMANOS[tamano]
+    generados = []
+    for formato in formatos:
+        escritor, ext = ESCRITORES[formato]
+        subcarpeta = os.path.join(carpeta, formato)
+        os.makedirs(subcarpeta, exist_ok=True)
+        for i in range(por_formato):
+            autor = _autor(rng)
+            titulo = _titulo(rng)
+            con_metadata = rng.random() < proporcion_metadata
+            nombre = f"{autor} - {titulo}{ext}" if rng.random() < 0.5 else f"{formato}_{i:05d}{ext}"
+            ruta = os.path.join(subcarpeta, nombre)
+            escritor(ruta, _paginas(rng, autor, titulo, num_paginas), autor, titulo, con_metadata)
+            generados.append({'ruta': ruta, 'formato': formato, 'autor': autor, 'titulo': titulo, 'con_metadata': con_metadata})
+    return generados
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera una biblioteca sintética reproducible para benchmarks.")
+    parser.add_argument('carpeta')
+    parser.add_argument('--por-formato', type=int, default=5)
+    parser.add_argument('--tamano', choices=sorted(TAMANOS), default='pequeno')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=FORMATOS)
+    args = parser.parse_args()
+    archivos = generar_corpus(args.carpeta, args.por_formato, args.tamano, args.semilla, args.formatos)
+    print(f"{len(archivos)} archivos generados en {args.carpeta}")
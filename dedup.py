@@ -0,0 +1,112 @@
+import os
+import hashlib
+from threading import Lock
+from cache import calcular_hash
+
+# Bytes leídos del inicio y del final del archivo para el hash parcial
+BYTES_HASH_PARCIAL = 64 * 1024
+
+def calcular_hash_parcial(ruta_archivo, tamano):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(ruta_archivo, 'rb') as archivo:
+        hasher.update(archivo.read(BYTES_HASH_PARCIAL))
+        # Si el archivo cabe en los dos bloques, el hash parcial ya cubre todo su contenido
+        if tamano > 2 * BYTES_HASH_PARCIAL:
+            archivo.seek(-BYTES_HASH_PARCIAL, os.SEEK_END)
+        hasher.update(archivo.read(BYTES_HASH_PARCIAL))
+    return hasher.hexdigest()
+
+class DetectorDuplicados:
+    # Agrupa archivos idénticos a medida que llegan del escaneo: primero por tamaño, después por un
+    # hash parcial y solo al final por el hash completo. El primer archivo de cada grupo es el
+    # representante; es el único que se analiza y su autor se aplica al resto del grupo.
+    def __init__(self):
+        self.lock = Lock()
+        self.representantes_por_tamano = {}
+        self.representantes = set()
+        self.duplicados = set()
+        self.hash_parcial = {}
+        self.hash_completo = {}
+        self.grupos = {}
+        self.autores = {}
+        self.pendientes = {}
+        self.representante_de = {}
+
+    def _hash_parcial(self, ruta_archivo, tamano):
+        if ruta_archivo not in self.hash_parcial:
+            self.hash_parcial[ruta_archivo] = calcular_hash_parcial(ruta_archivo, tamano)
+        return self.hash_parcial[ruta_archivo]
+
+    def _hash_completo(self, ruta_archivo):
+        if ruta_archivo not in self.hash_completo:
+            self.hash_completo[ruta_archivo] = calcular_hash(ruta_archivo)
+        return self.hash_completo[ruta_archivo]
+
+    def buscar_representante(self, ruta_archivo, tamano):
+        # Devuelve el representante del que ruta_archivo es copia, o None si es el primero de su contenido
+        candidatos = self.representantes_por_tamano.setdefault(tamano, [])
+        if candidatos and tamano > 0:
+            parcial = self._hash_parcial(ruta_archivo, tamano)
+            for candidato in candidatos:
+                try:
+                    if self._hash_parcial(candidato, tamano) != parcial:
+                        continue
+                    if tamano <= 2 * BYTES_HASH_PARCIAL or self._hash_completo(candidato) == self._hash_completo(ruta_archivo):
+                        return candidato
+                except OSError:
+                    # El representante pudo moverse ya a la carpeta de salida (modo 'mover')
+                    continue
+        candidatos.append(ruta_archivo)
+        with self.lock:
+            self.representantes.add(ruta_archivo)
+        return None
+
+    def registrar_duplicado(self, representante, ruta_archivo):
+        # Devuelve (True, autor) si el representante ya tiene autor; si no, el duplicado queda pendiente
+        with self.lock:
+            self.grupos.setdefault(representante, []).append(ruta_archivo)
+            self.duplicados.add(ruta_archivo)
+            self.representante_de[ruta_archivo] = representante
+            if representante in self.autores:
+                return True, self.autores[representante]
+            self.pendientes.setdefault(representante, []).append(ruta_archivo)
+            return False, None
+
+    def registrar_cacheado(self, representante, ruta_archivo):
+        # Duplicado ya resuelto en una ejecución anterior: su autor viene de la caché y solo se restaura el grupo
+        with self.lock:
+            self.grupos.setdefault(representante, []).append(ruta_archivo)
+            self.duplicados.add(ruta_archivo)
+            self.representante_de[ruta_archivo] = representante
+
+    def resolver(self, ruta_archivo, autor):
+        # Fija el autor de un representante y devuelve los duplicados que esperaban esa decisión
+        with self.lock:
+            if ruta_archivo not in self.representantes:
+                return []
+            self.autores[ruta_archivo] = autor
+            return self.pendientes.pop(ruta_archivo, [])
+
+    def cargar_grupos(self, grupos):
+        # Restaura grupos detectados en otra ejecución (el coordinador del modo distribuido) con sus duplicados pendientes
+        for representante, duplicados in grupos.items():
+            with self.lock:
+                self.representantes.add(representante)
+            for ruta_archivo in duplicados:
+                self.registrar_duplicado(representante, ruta_archivo)
+
+    def es_duplicado(self, ruta_archivo):
+        with self.lock:
+            return ruta_archivo in self.duplicados
+
+    def representante(self, ruta_archivo):
+        with self.lock:
+            return self.representante_de.get(ruta_archivo)
+
+    def sin_resolver(self):
+        with self.lock:
+            return {representante: list(duplicados) for representante, duplicados in self.pendientes.items()}
+
+    def reporte(self):
+        with self.lock:
+            return {representante: list(duplicados) for representante, duplicados in self.grupos.items()}
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import socket
+import queue
+import argparse
+from queue import Queue
+from threading import Thread, Event
+from multiprocessing import Manager
+
+import main
+from analysis import configurar_inferencia, BACKENDS_INFERENCIA
+from context_selector import PRESUPUESTO_TOKENS_CONTEXTO
+from cola_trabajo import ColaTrabajo, DURACION_LEASE
+from organizer import MODOS_ORGANIZACION
+from cache import CacheResultados
+from dedup import DetectorDuplicados
+from author_index import AuthorIndex
+from scheduler import ModeloCostes
+from pipeline import FIN
+from metrics import configurar_eventos
+from utils import log_data, log_error, cargar_archivos
+
+# Archivos por lote; lotes grandes amortizan el arranque de los pools, lotes pequeños reparten mejor el final
+TAMANO_LOTE = 200
+# Segundos que espera un worker sin lotes libres mientras otros siguen en curso (sus leases pueden vencer)
+ESPERA_SIN_LOTES = 30
+# Un lote que tarda más de FACTOR_PLAZO_LOTE veces su coste estimado (y al menos PLAZO_MINIMO_LOTE segundos)
+# deja de renovarse y se devuelve a la cola, para que cuente como intento fallido en lugar de retenerse para siempre
+FACTOR_PLAZO_LOTE = 10
+PLAZO_MINIMO_LOTE = 1800
+
+class PlazoAgotado(Exception):
+    pass
+
+class ResultadosLote:
+    # Ocupa el lugar de la caché en las etapas de main: recoge lo que se guardaría para enviarlo a la cola de trabajo
+    def __init__(self):
+        self.filas = {}
+
+    def guardar_lote(self, resultados):
+        for ruta_archivo, autor, metadata, etapa in resultados:
+            self.filas[ruta_archivo] = (metadata, etapa)
+
+def coordinar(cola, carpeta_entrada, tamano_lote=TAMANO_LOTE, usar_manifiesto=False, usar_hash=False):
+    # Escanea la carpeta una sola vez, resuelve lo que ya está en la caché local y los duplicados,
+    # y reparte el resto en lotes. Las rutas deben ser las mismas en todos los hosts (mismo punto de montaje).
+    cache = CacheResultados(main.CACHE_FILE, usar_hash=usar_hash)
+    detector = DetectorDuplicados()
+    cola_escaneo, cola_archivos, cola_organizacion = Queue(), Queue(), Queue()
+    cargar_archivos(cola_escaneo, carpeta_entrada, cache, cola_organizacion, main.MANIFEST_FILE, usar_manifiesto)
+    main.deduplicar_archivos(cola_escaneo, cola_archivos, cola_organizacion, detector)
+    cache.cerrar()
+
+    archivos = list(iter(cola_archivos.get, FIN))
+    resultados_previos = []
+    while not cola_organizacion.empty():
+        ruta_archivo, autor = cola_organizacion.get()
+        if detector.es_duplicado(ruta_archivo):
+            # Copia conocida por la caché: fusionar la coloca con su representante, como al resto de duplicados
+            continue
+        resultados_previos.append((ruta_archivo, autor, 'cache'))
+    lotes = [archivos[i:i + tamano_lote] for i in range(0, len(archivos), tamano_lote)]
+    # Todos los grupos siguen pendientes aquí: las copias nuevas y las que vienen de la caché
+    grupos = detector.reporte()
+    cola.crear(lotes, resultados_previos, grupos)
+    print(f"{len(archivos)} archivos en {len(lotes)} lotes, {len(resultados_previos)} tomados de la caché, "
+          f"{sum(len(duplicados) for duplicados in grupos.values())} duplicados.")
+
+def plazo_lote(archivos, modelo_costes):
+    estimado = sum(modelo_costes.estimar_archivo(ext, tamano) for _, ext, tamano in archivos)
+    return max(PLAZO_MINIMO_LOTE, FACTOR_PLAZO_LOTE * estimado)
+
+def procesar_lote(archivos, estadisticas_modelos, modelo_costes, presupuesto_tokens, limite):
+    # Ejecuta extracción, OCR y análisis de main sobre un lote y devuelve (ruta, autor, metadata, etapa, error) por archivo.
+    # limite es el instante (time.monotonic) a partir del cual se abandona el lote con PlazoAgotado; los hilos de las
+    # etapas son daemon porque no se pueden cancelar y no deben impedir que el worker termine.
+    cola_archivos, cola_ocr, cola_analisis, cola_organizacion = Queue(), Queue(), Queue(), Queue()
+    recolector = ResultadosLote()
+    for item in archivos:
+        cola_archivos.put(item)
+    cola_archivos.put(FIN)
+    inicio_errores = len(log_data["archivos_error"])
+
+    hilos = [
+        Thread(target=main.procesar_archivos, args=(cola_archivos, cola_ocr, cola_analisis, cola_organizacion, len(archivos), estadisticas_modelos, recolector, modelo_costes)),
+        Thread(target=main.ocr_archivos, args=(cola_ocr, cola_analisis, estadisticas_modelos, modelo_costes)),
+        Thread(target=main.analizar_autores, args=(cola_analisis, cola_organizacion, len(archivos), recolector, presupuesto_tokens)),
+    ]
+    for hilo in hilos:
+        hilo.daemon = True
+        hilo.start()
+    autores = {}
+    try:
+        while True:
+            item = cola_organizacion.get(timeout=max(0.0, limite - time.monotonic()))
+            if item == FIN:
+                break
+            ruta_archivo, autor = item
+            autores[ruta_archivo] = autor
+    except queue.Empty:
+        raise PlazoAgotado(f"El lote no terminó en el plazo previsto ({len(autores)} de {len(archivos)} archivos resueltos).")
+    for hilo in hilos:
+        hilo.join(max(0.0, limite - time.monotonic()))
+        if hilo.is_alive():
+            raise PlazoAgotado("Una etapa del lote no terminó en el plazo previsto.")
+
+    errores = {error["archivo"]: error["error"] for error in log_data["archivos_error"][inicio_errores:]}
+    del log_data["archivos_error"][inicio_errores:]
+    resultados = []
+    for ruta_archivo, _, _ in archivos:
+        if ruta_archivo in autores:
+            metadata, etapa = recolector.filas.get(ruta_archivo, ({}, 'error'))
+            resultados.append((ruta_archivo, autores[ruta_archivo], metadata, etapa, None))
+        else:
+            resultados.append((ruta_archivo, None, {}, None, errores.get(ruta_archivo, "No se obtuvo resultado.")))
+    return resultados
+
+def _renovar_lease(cola, id_lote, worker, duracion, terminado, perdido, limite):
+    # Pasado el plazo del lote se deja de renovar: si el worker sigue vivo pero atascado, el lease vence igualmente
+    while not terminado.wait(duracion / 3) and time.monotonic() < limite:
+        try:
+            if not cola.renovar(id_lote, worker, duracion):
+                perdido.set()
+                return
+        except Exception as e:
+            log_error(worker, f"No se pudo renovar el lote {id_lote}: {e}")
+
+def trabajar(cola, duracion_lease=DURACION_LEASE, backend_inferencia=main.BACKEND_INFERENCIA, hilos_inferencia=main.HILOS_INFERENCIA,
+             presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO):
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    configurar_inferencia(backend_inferencia, hilos_inferencia)
+    configurar_eventos(main.EVENTOS_FILE)
+    manager = Manager()
+    estadisticas_modelos = manager.dict()
+    modelo_costes = ModeloCostes.load(main.COSTES_FILE)
+    lotes = 0
+    try:
+        while True:
+            lote = cola.arrendar(worker, duracion_lease)
+            if lote is None:
+                if not cola.sin_terminar():
+                    break
+                time.sleep(ESPERA_SIN_LOTES)
+                continue
+
+            id_lote, archivos = lote
+            limite = time.monotonic() + plazo_lote(archivos, modelo_costes)
+            terminado, perdido = Event(), Event()
+            renovador = Thread(target=_renovar_lease, args=(cola, id_lote, worker, duracion_lease, terminado, perdido, limite), daemon=True)
+            renovador.start()
+            try:
+                resultados = procesar_lote(archivos, estadisticas_modelos, modelo_costes, presupuesto_tokens, limite)
+                terminado.set()
+                renovador.join()
+                if perdido.is_set() or not cola.completar(id_lote, worker, resultados):
+                    log_error(worker, f"Lote {id_lote} descartado: el lease venció y lo retomó otro worker.")
+                else:
+                    lotes += 1
+            except PlazoAgotado as e:
+                # Los hilos atascados no se pueden detener: se devuelve el lote y el worker termina
+                terminado.set()
+                log_error(worker, f"Lote {id_lote}: {e}")
+                cola.liberar(id_lote, worker, str(e))
+                print(f"Worker {worker}: lote {id_lote} abandonado por exceder su plazo; el worker se detiene.")
+                return False
+            except Exception as e:
+                terminado.set()
+                log_error(worker, f"Lote {id_lote}: {e}")
+                cola.liberar(id_lote, worker, str(e))
+    finally:
+        modelo_costes.save(main.COSTES_FILE)
+        manager.shutdown()
+    print(f"Worker {worker}: {lotes} lotes completados.")
+    return True
+
+def fusionar(cola, modo_organizacion=main.MODO_ORGANIZACION, duplicados_una_vez=main.DUPLICADOS_UNA_VEZ, forzar=False):
+    # Con todos los lotes terminados, empareja autores y coloca los archivos como lo haría main
+    estado = cola.estado()
+    if cola.sin_terminar() and not forzar:
+        print(f"Quedan lotes sin terminar ({estado}); usa --forzar para fusionar lo disponible.")
+        return False
+
+    if not os.path.exists(main.CARPETA_SALIDA):
+        os.makedirs(main.CARPETA_SALIDA)
+    known_authors = AuthorIndex.load(main.AUTHORS_INDEX_FILE)
+    cache = CacheResultados(main.CACHE_FILE)
+    detector = DetectorDuplicados()
+    detector.cargar_grupos(cola.duplicados())
+
+    for id_lote, archivos, error in cola.lotes_fallidos():
+        for ruta_archivo, _, _ in archivos:
+            log_error(ruta_archivo, f"Lote {id_lote} fallido tras varios intentos: {error}")
+
+    cola_organizacion = Queue()
+    filas_cache = []
+    for ruta_archivo, autor, metadata, etapa, error in cola.resultados():
+        if error:
+            log_error(ruta_archivo, error)
+            continue
+        cola_organizacion.put((ruta_archivo, autor))
+        if etapa not in ('cache', 'error'):
+            filas_cache.append((ruta_archivo, autor, metadata, etapa))
+    cola_organizacion.put(FIN)
+    cache.guardar_lote(filas_cache)
+
+    main.organizar_archivos(cola_organizacion, known_authors, cola_organizacion.qsize() - 1, modo_organizacion, detector, cache, duplicados_una_vez)
+    cache.cerrar()
+    known_authors.save(main.AUTHORS_INDEX_FILE)
+    log_data["duplicados"] = detector.reporte()
+    log_data["lotes"] = estado
+    with open(main.LOG_FILE, 'w', encoding='utf-8') as log_file:
+        json.dump(log_data, log_file, indent=4, ensure_ascii=False)
+    print("Fusión terminada.")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Organiza libros por autor repartiendo el trabajo entre varios hosts con una cola en un montaje compartido.")
+    subparsers = parser.add_subparsers(dest='orden', required=True)
+
+    parser_coordinar = subparsers.add_parser('coordinar', help="Escanea la carpeta de entrada y crea los lotes de trabajo.")
+    parser_coordinar.add_argument('--cola', required=True, help="Base de datos SQLite de la cola, en el montaje compartido.")
+    parser_coordinar.add_argument('--carpeta', default=main.CARPETA_ENTRADA, help="Carpeta de entrada, con la misma ruta en todos los hosts.")
+    parser_coordinar.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE)
+    parser_coordinar.add_argument('--manifiesto', action='store_true', dest='usar_manifiesto', help="Usa la lista de archivos del último escaneo.")
+    parser_coordinar.add_argument('--hash', action='store_true', dest='usar_hash', help="Confirma con un hash de contenido los archivos de la caché cuyo mtime cambió.")
+    parser_coordinar.add_argument('--reiniciar', action='store_true', help="Sustituye una cola existente aunque tenga lotes.")
+
+    parser_trabajar = subparsers.add_parser('trabajar', help="Procesa lotes de la cola hasta que no quede ninguno.")
+    parser_trabajar.add_argument('--cola', required=True)
+    parser_trabajar.add_argument('--duracion-lease', type=int, default=DURACION_LEASE, help="Segundos sin renovar tras los que otro worker puede retomar el lote.")
+    parser_trabajar.add_argument('--backend', choices=BACKENDS_INFERENCIA, default=main.BACKEND_INFERENCIA, dest='backend_inferencia')
+    parser_trabajar.add_argument('--hilos-inferencia', type=int, default=main.HILOS_INFERENCIA)
+    parser_trabajar.add_argument('--presupuesto-tokens', type=int, default=PRESUPUESTO_TOKENS_CONTEXTO)
+    parser_trabajar.add_argument('--modelos', choices=['reales', 'stub'], default='reales', help="'stub' sustituye QA, NER y OCR por modelos de prueba, como en benchmark.py.")
+
+    parser_fusionar = subparsers.add_parser('fusionar', help="Empareja autores y coloca los archivos con los resultados de todos los workers.")
+    parser_fusionar.add_argument('--cola', required=True)
+    parser_fusionar.add_argument('--modo', choices=MODOS_ORGANIZACION, default=main.MODO_ORGANIZACION, dest='modo_organizacion')
+    parser_fusionar.add_argument('--duplicados-una-vez', action='store_true')
+    parser_fusionar.add_argument('--forzar', action='store_true', help="Fusiona aunque queden lotes pendientes o en curso.")
+    args = parser.parse_args()
+
+    cola = ColaTrabajo(args.cola)
+    try:
+        if args.orden == 'coordinar':
+            if not cola.vacia() and not args.reiniciar:
+                print(f"La cola {args.cola} ya tiene lotes; usa --reiniciar para sustituirla.")
+                sys.exit(1)
+            coordinar(cola, args.carpeta, args.tamano_lote, args.usar_manifiesto, args.usar_hash)
+        elif args.orden == 'trabajar':
+            if args.modelos == 'stub':
+                from benchmark import instalar_modelos_stub
+                instalar_modelos_stub()
+            if not trabajar(cola, args.duracion_lease, args.backend_inferencia, args.hilos_inferencia, args.presupuesto_tokens):
+                sys.exit(1)
+        elif not fusionar(cola, args.modo_organizacion, args.duplicados_una_vez, args.forzar):
+            sys.exit(1)
+    finally:
+        cola.cerrar()
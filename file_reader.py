@@ -1,35 +1,56 @@
 import os
 import io
 import re
+import codecs
+import zipfile
 import warnings
+import posixpath
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
 from contextlib import redirect_stderr
 
 import fitz
 from PyPDF2 import PdfReader
 from pdfminer.high_level import extract_text as pdfminer_extract_text
-import torch
-import easyocr
-from PIL import Image
 import docx
-from ebooklib import epub
-import pypandoc
-from utils import clean_text, log_error
-from file_types import FORMATOS_ARCHIVOS
+from utils import clean_text, log_error, is_usable_author
+from file_types import FORMATOS_ARCHIVOS, EXTENSIONES_SOPORTADAS
+from metrics import medir, registrar_evento, Cronometro
+from ocr import pagina_necesita_ocr
+from legacy_readers import leer_doc, texto_rtf
+from author_rules import extraer_autor_reglas, UMBRAL_CONFIANZA_REGLAS, MAX_CARACTERES_REGLAS
 
 MAX_PAGES = 10
+# Caracteres de texto de un PDF a partir de los cuales no se leen más páginas
+MAX_PDF_CHARACTERS = 15000
+# Proporción de caracteres no decodificados a partir de la cual una página se pasa a pdfminer
+PROPORCION_ILEGIBLE = 0.1
 MAX_PARAGRAPHS_PER_PAGE = 30
 MAX_EPUB_ITEMS = 10
+# Caracteres de texto de un EPUB a partir de los cuales se deja de descomprimir
+MAX_EPUB_CHARACTERS = 15000
+EPUB_CHUNK_SIZE = 16384
+EPUB_CONTENT_TYPES = {'application/xhtml+xml', 'text/html'}
 MAX_CHARACTERS = 5000
-reader = easyocr.Reader(['en'], gpu=torch.cuda.is_available())
+RTF_HEADER_BYTES = 16384
+# Formatos cuyo lector comprueba el autor de la metadata sobre el archivo que ya abre para el texto, sin abrirlo dos veces
+FORMATOS_METADATA_AL_ABRIR = {'pdf', 'doc'}
 
 def fragment_text(text, max_characters=MAX_CHARACTERS):
-    if len(text) <= max_characters:
-        return [text]
-    fragmentos = [
-        text[:max_characters],
-        text[len(text) // 2 : len(text) // 2 + max_characters],
-        text[-max_characters:],
-    ]
+    # Consecutive windows of up to max_characters, cut at word boundaries
+    fragmentos = []
+    inicio = 0
+    while inicio < len(text):
+        fin = min(len(text), inicio + max_characters)
+        if fin < len(text):
+            corte = text.rfind(' ', inicio, fin)
+            if corte > inicio:
+                fin = corte
+        fragmento = text[inicio:fin].strip()
+        if fragmento:
+            fragmentos.append(fragmento)
+        inicio = fin
     return fragmentos
 
 def extract_metadata_default(ruta_archivo):
@@ -37,21 +58,9 @@ def extract_metadata_default(ruta_archivo):
     return {'author': '', 'title': '', 'filename': filename}
 
 def extract_metadata_pdf(documento, ruta_archivo):
-    metadata = documento.metadata
-    autor = metadata.get("author", "")
-    titulo = metadata.get("title", "")
-    filename = os.path.basename(ruta_archivo)
-    return {'author': autor, 'title': titulo, 'filename': filename}
-
-def extract_metadata_epub(libro, ruta_archivo):
-    titulo = ''
-    autor = ''
-    titulo_meta = libro.get_metadata('DC', 'title')
-    if titulo_meta:
-        titulo = titulo_meta[0][0]
-    autor_meta = libro.get_metadata('DC', 'creator')
-    if autor_meta:
-        autor = autor_meta[0][0]
+    metadata = documento.metadata or {}
+    autor = metadata.get("author") or ''
+    titulo = metadata.get("title") or ''
     filename = os.path.basename(ruta_archivo)
     return {'author': autor, 'title': titulo, 'filename': filename}
 
@@ -62,79 +71,247 @@ def extract_metadata_docx(documento, ruta_archivo):
     filename = os.path.basename(ruta_archivo)
     return {'author': autor, 'title': titulo, 'filename': filename}
 
-def extract_images_from_pdf(documento):
-    texto_extraido = ""
-    for num_pagina in range(min(MAX_PAGES, len(documento))):
-        pagina = documento.load_page(num_pagina)
-        imagenes = pagina.get_images(full=True)
-        for img in imagenes:
-            xref = img[0]
-            base_imagen = documento.extract_image(xref)
-            imagen_bytes = base_imagen["image"]
-            imagen = Image.open(io.BytesIO(imagen_bytes))
-            with io.StringIO() as buf, redirect_stderr(buf):
-                ocr_resultado = reader.readtext(imagen)
-            for resultado in ocr_resultado:
-                texto_extraido += resultado[1] + "\n"
-    return texto_extraido
-
-def process_pdf(ruta_archivo):
+def _xml_text(raiz, nombre):
+    for elemento in raiz.iter():
+        if elemento.tag.rsplit('}', 1)[-1] == nombre and elemento.text and elemento.text.strip():
+            return elemento.text.strip()
+    return ''
+
+def _epub_opf(archivo):
+    contenedor = ElementTree.fromstring(archivo.read('META-INF/container.xml'))
+    ruta_opf = next(elemento.get('full-path') for elemento in contenedor.iter() if elemento.tag.endswith('rootfile'))
+    return ruta_opf, ElementTree.fromstring(archivo.read(ruta_opf))
+
+def _epub_metadata(opf, ruta_archivo):
+    return {'author': _xml_text(opf, 'creator'), 'title': _xml_text(opf, 'title'), 'filename': os.path.basename(ruta_archivo)}
+
+def read_metadata_epub(ruta_archivo):
+    with zipfile.ZipFile(ruta_archivo) as archivo:
+        _, opf = _epub_opf(archivo)
+    return _epub_metadata(opf, ruta_archivo)
+
+def _epub_spine(archivo, ruta_opf, opf):
+    # Content documents in reading order, as paths inside the archive
+    base = posixpath.dirname(ruta_opf)
+    manifiesto = {}
+    for elemento in opf.iter():
+        if elemento.tag.rsplit('}', 1)[-1] == 'item' and elemento.get('media-type') in EPUB_CONTENT_TYPES:
+            manifiesto[elemento.get('id')] = posixpath.normpath(posixpath.join(base, unquote(elemento.get('href', ''))))
+    spine = [manifiesto[elemento.get('idref')] for elemento in opf.iter()
+             if elemento.tag.rsplit('}', 1)[-1] == 'itemref' and elemento.get('idref') in manifiesto]
+    if spine:
+        return spine
+    return [nombre for nombre in archivo.namelist() if nombre.lower().endswith(('.xhtml', '.html', '.htm'))]
+
+class _TextoHTML(HTMLParser):
+    BLOQUES = {'p', 'div', 'br', 'li', 'tr', 'td', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'blockquote', 'title'}
+    IGNORADOS = {'script', 'style', 'head'}
+
+    def __init__(self, partes):
+        super().__init__(convert_charrefs=True)
+        self.partes = partes
+        self.caracteres = 0
+        self.ignorando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.IGNORADOS:
+            self.ignorando += 1
+        elif tag in self.BLOQUES:
+            self.partes.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.IGNORADOS and self.ignorando:
+            self.ignorando -= 1
+
+    def handle_data(self, data):
+        if not self.ignorando:
+            self.partes.append(data)
+            self.caracteres += len(data)
+
+def read_metadata_docx(ruta_archivo):
+    with zipfile.ZipFile(ruta_archivo) as archivo:
+        core = ElementTree.fromstring(archivo.read('docProps/core.xml'))
+    return {'author': _xml_text(core, 'creator'), 'title': _xml_text(core, 'title'), 'filename': os.path.basename(ruta_archivo)}
+
+def _rtf_info(cabecera, campo):
+    coincidencia = re.search(r'\\' + campo + r'\s+([^{}]*)', cabecera)
+    if not coincidencia:
+        return ''
+    valor = re.sub(r"\\'([0-9a-fA-F]{2})", lambda m: bytes.fromhex(m.group(1)).decode('cp1252', errors='replace'), coincidencia.group(1))
+    return re.sub(r'\\[a-z]+-?\d* ?', '', valor).strip()
+
+def read_metadata_rtf(ruta_archivo):
+    with open(ruta_archivo, 'r', encoding='latin-1') as archivo:
+        cabecera = archivo.read(RTF_HEADER_BYTES)
+    return {'author': _rtf_info(cabecera, 'author'), 'title': _rtf_info(cabecera, 'title'), 'filename': os.path.basename(ruta_archivo)}
+
+def _metadata_doc(ruta_archivo, autor, titulo):
+    return {'author': autor, 'title': titulo, 'filename': os.path.basename(ruta_archivo)}
+
+def read_embedded_metadata(ruta_archivo, ext):
+    # Los PDF y DOC no pasan por aquí: su lector comprueba la metadata sobre el archivo que ya abre para el texto
     try:
-        with io.StringIO() as buf, redirect_stderr(buf):
-            texto = pdfminer_extract_text(ruta_archivo, maxpages=MAX_PAGES)
-            if texto.strip():
-                return clean_text(texto), extract_metadata_default(ruta_archivo)
+        if ext in FORMATOS_ARCHIVOS['epub']:
+            return read_metadata_epub(ruta_archivo)
+        elif ext in FORMATOS_ARCHIVOS['docx']:
+            return read_metadata_docx(ruta_archivo)
+        elif ext in FORMATOS_ARCHIVOS['rtf']:
+            return read_metadata_rtf(ruta_archivo)
     except Exception as e:
-        log_error(ruta_archivo, f"Error processing PDF with pdfminer.six: {e}")
+        log_error(ruta_archivo, f"Error reading embedded metadata: {e}")
+    return extract_metadata_default(ruta_archivo)
 
+def _texto_ilegible(texto):
+    # PyMuPDF devuelve U+FFFD para los glifos que no sabe traducir (fuentes sin ToUnicode, codificaciones raras)
+    return texto.count('\ufffd') > len(texto) * PROPORCION_ILEGIBLE
+
+def _paginas_pymupdf(documento):
+    # Genera (num_pagina, tipo, texto) de las primeras MAX_PAGES. tipo es 'texto'; 'ocr' si la página es una imagen
+    # sin capa de texto; 'pendiente' si PyMuPDF no pudo decodificarla y debe probar otro motor; o 'vacia'.
+    for num_pagina in range(min(MAX_PAGES, len(documento))):
+        try:
+            pagina = documento.load_page(num_pagina)
+            texto_pagina = pagina.get_text()
+            if _texto_ilegible(texto_pagina):
+                yield num_pagina, 'pendiente', None
+            elif texto_pagina.strip():
+                yield num_pagina, 'texto', texto_pagina
+            elif pagina_necesita_ocr(pagina):
+                yield num_pagina, 'ocr', None
+            elif pagina.get_fonts():
+                # Tiene fuentes pero PyMuPDF no sacó texto: otro motor puede decodificarla
+                yield num_pagina, 'pendiente', None
+            else:
+                yield num_pagina, 'vacia', None
+        except Exception:
+            yield num_pagina, 'pendiente', None
+
+def _paginas_pdfminer(ruta_archivo, paginas):
+    # Una sola pasada de pdfminer para todas las páginas pendientes; separa cada página con un salto de página
+    with medir('pdf_pdfminer', ruta_archivo), io.StringIO() as buf, redirect_stderr(buf):
+        texto = pdfminer_extract_text(ruta_archivo, page_numbers=paginas, maxpages=MAX_PAGES)
+    return {num_pagina: texto_pagina for num_pagina, texto_pagina in zip(sorted(paginas), texto.split('\f')) if texto_pagina.strip()}
+
+def _paginas_pypdf2(ruta_archivo, paginas):
+    textos = {}
+    with medir('pdf_pypdf2', ruta_archivo), io.StringIO() as buf, redirect_stderr(buf):
+        lector = PdfReader(ruta_archivo)
+        for num_pagina in paginas:
+            if num_pagina < len(lector.pages):
+                texto_pagina = lector.pages[num_pagina].extract_text()
+                if texto_pagina and texto_pagina.strip():
+                    textos[num_pagina] = texto_pagina
+    return textos
+
+def _pista_autor(textos):
+    # Solo cuenta lo que dicen las páginas: la regla del nombre de archivo no lee el texto y se deja al análisis.
+    # Las reglas solo miran el principio del texto, así que solo ahí una coincidencia segura vuelve inútil leer más.
+    autor, confianza, _ = extraer_autor_reglas(clean_text('\n'.join(textos[num_pagina] for num_pagina in sorted(textos))), '')
+    return autor is not None and confianza >= UMBRAL_CONFIANZA_REGLAS
+
+def process_pdf(ruta_archivo, metadata_primero=False):
+    # Abre el PDF una sola vez con PyMuPDF, el motor más rápido, y lee página a página hasta agotar el presupuesto de
+    # caracteres o encontrar una pista de autor segura. pdfminer y PyPDF2 solo reciben las páginas que PyMuPDF no decodificó.
+    # Con metadata_primero, un autor utilizable en la metadata evita leer páginas y se devuelve (None, metadata).
+    textos = {}
+    pendientes = []
+    paginas_ocr = []
+    salida = 'fin_documento'
+    metadata = extract_metadata_default(ruta_archivo)
+    # El tiempo de las reglas se mide aparte para que 'pdf_pymupdf' sea solo el del motor
+    cronometro = Cronometro('pdf_pymupdf', ruta_archivo)
+    cronometro_reglas = Cronometro('pdf_pista_autor', ruta_archivo)
     try:
         with io.StringIO() as buf, redirect_stderr(buf):
-            documento = fitz.open(ruta_archivo)
-            texto = ""
-            metadata = extract_metadata_pdf(documento, ruta_archivo)
-            for num_pagina in range(min(MAX_PAGES, len(documento))):
-                pagina = documento.load_page(num_pagina)
-                texto += pagina.get_text() + "\n"
-            texto_imagenes = extract_images_from_pdf(documento)
-            texto += texto_imagenes
-            if texto.strip():
-                return clean_text(texto), metadata
+            with cronometro.tramo():
+                documento = fitz.open(ruta_archivo)
+            with documento:
+                with cronometro.tramo():
+                    metadata = extract_metadata_pdf(documento, ruta_archivo)
+                if metadata_primero and is_usable_author(metadata['author']):
+                    return None, metadata
+                paginas = _paginas_pymupdf(documento)
+                caracteres = 0
+                while True:
+                    with cronometro.tramo():
+                        num_pagina, tipo, texto_pagina = next(paginas, (None, None, None))
+                    if num_pagina is None:
+                        break
+                    if tipo == 'pendiente':
+                        pendientes.append(num_pagina)
+                    elif tipo == 'ocr':
+                        paginas_ocr.append(num_pagina)
+                    elif tipo == 'texto':
+                        textos[num_pagina] = texto_pagina
+                        caracteres += len(texto_pagina)
+                        if caracteres >= MAX_PDF_CHARACTERS:
+                            salida = 'presupuesto'
+                            break
+                        if caracteres - len(texto_pagina) < MAX_CARACTERES_REGLAS:
+                            with cronometro_reglas.tramo():
+                                pista = _pista_autor(textos)
+                            if pista:
+                                salida = 'pista_autor'
+                                break
     except Exception as e:
         log_error(ruta_archivo, f"Error processing PDF with PyMuPDF: {e}")
+        salida = 'error_pymupdf'
+        pendientes = list(range(MAX_PAGES))
+    finally:
+        cronometro.registrar()
+        cronometro_reglas.registrar()
 
-    try:
-        with io.StringIO() as buf, redirect_stderr(buf):
-            lector = PdfReader(ruta_archivo)
-            num_paginas = min(MAX_PAGES, len(lector.pages))
-            texto = ''
-            for num_pagina in range(num_paginas):
-                pagina = lector.pages[num_pagina]
-                texto_pagina = pagina.extract_text()
-                if texto_pagina:
-                    texto += texto_pagina + '\n'
-            if texto.strip():
-                return clean_text(texto), extract_metadata_default(ruta_archivo)
-    except Exception as e:
-        log_error(ruta_archivo, f"Error processing PDF with PyPDF2: {e}")
+    for motor, extraer in (('pdfminer', _paginas_pdfminer), ('pypdf2', _paginas_pypdf2)):
+        if not pendientes:
+            break
+        try:
+            recuperadas = extraer(ruta_archivo, pendientes)
+        except Exception as e:
+            log_error(ruta_archivo, f"Error processing PDF with {motor}: {e}")
+            continue
+        textos.update(recuperadas)
+        pendientes = [num_pagina for num_pagina in pendientes if num_pagina not in recuperadas]
+
+    registrar_evento('pdf_paginas', archivo=ruta_archivo, salida=salida, texto=len(textos), ocr=len(paginas_ocr), sin_texto=len(pendientes))
+    texto = clean_text('\n'.join(textos[num_pagina] for num_pagina in sorted(textos)))
+    if paginas_ocr and salida != 'pista_autor':
+        # Las páginas sin capa de texto se resuelven en la etapa de OCR, que intercala su texto por número de página
+        metadata['paginas_ocr'] = paginas_ocr
+        metadata['textos_paginas'] = textos
+        return texto, metadata
+    if texto:
+        return texto, metadata
 
     log_error(ruta_archivo, "No se pudo extraer el texto del PDF.")
     return None, None
 
 def process_epub(ruta_archivo):
+    # Reads only the OPF and the first spine documents, decompressing each one in chunks until the
+    # character budget is reached; images, fonts and the rest of the book are never touched.
     try:
-        with io.StringIO() as buf, redirect_stderr(buf):
-            libro = epub.read_epub(ruta_archivo)
-            texto = ''
-            conteo = 0
-            for item in libro.get_items():
-                if item.get_type() == epub.EpubHtml:
-                    contenido = item.get_content().decode('utf-8', errors='ignore')
-                    contenido = re.sub(r'<[^>]+>', '', contenido)
-                    texto += contenido + '\n'
-                    conteo += 1
-                    if conteo >= MAX_EPUB_ITEMS:
-                        break
-        return clean_text(texto), extract_metadata_epub(libro, ruta_archivo)
+        partes = []
+        with zipfile.ZipFile(ruta_archivo) as archivo:
+            ruta_opf, opf = _epub_opf(archivo)
+            parser = _TextoHTML(partes)
+            for nombre in _epub_spine(archivo, ruta_opf, opf)[:MAX_EPUB_ITEMS]:
+                try:
+                    with archivo.open(nombre) as contenido:
+                        # Incremental decoder: a multi-byte character split across two chunks is kept whole
+                        decodificador = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                        for bloque in iter(lambda: contenido.read(EPUB_CHUNK_SIZE), b''):
+                            parser.feed(decodificador.decode(bloque))
+                            if parser.caracteres >= MAX_EPUB_CHARACTERS:
+                                break
+                        else:
+                            parser.feed(decodificador.decode(b'', final=True))
+                except KeyError:
+                    continue
+                parser.close()
+                parser.reset()
+                partes.append('\n')
+                if parser.caracteres >= MAX_EPUB_CHARACTERS:
+                    break
+        return clean_text(''.join(partes)), _epub_metadata(opf, ruta_archivo)
     except Exception as e:
         log_error(ruta_archivo, f"Error processing EPUB: {e}")
         return None, None
@@ -152,33 +329,47 @@ def process_docx(ruta_archivo):
         log_error(ruta_archivo, f"Error processing DOCX: {e}")
         return None, None
 
-def process_doc(ruta_archivo):
+def process_doc(ruta_archivo, metadata_primero=False):
     try:
-        with io.StringIO() as buf, redirect_stderr(buf):
-            texto = pypandoc.convert_file(ruta_archivo, 'plain', format='doc')
-        return clean_text(texto), extract_metadata_default(ruta_archivo)
+        texto, (autor, titulo) = leer_doc(ruta_archivo, basta_autor=is_usable_author if metadata_primero else None)
+        metadata = _metadata_doc(ruta_archivo, autor, titulo)
+        if texto is None:
+            return None, metadata
+        return clean_text(texto), metadata
     except Exception as e:
         log_error(ruta_archivo, f"Error processing DOC: {e}")
         return None, None
 
 def process_rtf(ruta_archivo):
     try:
-        with io.StringIO() as buf, redirect_stderr(buf):
-            texto = pypandoc.convert_file(ruta_archivo, 'plain', format='rtf')
-        return clean_text(texto), extract_metadata_default(ruta_archivo)
+        texto = texto_rtf(ruta_archivo)
+        return clean_text(texto), read_metadata_rtf(ruta_archivo)
     except Exception as e:
         log_error(ruta_archivo, f"Error processing RTF: {e}")
         return None, None
 
-def process_file(ruta_archivo, ext):
+def process_file_metadata_first(ruta_archivo, ext):
+    formato = EXTENSIONES_SOPORTADAS.get(ext, ext)
+    if formato in FORMATOS_METADATA_AL_ABRIR:
+        # El lector comprueba la metadata con el archivo ya abierto; su tiempo cuenta como parte de la extracción
+        with medir(f"extraccion_{formato}", ruta_archivo):
+            return process_file(ruta_archivo, ext, metadata_primero=True)
+    with medir('metadata_embebida', ruta_archivo):
+        metadata = read_embedded_metadata(ruta_archivo, ext)
+    if is_usable_author(metadata['author']):
+        return None, metadata
+    with medir(f"extraccion_{formato}", ruta_archivo):
+        return process_file(ruta_archivo, ext)
+
+def process_file(ruta_archivo, ext, metadata_primero=False):
     if ext in FORMATOS_ARCHIVOS['pdf']:
-        return process_pdf(ruta_archivo)
+        return process_pdf(ruta_archivo, metadata_primero)
     elif ext in FORMATOS_ARCHIVOS['epub']:
         return process_epub(ruta_archivo)
     elif ext in FORMATOS_ARCHIVOS['docx']:
         return process_docx(ruta_archivo)
     elif ext in FORMATOS_ARCHIVOS['doc']:
-        return process_doc(ruta_archivo)
+        return process_doc(ruta_archivo, metadata_primero)
     elif ext in FORMATOS_ARCHIVOS['rtf']:
         return process_rtf(ruta_archivo)
     else:
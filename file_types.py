@@ -29,10 +29,32 @@ RESPUESTA_IA_NO_ENCONTRADA = [
     'no answer to that one',
 ]
 
+AUTORES_NO_VALIDOS = [
+    'unknown',
+    'desconocido',
+    'autor desconocido',
+    'anonymous',
+    'anonimo',
+    'admin',
+    'administrator',
+    'administrador',
+    'user',
+    'usuario',
+    'owner',
+    'propietario',
+    'windows user',
+    'microsoft office user',
+    'pythondocx',
+    'calibre',
+    'none',
+    'null',
+]
+
 QUESTIONS_AUTHOR_VARIATIONS = [
     "¿Quién es el autor del libro?",
     "¿Quién escribió este libro?",
     "¿Quién es el creador del texto?",
     "¿De quién es este libro?",
     "¿Cuál es el autor de este documento?",
-]
\ No newline at end of file
+]
+EXTENSIONES_SOPORTADAS = {ext.lower(): formato for formato, extensiones in FORMATOS_ARCHIVOS.items() for ext in extensiones}
@@ -0,0 +1,274 @@
+import re
+import time
+import codecs
+import struct
+
+# Texto que se extrae como máximo de un DOC o RTF; lo que sigue no llega a los modelos
+MAX_LEGACY_CHARACTERS = 15000
+# Segundos máximos de extracción por archivo
+LEGACY_TIMEOUT = 30
+# Los RTF con imágenes incrustadas pueden ser enormes; el texto de las primeras páginas está al principio
+RTF_MAX_BYTES = 32 * 1024 * 1024
+# Cada cuántos tokens RTF o fragmentos DOC se comprueba el tiempo límite
+INTERVALO_TIMEOUT = 4096
+
+class TiempoAgotado(Exception):
+    pass
+
+def _comprobar_tiempo(limite):
+    if time.monotonic() > limite:
+        raise TiempoAgotado(f"Extracción cancelada tras {LEGACY_TIMEOUT}s")
+
+def _codificacion(pagina_codigos):
+    # La página de códigos la declara el propio archivo; si Python no la conoce se lee como cp1252
+    try:
+        return codecs.lookup(f"cp{pagina_codigos}").name
+    except LookupError:
+        return 'cp1252'
+
+# --- RTF ---
+
+PATRON_RTF = re.compile(r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\([^a-zA-Z])|([{}])|[\r\n]+|([^\\{}\r\n]+)")
+# Grupos cuyo contenido no es texto del documento
+DESTINOS_RTF_IGNORADOS = {
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'object', 'objdata', 'fldinst', 'datafield',
+    'header', 'headerl', 'headerr', 'headerf', 'footer', 'footerl', 'footerr', 'footerf', 'footnote',
+    'listtable', 'listoverridetable', 'revtbl', 'rsidtbl', 'generator', 'xmlnstbl', 'themedata',
+    'colorschememapping', 'latentstyles', 'datastore', 'filetbl', 'pgdsctbl', 'bkmkstart', 'bkmkend',
+}
+ESPECIALES_RTF = {
+    'par': '\n', 'line': '\n', 'sect': '\n', 'page': '\n', 'row': '\n', 'tab': '\t', 'cell': ' ',
+    'emdash': '—', 'endash': '–', 'lquote': '‘', 'rquote': '’', 'ldblquote': '“', 'rdblquote': '”', 'bullet': '•',
+}
+SIMBOLOS_RTF = {'\\': '\\', '{': '{', '}': '}', '~': ' ', '_': '-', '-': ''}
+
+def texto_rtf(ruta_archivo, max_caracteres=MAX_LEGACY_CHARACTERS, timeout=LEGACY_TIMEOUT):
+    # Recorre los tokens RTF una sola vez y se detiene al llegar a max_caracteres
+    with open(ruta_archivo, 'rb') as archivo:
+        datos = archivo.read(RTF_MAX_BYTES).decode('latin-1')
+
+    limite = time.monotonic() + timeout
+    pila = []
+    ignorar = False
+    uc = 1
+    saltar = 0
+    codificacion = 'cp1252'
+    partes = []
+    caracteres = 0
+    for i, token in enumerate(PATRON_RTF.finditer(datos)):
+        if i % INTERVALO_TIMEOUT == 0:
+            _comprobar_tiempo(limite)
+        palabra, argumento, hexadecimal, simbolo, llave, texto = token.groups()
+        if llave == '{':
+            pila.append((ignorar, uc))
+            continue
+        if llave == '}':
+            ignorar, uc = pila.pop() if pila else (False, 1)
+            continue
+        if saltar:
+            # Caracteres de reserva que siguen a un \uN para lectores sin Unicode
+            if hexadecimal:
+                saltar -= 1
+                continue
+            if texto:
+                omitidos = min(saltar, len(texto))
+                texto = texto[omitidos:]
+                saltar -= omitidos
+
+        nuevo = ''
+        if simbolo is not None:
+            if simbolo == '*':
+                ignorar = True
+            nuevo = SIMBOLOS_RTF.get(simbolo, '')
+        elif palabra is not None:
+            if palabra in DESTINOS_RTF_IGNORADOS:
+                ignorar = True
+            elif palabra == 'ansicpg' and argumento:
+                codificacion = _codificacion(argumento)
+            elif palabra == 'uc' and argumento:
+                uc = int(argumento)
+            elif palabra == 'u' and argumento:
+                nuevo = chr(int(argumento) % 65536)
+                saltar = uc
+            else:
+                nuevo = ESPECIALES_RTF.get(palabra, '')
+        elif hexadecimal is not None:
+            nuevo = bytes.fromhex(hexadecimal).decode(codificacion, errors='replace')
+        elif texto:
+            nuevo = texto
+
+        if nuevo and not ignorar:
+            partes.append(nuevo)
+            caracteres += len(nuevo)
+            if caracteres >= max_caracteres:
+                break
+    return ''.join(partes)
+
+# --- DOC (Word 97-2003) ---
+
+OLE_FIRMA = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+OLE_FIN_CADENA = 0xFFFFFFFE
+WORD_IDENT = 0xA5EC
+
+class ArchivoOLE:
+    # Lector mínimo de Compound File Binary (el contenedor de los .doc): solo lectura de streams por nombre.
+    # Lee del archivo abierto solo los sectores de las tablas y de los streams que se piden; las imágenes
+    # y objetos incrustados, que suelen ser la mayor parte de un .doc, no se leen.
+    def __init__(self, archivo):
+        cabecera = archivo.read(512)
+        if cabecera[:8] != OLE_FIRMA:
+            raise ValueError("No es un archivo OLE")
+        self.archivo = archivo
+        self.tam_sector = 1 << struct.unpack_from('<H', cabecera, 30)[0]
+        self.tam_mini = 1 << struct.unpack_from('<H', cabecera, 32)[0]
+        num_fat, inicio_directorio = struct.unpack_from('<II', cabecera, 44)
+        self.limite_mini, inicio_minifat, _, inicio_difat, num_difat = struct.unpack_from('<IIIII', cabecera, 56)
+
+        difat = list(struct.unpack_from('<109I', cabecera, 76))
+        sector = inicio_difat
+        por_sector = self.tam_sector // 4
+        for _ in range(num_difat):
+            if sector >= OLE_FIN_CADENA:
+                break
+            entradas = struct.unpack_from(f'<{por_sector}I', self._sector(sector))
+            difat.extend(entradas[:-1])
+            sector = entradas[-1]
+        self.fat = []
+        for sector in difat[:num_fat]:
+            self.fat.extend(struct.unpack_from(f'<{por_sector}I', self._sector(sector)))
+
+        directorio = self._cadena(inicio_directorio, self.fat, self._sector)
+        self.entradas = {}
+        for desplazamiento in range(0, len(directorio) - 127, 128):
+            longitud_nombre, tipo = struct.unpack_from('<HB', directorio, desplazamiento + 64)
+            if tipo == 0:
+                continue
+            nombre = directorio[desplazamiento:desplazamiento + max(0, longitud_nombre - 2)].decode('utf-16-le', errors='ignore')
+            inicio, tamano = struct.unpack_from('<II', directorio, desplazamiento + 116)
+            self.entradas.setdefault(nombre, (tipo, inicio, tamano))
+
+        minifat = self._cadena(inicio_minifat, self.fat, self._sector)
+        self.minifat = list(struct.unpack_from(f'<{len(minifat) // 4}I', minifat))
+        self.mini_stream = None
+
+    def _sector(self, indice, cuenta=1):
+        self.archivo.seek((indice + 1) * self.tam_sector)
+        return self.archivo.read(cuenta * self.tam_sector)
+
+    def _mini_sector(self, indice, cuenta=1):
+        if self.mini_stream is None:
+            # Los streams pequeños viven dentro del de Root Entry, que solo se lee si se pide alguno
+            _, inicio_raiz, tamano_raiz = self.entradas.get('Root Entry', (5, OLE_FIN_CADENA, 0))
+            self.mini_stream = self._cadena(inicio_raiz, self.fat, self._sector)[:tamano_raiz]
+        return self.mini_stream[indice * self.tam_mini:(indice + cuenta) * self.tam_mini]
+
+    @staticmethod
+    def _cadena(inicio, tabla, leer):
+        # Los sectores consecutivos de la cadena se leen de una vez
+        partes = []
+        sector = inicio
+        # El límite evita bucles infinitos con tablas corruptas
+        restantes = len(tabla) + 1
+        while restantes > 0 and sector < OLE_FIN_CADENA and sector < len(tabla):
+            primero, cuenta = sector, 1
+            sector = tabla[sector]
+            restantes -= 1
+            while restantes > 0 and sector == primero + cuenta and sector < len(tabla):
+                cuenta += 1
+                sector = tabla[sector]
+                restantes -= 1
+            partes.append(leer(primero, cuenta))
+        return b''.join(partes)
+
+    def existe(self, nombre):
+        return nombre in self.entradas
+
+    def leer(self, nombre):
+        _, inicio, tamano = self.entradas[nombre]
+        if tamano < self.limite_mini:
+            return self._cadena(inicio, self.minifat, self._mini_sector)[:tamano]
+        return self._cadena(inicio, self.fat, self._sector)[:tamano]
+
+def _limpiar_texto_word(texto):
+    # 0x13 inicia un campo, 0x14 separa su código del resultado visible y 0x15 lo cierra
+    texto = re.sub(r'\x13[^\x13\x14\x15]*\x14', '', texto)
+    texto = re.sub(r'\x13[^\x13\x14\x15]*\x15', '', texto)
+    texto = texto.replace('\x14', '').replace('\x15', '')
+    return re.sub(r'[\r\x07\x0b\x0c]', '\n', texto)
+
+def _texto_word(ole, max_caracteres, limite):
+    # Lee el texto de un Word 97-2003 desde su tabla de piezas (Clx), sin convertir el documento
+    documento = ole.leer('WordDocument')
+    if struct.unpack_from('<H', documento, 0)[0] != WORD_IDENT:
+        raise ValueError("El stream WordDocument no tiene un FIB de Word 97 o posterior")
+    banderas = struct.unpack_from('<H', documento, 0x0A)[0]
+    if banderas & 0x0100:
+        raise ValueError("Documento cifrado")
+    tabla = ole.leer('1Table' if banderas & 0x0200 else '0Table')
+    fc_clx, lcb_clx = struct.unpack_from('<II', documento, 0x01A2)
+    clx = tabla[fc_clx:fc_clx + lcb_clx]
+
+    posicion = 0
+    while posicion < len(clx) and clx[posicion] == 0x01:
+        posicion += 3 + struct.unpack_from('<H', clx, posicion + 1)[0]
+    if posicion >= len(clx) or clx[posicion] != 0x02:
+        raise ValueError("Tabla de piezas no encontrada")
+    lcb = struct.unpack_from('<I', clx, posicion + 1)[0]
+    plc = clx[posicion + 5:posicion + 5 + lcb]
+    piezas = (lcb - 4) // 12
+    cps = struct.unpack_from(f'<{piezas + 1}I', plc)
+
+    partes = []
+    caracteres = 0
+    for i in range(piezas):
+        if i % INTERVALO_TIMEOUT == 0:
+            _comprobar_tiempo(limite)
+        fc = struct.unpack_from('<I', plc, 4 * (piezas + 1) + 8 * i + 2)[0]
+        longitud = min(cps[i + 1] - cps[i], max_caracteres - caracteres)
+        if fc & 0x40000000:
+            inicio = (fc & 0x3FFFFFFF) // 2
+            partes.append(documento[inicio:inicio + longitud].decode('cp1252', errors='replace'))
+        else:
+            partes.append(documento[fc:fc + 2 * longitud].decode('utf-16-le', errors='replace'))
+        caracteres += longitud
+        if caracteres >= max_caracteres:
+            break
+    return _limpiar_texto_word(''.join(partes))
+
+def _propiedades_resumen(datos):
+    # Property set de \x05SummaryInformation: 2 = título, 4 = autor, 1 = página de códigos
+    desplazamiento_seccion = struct.unpack_from('<I', datos, 44)[0]
+    num_propiedades = struct.unpack_from('<I', datos, desplazamiento_seccion + 4)[0]
+    propiedades = {}
+    for i in range(num_propiedades):
+        identificador, desplazamiento = struct.unpack_from('<II', datos, desplazamiento_seccion + 8 + 8 * i)
+        inicio = desplazamiento_seccion + desplazamiento
+        tipo = struct.unpack_from('<I', datos, inicio)[0]
+        if tipo == 2:
+            propiedades[identificador] = struct.unpack_from('<h', datos, inicio + 4)[0]
+        elif tipo == 30:
+            longitud = struct.unpack_from('<I', datos, inicio + 4)[0]
+            propiedades[identificador] = datos[inicio + 8:inicio + 8 + longitud]
+    codificacion = _codificacion(propiedades.get(1, 1252) % 65536)
+    def cadena(identificador):
+        valor = propiedades.get(identificador)
+        if not isinstance(valor, bytes):
+            return ''
+        return valor.decode(codificacion, errors='replace').rstrip('\x00').strip()
+    return cadena(4), cadena(2)
+
+def _metadata_ole(ole):
+    if not ole.existe('\x05SummaryInformation'):
+        return '', ''
+    return _propiedades_resumen(ole.leer('\x05SummaryInformation'))
+
+def leer_doc(ruta_archivo, max_caracteres=MAX_LEGACY_CHARACTERS, timeout=LEGACY_TIMEOUT, basta_autor=None):
+    # Devuelve el texto y (autor, título) recorriendo el contenedor OLE una sola vez. La metadata se lee primero:
+    # si basta_autor(autor) es cierto el texto no se extrae y se devuelve None en su lugar.
+    limite = time.monotonic() + timeout
+    with open(ruta_archivo, 'rb') as archivo:
+        ole = ArchivoOLE(archivo)
+        autor, titulo = _metadata_ole(ole)
+        if basta_autor is not None and basta_autor(autor):
+            return None, (autor, titulo)
+        return _texto_word(ole, max_caracteres, limite), (autor, titulo)
@@ -1,151 +1,406 @@
 import os
 import json
+import argparse
+from queue import Queue
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
-from multiprocessing import Manager, Queue
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Manager
 from threading import Thread
 from dotenv import load_dotenv
-from analysis import extract_authors_batch
-from file_reader import process_file
-from organizer import organize_file
-from utils import log_data, log_error, cargar_archivos, contar_archivos, normalize_author_name, get_best_matching_author
+from analysis import extract_authors_batch, configurar_inferencia, ETAPAS_AUTOR, BACKENDS_INFERENCIA
+from context_selector import PRESUPUESTO_TOKENS_CONTEXTO
+from file_reader import process_file_metadata_first
+from ocr import process_ocr
+from organizer import organize_files, MODOS_ORGANIZACION
+from cache import CacheResultados
+from dedup import DetectorDuplicados
+from author_index import AuthorIndex
+from models import inicializar_worker, precargar_modelos, reporte_modelos
+from pipeline import FIN, ejecutar_etapa, ejecutar_etapa_por_coste, recoger_lote, vaciar_hasta_fin
+from scheduler import ModeloCostes, medir_tarea, POOL_POR_FORMATO
+from workers import PoolReciclable, TareaAbortada
+from file_types import EXTENSIONES_SOPORTADAS
+from metrics import configurar_eventos, registrar_evento, medir, EscritorMetricas
+from utils import log_data, log_error, incrementar_contador, cargar_archivos, contar_archivos, normalize_author_name, get_best_matching_author
 
 load_dotenv()
 
 CARPETA_ENTRADA = '/mnt/FASTDATA/LibrosBiblioteca'
 CARPETA_SALIDA = 'Libros_Organizados'
 LOG_FILE = 'errores_procesamiento.json'
+CACHE_FILE = 'cache_resultados.sqlite'
+AUTHORS_INDEX_FILE = 'indice_autores.json'
+MANIFEST_FILE = 'manifiesto_archivos.json'
+EVENTOS_FILE = 'eventos.jsonl'
+METRICAS_FILE = 'metricas.prom'
+COSTES_FILE = 'modelo_costes.json'
+# Cómo se colocan los libros en la carpeta de salida: 'copia', 'hardlink', 'reflink', 'symlink', 'mover' o 'auto'
+MODO_ORGANIZACION = 'copia'
+# Si es True, de cada grupo de archivos idénticos solo se coloca el representante en la carpeta de salida
+DUPLICADOS_UNA_VEZ = False
+INTERVALO_METRICAS = 15
 MAX_WORKERS = os.cpu_count()
+OCR_WORKERS = 2
+# Workers del pool de formatos rápidos (EPUB, DOC, RTF), separado del de PDF y DOCX para que no esperen detrás de ellos
+LIGERO_WORKERS = 2
 BATCH_SIZE = 64
+INFERENCE_BATCH_SIZE = 16
+# Tareas en ejecución simultánea por etapa; por encima del número de workers para que nunca queden ociosos
+MAX_EN_VUELO_EXTRACCION = MAX_WORKERS * 2
+MAX_EN_VUELO_OCR = OCR_WORKERS * 2
+MAX_EN_VUELO_LIGERO = LIGERO_WORKERS * 2
+# Elementos leídos por adelantado entre los que se elige el más costoso para despachar primero
+VENTANA_PLANIFICACION = BATCH_SIZE * 4
+MAX_EN_VUELO_ORGANIZACION = MAX_WORKERS * 4
+# Los workers de extracción se sustituyen por procesos nuevos tras este número de archivos o cuando su memoria
+# privada crece más de este límite desde que arrancaron, para devolver la memoria que PyMuPDF y pdfminer no
+# liberan. Se mide el crecimiento y no el RSS porque un hijo de fork cuenta como propias las páginas del padre.
+# None desactiva cada límite.
+TAREAS_POR_WORKER = 200
+LIMITE_RECICLAJE_MB = 1024
+# Un archivo que tarda más o durante el que su worker crece más de esta memoria se da por fallido y el worker se mata
+TIMEOUT_ARCHIVO = 300
+LIMITE_MEMORIA_ARCHIVO_MB = 4096
+# Los workers de OCR cargan easyocr en su primera tarea, así que se reciclan solo por memoria y tienen márgenes más amplios
+LIMITE_RECICLAJE_OCR_MB = 4096
+TIMEOUT_OCR = 1800
+LIMITE_MEMORIA_OCR_MB = 6144
+# Capacidad de las colas entre etapas; una etapa lenta frena a la anterior en lugar de acumular memoria
+TAMANO_COLA = BATCH_SIZE * 4
+# Segundos que el análisis espera a que se complete un lote antes de procesar lo que tenga
+ESPERA_LOTE_ANALISIS = 0.5
+# Modelos ('ocr', 'qa', 'ner') que se cargan en el proceso principal antes de crear el pool de extracción
+MODELOS_PRECARGADOS = ()
+# Backend de QA/NER ('eager', 'int8' u 'onnx') y sus hilos intra-op; conviene dejar núcleos libres para el pool de extracción
+BACKEND_INFERENCIA = 'eager'
+HILOS_INFERENCIA = None
 
-def procesar_archivos(cola_archivos, cola_analisis, total_archivos):
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        with tqdm(total=total_archivos, desc="Extrayendo texto de archivos", unit="archivo") as pbar:
-            while True:
-                batch_archivos = cola_archivos.get()
-                if batch_archivos == "FIN":
-                    cola_analisis.put("FIN")
-                    log_error("procesar_archivos", "Proceso de extracción de textos finalizado.")
-                    break
-
-                futuros = {executor.submit(process_file, ruta_archivo, ext): ruta_archivo for ruta_archivo, ext in batch_archivos}
-                textos_para_procesar = []
-                rutas_archivos = []
-                autores_extraidos = []
-                metadatas = []
-
-                for futuro in as_completed(futuros):
-                    ruta_archivo = futuros[futuro]
+def deduplicar_archivos(cola_escaneo, cola_archivos, cola_organizacion, detector):
+    try:
+        while True:
+            item = cola_escaneo.get()
+            if item == FIN:
+                break
+            ruta_archivo, ext, *cacheado = item
+            if cacheado:
+                # Duplicado tomado de la caché: ya tiene autor, solo se vuelve a asociar a su representante
+                representante, autor = cacheado
+                incrementar_contador("duplicados")
+                detector.registrar_cacheado(representante, ruta_archivo)
+                cola_organizacion.put((ruta_archivo, autor))
+                continue
+            tamano = 0
+            try:
+                with medir('deduplicacion', ruta_archivo):
+                    tamano = os.path.getsize(ruta_archivo)
+                    representante = detector.buscar_representante(ruta_archivo, tamano)
+            except Exception as e:
+                log_error(ruta_archivo, str(e))
+                representante = None
+            if representante is None:
+                cola_archivos.put((ruta_archivo, ext, tamano))
+                continue
+
+            incrementar_contador("duplicados")
+            resuelto, autor = detector.registrar_duplicado(representante, ruta_archivo)
+            if resuelto:
+                cola_organizacion.put((ruta_archivo, autor))
+    finally:
+        cola_archivos.put(FIN)
+        log_error("deduplicar_archivos", "Detección de duplicados finalizada.")
+
+def procesar_archivos(cola_archivos, cola_ocr, cola_analisis, cola_organizacion, total_archivos, estadisticas_modelos, cache, modelo_costes,
+                      tareas_por_worker=TAREAS_POR_WORKER, limite_reciclaje_mb=LIMITE_RECICLAJE_MB, timeout_archivo=TIMEOUT_ARCHIVO,
+                      limite_memoria_mb=LIMITE_MEMORIA_ARCHIVO_MB):
+    resultados_cache = []
+    configuracion = {'initializer': inicializar_worker, 'initargs': (estadisticas_modelos, EVENTOS_FILE),
+                     'max_tareas_por_worker': tareas_por_worker, 'limite_reciclaje_mb': limite_reciclaje_mb,
+                     'timeout_tarea': timeout_archivo, 'limite_memoria_tarea_mb': limite_memoria_mb}
+
+    iniciada = False
+    try:
+        with PoolReciclable(MAX_WORKERS, nombre='pesado', **configuracion) as executor_pesado, \
+                PoolReciclable(LIGERO_WORKERS, nombre='ligero', **configuracion) as executor_ligero:
+            executors = {'pesado': executor_pesado, 'ligero': executor_ligero}
+            pools = {'pesado': (MAX_EN_VUELO_EXTRACCION, MAX_WORKERS), 'ligero': (MAX_EN_VUELO_LIGERO, LIGERO_WORKERS)}
+            with tqdm(total=total_archivos, desc="Extrayendo texto de archivos", unit="archivo") as pbar:
+                def clasificar(item):
+                    _, ext, tamano = item
+                    pool = POOL_POR_FORMATO.get(EXTENSIONES_SOPORTADAS.get(ext.lower()), 'pesado')
+                    return pool, modelo_costes.estimar_archivo(ext, tamano)
+
+                def enviar(item, pool):
+                    ruta_archivo, ext, _ = item
+                    return executors[pool].submit(medir_tarea, process_file_metadata_first, ruta_archivo, ext,
+                                                  etiqueta=EXTENSIONES_SOPORTADAS.get(ext.lower(), ext))
+
+                def al_completar(item, futuro):
+                    ruta_archivo, ext, tamano = item
                     try:
-                        result, metadata = futuro.result()
-                        if result is not None:
-                            textos_para_procesar.append(result)
-                            rutas_archivos.append(ruta_archivo)
-                            autores_extraidos.append(metadata['author'])
-                            metadatas.append(metadata)
+                        (result, metadata), segundos = futuro.result()
+                        modelo_costes.observar(EXTENSIONES_SOPORTADAS.get(ext.lower(), ext), tamano / (1024 * 1024), segundos)
+                        if metadata is not None and metadata.get('paginas_ocr'):
+                            cola_ocr.put((ruta_archivo, result, metadata))
+                            incrementar_contador("ocr")
+                        elif result is not None:
+                            cola_analisis.put((result, metadata['author'], ruta_archivo, metadata))
+                            incrementar_contador("extraccion_completa")
+                        elif metadata is not None:
+                            cola_organizacion.put((ruta_archivo, metadata['author']))
+                            resultados_cache.append((ruta_archivo, metadata['author'], metadata, 'metadata'))
+                            incrementar_contador("ruta_rapida_metadata")
+                            if len(resultados_cache) >= BATCH_SIZE:
+                                cache.guardar_lote(resultados_cache)
+                                resultados_cache.clear()
                         else:
                             log_error(ruta_archivo, "No se pudo extraer texto del archivo.")
+                    except TareaAbortada as e:
+                        log_error(ruta_archivo, str(e))
+                        incrementar_contador("extraccion_abortada")
                     except Exception as e:
                         log_error(ruta_archivo, str(e))
+                    pbar.set_postfix(ruta_rapida=log_data["contadores"].get("ruta_rapida_metadata", 0), refresh=False)
                     pbar.update(1)
 
-                if len(textos_para_procesar) > 0:
-                    cola_analisis.put((textos_para_procesar, autores_extraidos, rutas_archivos, metadatas))
+                try:
+                    iniciada = True
+                    ejecutar_etapa_por_coste(cola_archivos, pools, clasificar, enviar, al_completar, VENTANA_PLANIFICACION, nombre='extraccion')
+                finally:
+                    cache.guardar_lote(resultados_cache)
+                    for pool, executor in executors.items():
+                        log_data.setdefault("memoria_workers", {})[pool] = executor.reporte()
+    finally:
+        if not iniciada:
+            vaciar_hasta_fin(cola_archivos)
+        cola_ocr.put(FIN)
+        log_error("procesar_archivos", "Proceso de extracción de textos finalizado.")
 
-def analizar_autores(cola_analisis, cola_organizacion, total_archivos):
-    with tqdm(total=total_archivos, desc="Analizando autores", unit="archivo") as pbar:
-        while True:
-            batch_data = cola_analisis.get()
-            if batch_data == "FIN":
-                cola_organizacion.put("FIN")
-                log_error("analizar_autores", "Proceso de análisis de autores finalizado.")
-                break
+def ocr_archivos(cola_ocr, cola_analisis, estadisticas_modelos, modelo_costes):
+    iniciada = False
+    try:
+        with PoolReciclable(OCR_WORKERS, initializer=inicializar_worker, initargs=(estadisticas_modelos, EVENTOS_FILE), limite_reciclaje_mb=LIMITE_RECICLAJE_OCR_MB,
+                            timeout_tarea=TIMEOUT_OCR, limite_memoria_tarea_mb=LIMITE_MEMORIA_OCR_MB, nombre='ocr') as executor:
+            with tqdm(desc="OCR de PDFs escaneados", unit="archivo") as pbar:
+                def clasificar(item):
+                    return 'ocr', modelo_costes.estimar('ocr', len(item[2]['paginas_ocr']))
 
-            textos_para_procesar, autores_extraidos, rutas_archivos, metadatas = batch_data
+                def enviar(item, _):
+                    ruta_archivo, texto, metadata = item
+                    return executor.submit(medir_tarea, process_ocr, ruta_archivo, texto, metadata, etiqueta='ocr')
 
-            try:
-                batch_autores = []
-                for text, author, ruta_archivo, metadata in zip(textos_para_procesar, autores_extraidos, rutas_archivos, metadatas):
-                    extracted_author = extract_authors_batch(text, author, ruta_archivo, metadata, BATCH_SIZE)
-                    batch_autores.append(extracted_author)
+                def al_completar(item, futuro):
+                    ruta_archivo = item[0]
+                    try:
+                        (result, metadata), segundos = futuro.result()
+                        modelo_costes.observar('ocr', len(item[2]['paginas_ocr']), segundos)
+                        if result is not None:
+                            cola_analisis.put((result, metadata['author'], ruta_archivo, metadata))
+                        else:
+                            log_error(ruta_archivo, "No se pudo extraer texto del archivo con OCR.")
+                    except TareaAbortada as e:
+                        log_error(ruta_archivo, str(e))
+                        incrementar_contador("ocr_abortado")
+                    except Exception as e:
+                        log_error(ruta_archivo, str(e))
+                    pbar.update(1)
 
-                cola_organizacion.put((rutas_archivos, batch_autores))
-            except Exception as e:
-                log_error("analizar_autores", str(e))
+                try:
+                    iniciada = True
+                    ejecutar_etapa_por_coste(cola_ocr, {'ocr': (MAX_EN_VUELO_OCR, OCR_WORKERS)}, clasificar, enviar, al_completar, VENTANA_PLANIFICACION, nombre='ocr')
+                finally:
+                    log_data.setdefault("memoria_workers", {})['ocr'] = executor.reporte()
+    finally:
+        if not iniciada:
+            vaciar_hasta_fin(cola_ocr)
+        cola_analisis.put(FIN)
+        log_error("ocr_archivos", "Proceso de OCR finalizado.")
 
-            pbar.update(len(rutas_archivos))
+def analizar_autores(cola_analisis, cola_organizacion, total_archivos, cache, presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO):
+    with tqdm(total=total_archivos, desc="Analizando autores", unit="archivo") as pbar:
+        fin = False
+        try:
+            while not fin:
+                lote, fin = recoger_lote(cola_analisis, BATCH_SIZE, ESPERA_LOTE_ANALISIS)
+                if not lote:
+                    continue
 
-def organizar_archivos(cola_organizacion, known_authors, total_archivos):
-    with tqdm(total=total_archivos, desc="Organizando archivos", unit="archivo") as pbar:
-        while True:
-            batch_data = cola_organizacion.get()
-            if batch_data == "FIN":
-                log_error("organizar_archivos", "Proceso de organización finalizado.")
-                break
+                textos_para_procesar, autores_extraidos, rutas_archivos, metadatas = (list(columna) for columna in zip(*lote))
 
-            rutas_archivos, batch_autores = batch_data
+                try:
+                    resultados = extract_authors_batch(textos_para_procesar, autores_extraidos, rutas_archivos, metadatas, INFERENCE_BATCH_SIZE, presupuesto_tokens)
+                    for ruta_archivo, (extracted_author, etapa) in zip(rutas_archivos, resultados):
+                        cola_organizacion.put((ruta_archivo, extracted_author))
+                        incrementar_contador(f"autor_{etapa}")
+                    cache.guardar_lote([(ruta_archivo, extracted_author, metadata, etapa)
+                                        for ruta_archivo, metadata, (extracted_author, etapa) in zip(rutas_archivos, metadatas, resultados)
+                                        if etapa != 'error'])
+                except Exception as e:
+                    log_error("analizar_autores", str(e))
 
-            # Perform author matching in main process
-            nombres_autores = []
-            for author in batch_autores:
-                if not isinstance(author, str):
-                    author = str(author)
-                nombre_autor = 'Autor Desconocido' if not author or author.lower() in ['no answer', 'no sé', ''] else normalize_author_name(author)
-                nombre_autor = get_best_matching_author(nombre_autor, known_authors)
-                nombres_autores.append(nombre_autor)
+                pbar.update(len(rutas_archivos))
+        finally:
+            cola_organizacion.put(FIN)
+            log_error("analizar_autores", "Proceso de análisis de autores finalizado.")
 
-            # Now, use ThreadPoolExecutor for I/O operations
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futuros = [executor.submit(organize_file, ruta_archivo, nombre_autor)
-                           for ruta_archivo, nombre_autor in zip(rutas_archivos, nombres_autores)]
+def organizar_archivos(cola_organizacion, known_authors, total_archivos, modo_organizacion=MODO_ORGANIZACION,
+                       detector=None, cache=None, duplicados_una_vez=DUPLICADOS_UNA_VEZ):
+    # ejecutar_etapa consume la entrada hasta FIN en cualquier caso; si la etapa falla antes de llegar a él, se vacía aquí
+    iniciada = False
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            with tqdm(total=total_archivos, desc="Organizando archivos", unit="archivo") as pbar:
+                def enviar(item):
+                    ruta_archivo, author = item
+                    # Perform author matching on this thread; only the file I/O goes to the pool
+                    with medir('emparejamiento', ruta_archivo):
+                        if not isinstance(author, str):
+                            author = str(author)
+                        nombre_autor = 'Autor Desconocido' if not author or author.lower() in ['no answer', 'no sé', ''] else normalize_author_name(author)
+                        nombre_autor = get_best_matching_author(nombre_autor, known_authors)
 
-                for futuro in as_completed(futuros):
+                    rutas_archivos = [ruta_archivo]
+                    if detector is not None:
+                        # El autor del representante vale para todas sus copias, incluidas las que esperaban
+                        duplicados = detector.resolver(ruta_archivo, item[1])
+                        if detector.es_duplicado(ruta_archivo):
+                            duplicados = [ruta_archivo]
+                            rutas_archivos = []
+                        if cache is not None and duplicados:
+                            cache.guardar_lote([(duplicado, item[1], {'representante': detector.representante(duplicado)}, 'duplicado') for duplicado in duplicados])
+                        if duplicados_una_vez:
+                            pbar.update(len(duplicados))
+                        else:
+                            rutas_archivos.extend(duplicados)
+                    if not rutas_archivos:
+                        return None
+                    return executor.submit(organize_files, rutas_archivos, nombre_autor, modo_organizacion)
+
+                def al_completar(item, futuro):
                     try:
-                        futuro.result()
+                        modos = futuro.result()
+                        for modo in modos:
+                            incrementar_contador(f"colocacion_{modo}")
+                        pbar.update(len(modos))
                     except Exception as e:
-                        log_error(rutas_archivos, str(e))
-                    pbar.update(1)
+                        log_error(item[0], str(e))
+                        pbar.update(1)
 
-def main():
+                iniciada = True
+                ejecutar_etapa(cola_organizacion, MAX_EN_VUELO_ORGANIZACION, enviar, al_completar, nombre='organizacion', workers=MAX_WORKERS)
+                if detector is not None:
+                    for representante, duplicados in detector.sin_resolver().items():
+                        for duplicado in duplicados:
+                            log_error(duplicado, f"Copia idéntica de {representante}, que no pudo procesarse.")
+    finally:
+        if not iniciada:
+            vaciar_hasta_fin(cola_organizacion)
+        log_error("organizar_archivos", "Proceso de organización finalizado.")
+
+def reporte_niveles_autor():
+    # Qué proporción de los autores resolvió cada nivel de la cascada; lo que no llega a 'qa' o 'ner' es tiempo de modelo ahorrado
+    contadores = {etapa: log_data["contadores"].get(f"autor_{etapa}", 0) for etapa in ETAPAS_AUTOR}
+    contadores['metadata'] += log_data["contadores"].get("ruta_rapida_metadata", 0)
+    total = sum(contadores.values())
+    return {etapa: {'archivos': cantidad, 'proporcion': round(cantidad / total, 3) if total else 0.0} for etapa, cantidad in contadores.items()}
+
+def reporte_contexto(presupuesto_tokens):
+    originales = log_data["contadores"].get("contexto_tokens_originales", 0)
+    enviados = log_data["contadores"].get("contexto_tokens_enviados", 0)
+    return {
+        'presupuesto_tokens': presupuesto_tokens,
+        'documentos': log_data["contadores"].get("contexto_documentos", 0),
+        'tokens_originales': originales,
+        'tokens_enviados': enviados,
+        'proporcion_enviada': round(enviados / originales, 3) if originales else 0.0,
+    }
+
+def main(rebuild=False, usar_hash=False, usar_manifiesto=False, modo_organizacion=MODO_ORGANIZACION, duplicados_una_vez=DUPLICADOS_UNA_VEZ,
+         backend_inferencia=BACKEND_INFERENCIA, hilos_inferencia=HILOS_INFERENCIA, presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO,
+         tareas_por_worker=TAREAS_POR_WORKER, limite_reciclaje_mb=LIMITE_RECICLAJE_MB, timeout_archivo=TIMEOUT_ARCHIVO,
+         limite_memoria_mb=LIMITE_MEMORIA_ARCHIVO_MB):
     try:
+        configurar_inferencia(backend_inferencia, hilos_inferencia)
         if not os.path.exists(CARPETA_SALIDA):
             os.makedirs(CARPETA_SALIDA)
 
-        cola_archivos = Queue()
-        cola_analisis = Queue()
-        cola_organizacion = Queue()
+        configurar_eventos(EVENTOS_FILE)
+        registrar_evento('inicio', carpeta=CARPETA_ENTRADA)
+
+        cache = CacheResultados(CACHE_FILE, usar_hash=usar_hash, rebuild=rebuild)
 
-        known_authors = []
+        cola_escaneo = Queue(maxsize=TAMANO_COLA)
+        cola_archivos = Queue(maxsize=TAMANO_COLA)
+        cola_ocr = Queue(maxsize=TAMANO_COLA)
+        cola_analisis = Queue(maxsize=TAMANO_COLA)
+        cola_organizacion = Queue(maxsize=TAMANO_COLA)
 
-        thread_cargar = Thread(target=cargar_archivos, args=(cola_archivos, CARPETA_ENTRADA, BATCH_SIZE))
-        thread_cargar.start()
+        known_authors = AuthorIndex.load(AUTHORS_INDEX_FILE)
+        modelo_costes = ModeloCostes.load(COSTES_FILE)
+        detector = DetectorDuplicados()
 
-        total_archivos = contar_archivos(CARPETA_ENTRADA)
+        manager = Manager()
+        estadisticas_modelos = manager.dict()
+        precargar_modelos(MODELOS_PRECARGADOS)
 
-        thread_procesar = Thread(target=procesar_archivos, args=(cola_archivos, cola_analisis, total_archivos))
-        thread_analizar = Thread(target=analizar_autores, args=(cola_analisis, cola_organizacion, total_archivos))
-        thread_organizar = Thread(target=organizar_archivos, args=(cola_organizacion, known_authors, total_archivos))
+        total_archivos = contar_archivos(MANIFEST_FILE, CARPETA_ENTRADA)
 
-        thread_procesar.start()
-        thread_analizar.start()
-        thread_organizar.start()
+        escritor_metricas = EscritorMetricas(METRICAS_FILE, EVENTOS_FILE, intervalo=INTERVALO_METRICAS, colas={
+            'escaneo': cola_escaneo, 'archivos': cola_archivos, 'ocr': cola_ocr, 'analisis': cola_analisis, 'organizacion': cola_organizacion,
+        })
+        escritor_metricas.start()
 
-        thread_cargar.join()
+        # Cada etapa envía FIN a la siguiente al terminar, así que basta con esperar a los hilos
+        hilos = [
+            Thread(target=cargar_archivos, args=(cola_escaneo, CARPETA_ENTRADA, cache, cola_organizacion, MANIFEST_FILE, usar_manifiesto)),
+            Thread(target=deduplicar_archivos, args=(cola_escaneo, cola_archivos, cola_organizacion, detector)),
+            Thread(target=procesar_archivos, args=(cola_archivos, cola_ocr, cola_analisis, cola_organizacion, total_archivos, estadisticas_modelos, cache, modelo_costes,
+                                                    tareas_por_worker, limite_reciclaje_mb, timeout_archivo, limite_memoria_mb)),
+            Thread(target=ocr_archivos, args=(cola_ocr, cola_analisis, estadisticas_modelos, modelo_costes)),
+            Thread(target=analizar_autores, args=(cola_analisis, cola_organizacion, total_archivos, cache, presupuesto_tokens)),
+            Thread(target=organizar_archivos, args=(cola_organizacion, known_authors, total_archivos, modo_organizacion, detector, cache, duplicados_una_vez)),
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        escritor_metricas.cerrar()
 
-        cola_archivos.put("FIN")
-        thread_procesar.join()
-        cola_analisis.put("FIN")
-        thread_analizar.join()
-        cola_organizacion.put("FIN")
-        thread_organizar.join()
+        cache.cerrar()
+        known_authors.save(AUTHORS_INDEX_FILE)
+        modelo_costes.save(COSTES_FILE)
+        log_data["modelos"] = reporte_modelos(estadisticas_modelos)
+        log_data["duplicados"] = detector.reporte()
+        log_data["niveles_autor"] = reporte_niveles_autor()
+        log_data["contexto"] = reporte_contexto(presupuesto_tokens)
+        log_data["modelo_costes"] = modelo_costes.resumen()
+        manager.shutdown()
 
         with open(LOG_FILE, 'w', encoding='utf-8') as log_file:
             json.dump(log_data, log_file, indent=4, ensure_ascii=False)
 
         log_error("main", "Procesamiento terminado.")
+        registrar_evento('fin')
         print("Todo el proceso ha terminado correctamente.")
     except Exception as e:
         log_error("main", str(e))
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Organiza libros por autor.")
+    parser.add_argument('--rebuild', action='store_true', help="Ignora la caché de resultados y reprocesa todos los archivos.")
+    parser.add_argument('--hash', action='store_true', dest='usar_hash', help="Guarda un hash de contenido para detectar archivos sin cambios aunque cambie su mtime.")
+    parser.add_argument('--manifiesto', action='store_true', dest='usar_manifiesto', help="Usa la lista de archivos del último escaneo en lugar de recorrer la carpeta de entrada.")
+    parser.add_argument('--modo', choices=MODOS_ORGANIZACION, default=MODO_ORGANIZACION, dest='modo_organizacion', help="Cómo se colocan los libros en la carpeta de salida; 'auto' prueba hardlink, reflink y copia en ese orden.")
+    parser.add_argument('--duplicados-una-vez', action='store_true', help="Coloca en la carpeta de salida solo un archivo de cada grupo de copias idénticas.")
+    parser.add_argument('--backend', choices=BACKENDS_INFERENCIA, default=BACKEND_INFERENCIA, dest='backend_inferencia', help="Backend de inferencia para los modelos de QA y NER.")
+    parser.add_argument('--hilos-inferencia', type=int, default=HILOS_INFERENCIA, help="Hilos intra-op para la inferencia (por defecto, todos los núcleos).")
+    parser.add_argument('--presupuesto-tokens', type=int, default=PRESUPUESTO_TOKENS_CONTEXTO, help="Tokens de contexto por documento que se envían a QA y NER (0 envía el texto completo).")
+    parser.add_argument('--tareas-por-worker', type=int, default=TAREAS_POR_WORKER, help="Archivos que procesa cada worker de extracción antes de sustituirlo por uno nuevo (0 desactiva el reciclaje por número).")
+    parser.add_argument('--limite-reciclaje-mb', type=int, default=LIMITE_RECICLAJE_MB, help="Crecimiento de memoria privada a partir del cual un worker de extracción se recicla al terminar su archivo (0 lo desactiva).")
+    parser.add_argument('--timeout-archivo', type=int, default=TIMEOUT_ARCHIVO, help="Segundos máximos de extracción por archivo; al superarlos se mata el worker y el archivo se da por fallido (0 lo desactiva).")
+    parser.add_argument('--limite-memoria-mb', type=int, default=LIMITE_MEMORIA_ARCHIVO_MB, help="Crecimiento máximo de memoria privada de un worker durante un archivo; al superarlo se mata y el archivo se da por fallido (0 lo desactiva).")
+    args = parser.parse_args()
+    main(rebuild=args.rebuild, usar_hash=args.usar_hash, usar_manifiesto=args.usar_manifiesto,
+         modo_organizacion=args.modo_organizacion, duplicados_una_vez=args.duplicados_una_vez,
+         backend_inferencia=args.backend_inferencia, hilos_inferencia=args.hilos_inferencia, presupuesto_tokens=args.presupuesto_tokens,
+         tareas_por_worker=args.tareas_por_worker or None, limite_reciclaje_mb=args.limite_reciclaje_mb or None,
+         timeout_archivo=args.timeout_archivo or None, limite_memoria_mb=args.limite_memoria_mb or None)
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import fcntl
+from threading import Lock, Thread, Event
+from contextlib import contextmanager
+
+_ruta_eventos = None
+_descriptor = None
+_pid_descriptor = None
+_lock = Lock()
+_gauges = {}
+
+def _reiniciar_en_hijo():
+    # Un hilo del padre podía tener el lock tomado en el momento del fork
+    global _lock, _descriptor
+    _lock = Lock()
+    _descriptor = None
+
+os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+
+def configurar_eventos(ruta_eventos):
+    global _ruta_eventos, _descriptor
+    _ruta_eventos = ruta_eventos
+    _descriptor = None
+
+def registrar_evento(tipo, **datos):
+    global _descriptor, _pid_descriptor
+    if _ruta_eventos is None:
+        return
+    linea = json.dumps({'ts': round(time.time(), 3), 'pid': os.getpid(), 'tipo': tipo, **datos}, ensure_ascii=False, default=str)
+    contenido = (linea + '\n').encode('utf-8')
+    with _lock:
+        # Un descriptor por proceso: tras un fork el hijo abre el suyo
+        if _descriptor is None or _pid_descriptor != os.getpid():
+            _descriptor = os.open(_ruta_eventos, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            _pid_descriptor = os.getpid()
+        # O_APPEND junto con el bloqueo garantiza líneas completas aunque escriban varios procesos
+        fcntl.flock(_descriptor, fcntl.LOCK_EX)
+        try:
+            os.write(_descriptor, contenido)
+        finally:
+            fcntl.flock(_descriptor, fcntl.LOCK_UN)
+
+@contextmanager
+def medir(etapa, archivo=None, archivos=1):
+    inicio = time.perf_counter()
+    inicio_cpu = time.thread_time()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        registrar_evento('etapa', etapa=etapa, archivo=archivo, archivos=archivos, ok=ok,
+                         segundos=round(time.perf_counter() - inicio, 6),
+                         cpu=round(time.thread_time() - inicio_cpu, 6))
+
+class Cronometro:
+    # Como medir, pero para una etapa repartida en tramos no contiguos: acumula el tiempo de cada tramo
+    # y lo registra como un único evento 'etapa', sin contar lo que se ejecuta entre tramos.
+    def __init__(self, etapa, archivo=None, archivos=1):
+        self.etapa = etapa
+        self.archivo = archivo
+        self.archivos = archivos
+        self.segundos = 0.0
+        self.cpu = 0.0
+        self.tramos = 0
+        self.ok = True
+
+    @contextmanager
+    def tramo(self):
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        try:
+            yield
+        except BaseException:
+            self.ok = False
+            raise
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.cpu += time.thread_time() - inicio_cpu
+            self.tramos += 1
+
+    def registrar(self):
+        if self.tramos:
+            registrar_evento('etapa', etapa=self.etapa, archivo=self.archivo, archivos=self.archivos, ok=self.ok,
+                             segundos=round(self.segundos, 6), cpu=round(self.cpu, 6))
+
+def fijar_gauge(nombre, valor, **etiquetas):
+    _gauges[(nombre, tuple(sorted(etiquetas.items())))] = valor
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{valor}"' for clave, valor in pares) + '}'
+
+class EscritorMetricas(Thread):
+    # Lee de forma incremental el registro JSONL de eventos (que incluye los de los workers)
+    # y escribe periódicamente un snapshot en formato textfile de Prometheus.
+
+    def __init__(self, ruta_metricas, ruta_eventos, colas=None, intervalo=15):
+        super().__init__(daemon=True)
+        self.ruta_metricas = ruta_metricas
+        self.ruta_eventos = ruta_eventos
+        self.colas = colas or {}
+        self.intervalo = intervalo
+        self.detener = Event()
+        # Solo cuentan los eventos de esta ejecución; el registro conserva los anteriores
+        self.posicion = os.path.getsize(ruta_eventos) if os.path.exists(ruta_eventos) else 0
+        self.etapas = {}
+        self.errores = 0
+        self.salidas_pdf = {}
+
+    def _leer_eventos(self):
+        try:
+            with open(self.ruta_eventos, 'rb') as archivo:
+                archivo.seek(self.posicion)
+                datos = archivo.read()
+        except OSError:
+            return
+        completos = datos[:datos.rfind(b'\n') + 1]
+        self.posicion += len(completos)
+        for linea in completos.splitlines():
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue
+            if evento['tipo'] == 'etapa':
+                acumulado = self.etapas.setdefault(evento['etapa'], {'archivos': 0, 'segundos': 0.0, 'cpu': 0.0, 'fallos': 0})
+                acumulado['archivos'] += evento.get('archivos', 1)
+                acumulado['segundos'] += evento['segundos']
+                acumulado['cpu'] += evento['cpu']
+                acumulado['fallos'] += 0 if evento['ok'] else 1
+            elif evento['tipo'] == 'error':
+                self.errores += 1
+            elif evento['tipo'] == 'pdf_paginas':
+                self.salidas_pdf[evento['salida']] = self.salidas_pdf.get(evento['salida'], 0) + 1
+
+    def escribir(self):
+        self._leer_eventos()
+        for nombre, cola in self.colas.items():
+            fijar_gauge('organizador_cola_elementos', cola.qsize(), cola=nombre)
+
+        lineas = []
+        for metrica, campo in (('segundos', 'segundos'), ('cpu_segundos', 'cpu'), ('archivos', 'archivos'), ('fallos', 'fallos')):
+            lineas.append(f"# TYPE organizador_etapa_{metrica}_total counter")
+            for etapa, acumulado in sorted(self.etapas.items()):
+                lineas.append(f"organizador_etapa_{metrica}_total{_etiquetas([('etapa', etapa)])} {round(acumulado[campo], 6)}")
+        lineas.append('# TYPE organizador_errores_total counter')
+        lineas.append(f"organizador_errores_total {self.errores}")
+        lineas.append('# TYPE organizador_pdf_salidas_total counter')
+        lineas.extend(f"organizador_pdf_salidas_total{_etiquetas([('salida', salida)])} {cantidad}" for salida, cantidad in sorted(self.salidas_pdf.items()))
+
+        gauges = sorted(list(_gauges.items()))
+        for nombre in sorted({nombre for (nombre, _), _ in gauges}):
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.extend(f"{nombre}{_etiquetas(pares)} {valor}" for (otro, pares), valor in gauges if otro == nombre)
+
+        temporal = f"{self.ruta_metricas}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write('\n'.join(lineas) + '\n')
+        os.replace(temporal, self.ruta_metricas)
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            try:
+                self.escribir()
+            except OSError as e:
+                registrar_evento('error', archivo=self.ruta_metricas, mensaje=str(e))
+
+    def cerrar(self):
+        self.detener.set()
+        self.join()
+        self.escribir()
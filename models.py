@@ -0,0 +1,70 @@
+import os
+import time
+import resource
+from threading import Lock
+from utils import log_error
+from metrics import configurar_eventos
+
+_cargadores = {}
+_modelos = {}
+_lock = Lock()
+_estadisticas_compartidas = None
+estadisticas_modelos = {}
+
+def _reiniciar_en_hijo():
+    global _lock
+    _lock = Lock()
+
+os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+
+def memoria_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def registrar_modelo(nombre, cargador):
+    _cargadores[nombre] = cargador
+
+def obtener_modelo(nombre):
+    modelo = _modelos.get(nombre)
+    if modelo is not None:
+        return modelo
+
+    with _lock:
+        if nombre not in _modelos:
+            memoria_inicial = memoria_rss_mb()
+            inicio = time.perf_counter()
+            _modelos[nombre] = _cargadores[nombre]()
+            estadistica = {
+                'pid': os.getpid(),
+                'segundos_carga': round(time.perf_counter() - inicio, 2),
+                'memoria_mb': round(memoria_rss_mb() - memoria_inicial, 1),
+            }
+            estadisticas_modelos[nombre] = estadistica
+            if _estadisticas_compartidas is not None:
+                _estadisticas_compartidas[f"{nombre}@{estadistica['pid']}"] = estadistica
+            log_error("models", f"Modelo '{nombre}' cargado en {estadistica['segundos_carga']}s (+{estadistica['memoria_mb']} MB RSS, pid {estadistica['pid']}).")
+    return _modelos[nombre]
+
+def modelo_cargado(nombre):
+    return nombre in _modelos
+
+def precargar_modelos(nombres):
+    # Con el método de arranque 'fork', los workers creados después heredan los pesos
+    # ya cargados y los comparten copy-on-write en lugar de cargar una copia cada uno.
+    for nombre in nombres:
+        obtener_modelo(nombre)
+
+def inicializar_worker(estadisticas_compartidas=None, ruta_eventos=None, precargar=()):
+    global _estadisticas_compartidas
+    _estadisticas_compartidas = estadisticas_compartidas
+    configurar_eventos(ruta_eventos)
+    precargar_modelos(precargar)
+
+def reporte_modelos(estadisticas_compartidas=None):
+    reporte = {f"{nombre}@{estadistica['pid']}": estadistica for nombre, estadistica in estadisticas_modelos.items()}
+    if estadisticas_compartidas is not None:
+        reporte.update(dict(estadisticas_compartidas))
+    return reporte
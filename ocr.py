@@ -0,0 +1,71 @@
+import io
+from contextlib import redirect_stderr
+
+import fitz
+from utils import clean_text, log_error
+from models import registrar_modelo, obtener_modelo
+from metrics import medir
+
+OCR_DPI = 200
+OCR_BATCH_SIZE = 8
+# Lado mínimo, en puntos PDF, que debe tener alguna imagen de la página para que valga la pena el OCR
+OCR_MIN_IMAGE_SIZE = 72
+
+def _cargar_ocr():
+    import torch
+    import easyocr
+    return easyocr.Reader(['en'], gpu=torch.cuda.is_available())
+
+registrar_modelo('ocr', _cargar_ocr)
+
+def pagina_necesita_ocr(pagina):
+    for imagen in pagina.get_image_info():
+        x0, y0, x1, y1 = imagen['bbox']
+        if min(x1 - x0, y1 - y0) >= OCR_MIN_IMAGE_SIZE:
+            return True
+    return False
+
+def _renderizar_pagina(pagina):
+    import numpy as np
+    pixmap = pagina.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width)
+
+def ocr_paginas_pdf(ruta_archivo, paginas):
+    imagenes_por_tamano = {}
+    with fitz.open(ruta_archivo) as documento:
+        for num_pagina in paginas:
+            imagen = _renderizar_pagina(documento.load_page(num_pagina))
+            imagenes_por_tamano.setdefault(imagen.shape, []).append((num_pagina, imagen))
+
+    textos = {}
+    reader = obtener_modelo('ocr')
+    for (alto, ancho), grupo in imagenes_por_tamano.items():
+        # readtext_batched necesita imágenes del mismo tamaño, por eso se agrupan las páginas por dimensiones
+        for inicio in range(0, len(grupo), OCR_BATCH_SIZE):
+            lote = grupo[inicio:inicio + OCR_BATCH_SIZE]
+            with io.StringIO() as buf, redirect_stderr(buf):
+                resultados = reader.readtext_batched([imagen for _, imagen in lote], n_width=ancho, n_height=alto,
+                                                     batch_size=len(lote), detail=0)
+            for (num_pagina, _), lineas in zip(lote, resultados):
+                textos[num_pagina] = '\n'.join(lineas)
+    return textos
+
+def process_ocr(ruta_archivo, texto, metadata):
+    # El texto de cada página reconocida se intercala por número de página con el de la capa de texto: una portada
+    # escaneada debe quedar al principio, donde el presupuesto de caracteres del análisis no la recorta.
+    paginas = metadata.pop('paginas_ocr', [])
+    textos = dict(metadata.pop('textos_paginas', None) or {})
+    try:
+        with medir('ocr', ruta_archivo):
+            textos_ocr = ocr_paginas_pdf(ruta_archivo, paginas)
+    except Exception as e:
+        log_error(ruta_archivo, f"Error processing OCR: {e}")
+        textos_ocr = {}
+    if textos or not texto:
+        textos.update(textos_ocr)
+        texto = clean_text('\n'.join(textos[num_pagina] for num_pagina in sorted(textos)))
+    else:
+        texto = clean_text('\n'.join([texto] + [textos_ocr[num_pagina] for num_pagina in sorted(textos_ocr)]))
+    if not texto:
+        return None, None
+    return texto, metadata
@@ -1,19 +1,168 @@
 import os
 import re
+import errno
+import fcntl
 import shutil
+from threading import Lock
 from utils import log_error
+from metrics import medir
 
 CARPETA_SALIDA = 'Libros_Organizados'
+MODOS_ORGANIZACION = ['copia', 'hardlink', 'reflink', 'symlink', 'mover', 'auto']
+# En modo 'auto' se prueba cada estrategia en este orden hasta que una funcione
+ORDEN_AUTO = ['hardlink', 'reflink', 'copia']
+MAX_SUFIJOS_COLISION = 100
+BYTES_COMPARACION = 65536
+# ioctl FICLONE de Linux (_IOW(0x94, 9, int)), crea un clon copy-on-write en btrfs, XFS y similares
+FICLONE = 0x40049409
+# Errores que indican que la estrategia no está disponible entre estos sistemas de archivos
+ERRORES_NO_SOPORTADO = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.ENOSYS}
 
-def organize_file(ruta_archivo, nombre_autor):
-    nombre_archivo = os.path.basename(ruta_archivo)
+_carpetas_existentes = set()
+_modos_no_soportados = set()
+_lock = Lock()
+
+class ModoNoSoportado(Exception):
+    pass
+
+def _asegurar_carpeta(carpeta):
+    if carpeta in _carpetas_existentes:
+        return
+    os.makedirs(carpeta, exist_ok=True)
+    with _lock:
+        _carpetas_existentes.add(carpeta)
+
+def _no_soportado(e):
+    return isinstance(e, OSError) and e.errno in ERRORES_NO_SOPORTADO
+
+def _copiar_contenido(origen, destino):
+    # copy_file_range y sendfile copian dentro del kernel, sin pasar los datos por el espacio de usuario
+    tamano = os.fstat(origen).st_size
+    copiado = 0
+    funcion = getattr(os, 'copy_file_range', None)
+    while copiado < tamano:
+        try:
+            if funcion is not None:
+                enviados = funcion(origen, destino, tamano - copiado)
+            else:
+                enviados = os.sendfile(destino, origen, copiado, tamano - copiado)
+        except OSError as e:
+            if funcion is None or not _no_soportado(e):
+                raise
+            funcion = None
+            continue
+        if enviados == 0:
+            break
+        copiado += enviados
+
+def _crear_exclusivo(ruta_archivo, destino, rellenar):
+    # O_EXCL hace que una colisión falle con FileExistsError en la misma llamada que crea el archivo
+    with open(ruta_archivo, 'rb') as origen:
+        fd = os.open(destino, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            with open(fd, 'wb', closefd=True) as salida:
+                rellenar(origen.fileno(), salida.fileno())
+        except BaseException:
+            os.unlink(destino)
+            raise
+    shutil.copystat(ruta_archivo, destino)
+
+def _reflink(ruta_archivo, destino):
+    def clonar(origen, salida):
+        try:
+            fcntl.ioctl(salida, FICLONE, origen)
+        except OSError as e:
+            if _no_soportado(e):
+                raise ModoNoSoportado(str(e))
+            raise
+    _crear_exclusivo(ruta_archivo, destino, clonar)
+
+def _copia(ruta_archivo, destino):
+    _crear_exclusivo(ruta_archivo, destino, _copiar_contenido)
+
+def _hardlink(ruta_archivo, destino):
     try:
-        nombre_autor = re.sub(r'[<>:"/\\|?*]', '', nombre_autor)
-        carpeta_autor = os.path.join(CARPETA_SALIDA, nombre_autor)
-        if not os.path.exists(carpeta_autor):
-            os.makedirs(carpeta_autor)
-        destino = os.path.join(carpeta_autor, nombre_archivo)
-        if not os.path.exists(destino):
-            shutil.copy2(ruta_archivo, destino)
-    except Exception as e:
-        log_error(ruta_archivo, str(e))
+        os.link(ruta_archivo, destino)
+    except OSError as e:
+        if _no_soportado(e):
+            raise ModoNoSoportado(str(e))
+        raise
+
+def _symlink(ruta_archivo, destino):
+    os.symlink(os.path.abspath(ruta_archivo), destino)
+
+def _mover(ruta_archivo, destino):
+    # link + unlink no sobrescribe un destino existente, a diferencia de rename
+    try:
+        _hardlink(ruta_archivo, destino)
+    except ModoNoSoportado:
+        _copia(ruta_archivo, destino)
+    os.unlink(ruta_archivo)
+
+ESTRATEGIAS = {
+    'copia': _copia,
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'symlink': _symlink,
+    'mover': _mover,
+}
+
+def _es_mismo_archivo(ruta_archivo, destino):
+    try:
+        if os.path.samefile(ruta_archivo, destino):
+            return True
+        origen, existente = os.stat(ruta_archivo), os.stat(destino)
+    except OSError:
+        return False
+    if origen.st_size != existente.st_size or origen.st_mtime_ns != existente.st_mtime_ns:
+        return False
+    # Tamaño y fecha coinciden; se compara el inicio del contenido para no confundir dos libros distintos
+    with open(ruta_archivo, 'rb') as a, open(destino, 'rb') as b:
+        return a.read(BYTES_COMPARACION) == b.read(BYTES_COMPARACION)
+
+def _colocar(ruta_archivo, destino, modo):
+    candidatos = ORDEN_AUTO if modo == 'auto' else [modo]
+    for candidato in candidatos:
+        if candidato in _modos_no_soportados and candidato != candidatos[-1]:
+            continue
+        try:
+            ESTRATEGIAS[candidato](ruta_archivo, destino)
+            return candidato
+        except ModoNoSoportado as e:
+            if candidato == candidatos[-1]:
+                raise
+            with _lock:
+                if candidato not in _modos_no_soportados:
+                    _modos_no_soportados.add(candidato)
+                    log_error("organizer", f"Modo '{candidato}' no disponible ({e}), se usará el siguiente.")
+    raise ModoNoSoportado(f"Ningún modo disponible para {ruta_archivo}")
+
+def organize_file(ruta_archivo, nombre_autor, modo='copia'):
+    # Devuelve el modo con que se colocó el archivo, o 'existente' si el mismo libro ya estaba en su destino.
+    # Los fallos se propagan para que quien llama los registre.
+    nombre_archivo = os.path.basename(ruta_archivo)
+    nombre_autor = re.sub(r'[<>:"/\\|?*]', '', nombre_autor)
+    carpeta_autor = os.path.join(CARPETA_SALIDA, nombre_autor)
+    _asegurar_carpeta(carpeta_autor)
+    base, ext = os.path.splitext(nombre_archivo)
+    # Solo se consulta el destino cuando ya existe; si es el mismo libro de una ejecución anterior se omite
+    with medir('colocacion', ruta_archivo):
+        for intento in range(MAX_SUFIJOS_COLISION):
+            destino = os.path.join(carpeta_autor, nombre_archivo if intento == 0 else f"{base} ({intento}){ext}")
+            try:
+                return _colocar(ruta_archivo, destino, modo)
+            except FileExistsError:
+                if _es_mismo_archivo(ruta_archivo, destino):
+                    return 'existente'
+    raise FileExistsError(f"Demasiadas colisiones de nombre en {carpeta_autor}")
+
+def organize_files(rutas_archivos, nombre_autor, modo='copia'):
+    # Un fallo en una copia no impide colocar las demás; se registra y se cuenta como 'error'
+    modos = []
+    for ruta_archivo in rutas_archivos:
+        try:
+            modos.append(organize_file(ruta_archivo, nombre_autor, modo))
+        except Exception as e:
+            log_error(ruta_archivo, str(e))
+            modos.append('error')
+    return modos
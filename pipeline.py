@@ -0,0 +1,137 @@
+import heapq
+import queue
+from concurrent.futures import wait, FIRST_COMPLETED
+from metrics import fijar_gauge
+
+FIN = "FIN"
+# Cada cuánto se revisa la cola de entrada mientras hay tareas en vuelo y queda capacidad libre
+INTERVALO_SONDEO = 0.05
+
+def _origen(item):
+    # Los elementos de las colas son tuplas que empiezan por la ruta del archivo
+    return item[0] if isinstance(item, tuple) and item else str(item)
+
+def _registrar_fallo(origen, mensaje):
+    # Importación diferida: utils importa FIN de este módulo
+    from utils import log_error
+    log_error(origen, mensaje)
+
+def _contener(item, funcion, *args):
+    # Un fallo con un elemento se registra y no detiene la etapa: si el bucle terminara, las etapas
+    # anteriores quedarían bloqueadas para siempre en el put de una cola llena
+    try:
+        return funcion(*args)
+    except Exception as e:
+        _registrar_fallo(_origen(item), str(e))
+        return None
+
+def vaciar_hasta_fin(cola_entrada):
+    # Consume la entrada restante para que las etapas anteriores puedan terminar cuando esta no pudo procesarla
+    descartados = 0
+    while cola_entrada.get() != FIN:
+        descartados += 1
+    return descartados
+
+def ejecutar_etapa(cola_entrada, max_en_vuelo, enviar_tarea, al_completar, nombre=None, workers=None):
+    # Mantiene hasta max_en_vuelo tareas en ejecución y entrega cada resultado en cuanto termina,
+    # sin esperar al resto de su lote. Termina al recibir FIN y vaciar las tareas pendientes.
+    # Siempre consume la entrada hasta FIN, también si la etapa falla.
+    en_vuelo = {}
+    fin = False
+    try:
+        while not fin or en_vuelo:
+            while not fin and len(en_vuelo) < max_en_vuelo:
+                try:
+                    item = cola_entrada.get(block=not en_vuelo)
+                except queue.Empty:
+                    break
+                if item == FIN:
+                    fin = True
+                    break
+                futuro = _contener(item, enviar_tarea, item)
+                if futuro is not None:
+                    en_vuelo[futuro] = item
+
+            _fijar_ocupacion(nombre, len(en_vuelo), workers)
+            if not en_vuelo:
+                continue
+            timeout = None if fin or len(en_vuelo) >= max_en_vuelo else INTERVALO_SONDEO
+            terminados, _ = wait(en_vuelo, timeout=timeout, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                item = en_vuelo.pop(futuro)
+                _contener(item, al_completar, item, futuro)
+    finally:
+        if not fin:
+            _registrar_fallo(nombre or "ejecutar_etapa", f"Etapa interrumpida; {vaciar_hasta_fin(cola_entrada)} elementos sin procesar.")
+    _fijar_ocupacion(nombre, 0, workers)
+
+def ejecutar_etapa_por_coste(cola_entrada, pools, clasificar, enviar_tarea, al_completar, ventana, nombre=None):
+    # Como ejecutar_etapa, pero con varios pools: cada elemento se asigna a un pool con clasificar(item) -> (pool, coste)
+    # y, entre los 'ventana' elementos ya leídos, cada pool despacha primero el más costoso para acortar la cola larga.
+    # pools: {nombre_pool: (max_en_vuelo, workers)}
+    pendientes = {pool: [] for pool in pools}
+    ocupados = {pool: 0 for pool in pools}
+    en_vuelo = {}
+    secuencia = 0
+    fin = False
+    try:
+        while not fin or en_vuelo or any(pendientes.values()):
+            while not fin and sum(len(heap) for heap in pendientes.values()) < ventana:
+                try:
+                    item = cola_entrada.get(block=not en_vuelo and not any(pendientes.values()))
+                except queue.Empty:
+                    break
+                if item == FIN:
+                    fin = True
+                    break
+                clasificacion = _contener(item, clasificar, item)
+                if clasificacion is None:
+                    continue
+                pool, coste = clasificacion
+                heapq.heappush(pendientes[pool], (-coste, secuencia, item))
+                secuencia += 1
+
+            for pool, (max_en_vuelo, workers) in pools.items():
+                while pendientes[pool] and ocupados[pool] < max_en_vuelo:
+                    _, _, item = heapq.heappop(pendientes[pool])
+                    futuro = _contener(item, enviar_tarea, item, pool)
+                    if futuro is not None:
+                        en_vuelo[futuro] = (item, pool)
+                        ocupados[pool] += 1
+                _fijar_ocupacion(f"{nombre}_{pool}" if nombre else None, ocupados[pool], workers)
+
+            if not en_vuelo:
+                continue
+            lleno = sum(len(heap) for heap in pendientes.values()) >= ventana
+            terminados, _ = wait(en_vuelo, timeout=None if fin or lleno else INTERVALO_SONDEO, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                item, pool = en_vuelo.pop(futuro)
+                ocupados[pool] -= 1
+                _contener(item, al_completar, item, futuro)
+    finally:
+        if not fin:
+            _registrar_fallo(nombre or "ejecutar_etapa_por_coste", f"Etapa interrumpida; {vaciar_hasta_fin(cola_entrada)} elementos sin procesar.")
+    for pool, (_, workers) in pools.items():
+        _fijar_ocupacion(f"{nombre}_{pool}" if nombre else None, 0, workers)
+
+def _fijar_ocupacion(nombre, en_vuelo, workers):
+    if nombre is None:
+        return
+    fijar_gauge('organizador_tareas_en_vuelo', en_vuelo, etapa=nombre)
+    if workers:
+        fijar_gauge('organizador_utilizacion_workers', round(min(en_vuelo, workers) / workers, 3), etapa=nombre)
+
+def recoger_lote(cola_entrada, max_items, espera):
+    # Bloquea hasta el primer elemento y después agrupa lo que llegue en 'espera' segundos.
+    # Devuelve el lote y si se recibió FIN.
+    lote = []
+    item = cola_entrada.get()
+    while item != FIN:
+        lote.append(item)
+        if len(lote) >= max_items:
+            return lote, False
+        try:
+            item = cola_entrada.get(timeout=espera)
+        except queue.Empty:
+            return lote, False
+    return lote, True
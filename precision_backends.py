@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from file_types import EXTENSIONES_SOPORTADAS, QUESTIONS_AUTHOR_VARIATIONS
+from corpus_sintetico import generar_corpus
+
+# Proporción mínima de respuestas iguales a las de PyTorch para aceptar un backend
+UMBRAL_COINCIDENCIA = 0.95
+MAX_DOCUMENTOS = 200
+
+def documentos_muestra(carpeta, max_documentos=MAX_DOCUMENTOS, presupuesto_tokens=None):
+    from file_reader import process_file
+    from utils import clean_input_text
+    from context_selector import seleccionar_contexto
+    documentos = []
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in sorted(archivos):
+            ext = os.path.splitext(nombre)[1].lower()
+            if ext not in EXTENSIONES_SOPORTADAS:
+                continue
+            texto, metadata = process_file(os.path.join(raiz, nombre), ext)
+            texto = clean_input_text(texto)
+            if len(texto) < 100:
+                continue
+            texto, _ = seleccionar_contexto(texto, presupuesto_tokens)
+            contexto = f"Título: {metadata.get('title', '')}, Archivo: {metadata.get('filename', '')}\n\n{texto}"
+            documentos.append((os.path.join(raiz, nombre), contexto, texto))
+            if len(documentos) >= max_documentos:
+                return documentos
+    return documentos
+
+def evaluar_backend(backend, hilos, documentos, batch_size):
+    import analysis
+    from models import obtener_modelo
+    analysis.configurar_inferencia(backend, hilos)
+    qa = obtener_modelo('qa')
+    ner = obtener_modelo('ner')
+
+    inicio = time.perf_counter()
+    respuestas = qa([{'context': contexto, 'question': QUESTIONS_AUTHOR_VARIATIONS[0]} for _, contexto, _ in documentos], batch_size=batch_size)
+    segundos_qa = time.perf_counter() - inicio
+    if isinstance(respuestas, dict):
+        respuestas = [respuestas]
+
+    inicio = time.perf_counter()
+    entidades = ner([texto for _, _, texto in documentos], batch_size=batch_size)
+    segundos_ner = time.perf_counter() - inicio
+    if len(documentos) == 1 and (not entidades or isinstance(entidades[0], dict)):
+        entidades = [entidades]
+
+    return {
+        'respuestas_qa': [respuesta.get('answer') for respuesta in respuestas],
+        'scores_qa': [float(respuesta.get('score', 0.0)) for respuesta in respuestas],
+        'autores_ner': [analysis.authors_from_ner_results(resultado) for resultado in entidades],
+        'segundos_qa': round(segundos_qa, 3),
+        'segundos_ner': round(segundos_ner, 3),
+        'pico_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def _aislado(backend, hilos, documentos, batch_size):
+    # Cada backend se carga en un proceso nuevo para no mezclar modelos ni picos de memoria
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+        return executor.submit(evaluar_backend, backend, hilos, documentos, batch_size).result()
+
+def _coincidencia(referencia, candidatos):
+    from utils import normalize_author_name
+    iguales = sum(1 for a, b in zip(referencia, candidatos) if normalize_author_name(a or '') == normalize_author_name(b or ''))
+    return round(iguales / len(referencia), 3) if referencia else 1.0
+
+def comparar(referencia, resultado):
+    diferencias_score = [abs(a - b) for a, b in zip(referencia['scores_qa'], resultado['scores_qa'])]
+    return {
+        'coincidencia_qa': _coincidencia(referencia['respuestas_qa'], resultado['respuestas_qa']),
+        'coincidencia_ner': _coincidencia(referencia['autores_ner'], resultado['autores_ner']),
+        'diferencia_media_score_qa': round(sum(diferencias_score) / len(diferencias_score), 4) if diferencias_score else 0.0,
+        'aceleracion_qa': round(referencia['segundos_qa'] / resultado['segundos_qa'], 2) if resultado['segundos_qa'] else None,
+        'aceleracion_ner': round(referencia['segundos_ner'] / resultado['segundos_ner'], 2) if resultado['segundos_ner'] else None,
+        'pico_rss_mb': resultado['pico_rss_mb'],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compara las respuestas de cada backend de inferencia con las de PyTorch sin optimizar.")
+    parser.add_argument('--corpus', help="Carpeta con los documentos de muestra; si no se indica se genera uno sintético temporal.")
+    parser.add_argument('--backends', nargs='+', default=['int8', 'onnx'])
+    parser.add_argument('--hilos', type=int, default=None, help="Hilos intra-op para todos los backends.")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--max-documentos', type=int, default=MAX_DOCUMENTOS)
+    parser.add_argument('--presupuesto-tokens', type=int, default=None, help="Aplica el selector de contexto con este presupuesto, como en producción.")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_COINCIDENCIA)
+    parser.add_argument('--salida', help="Guarda la comparación en este archivo JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporal:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(temporal, 'corpus')
+            generar_corpus(corpus, por_formato=10, formatos=['pdf', 'epub', 'docx'])
+        documentos = documentos_muestra(corpus, args.max_documentos, args.presupuesto_tokens)
+
+    referencia = _aislado('eager', args.hilos, documentos, args.batch_size)
+    comparacion = {'eager': comparar(referencia, referencia)}
+    for backend in args.backends:
+        comparacion[backend] = comparar(referencia, _aislado(backend, args.hilos, documentos, args.batch_size))
+
+    print(f"{len(documentos)} documentos de muestra")
+    for backend, resultado in comparacion.items():
+        print(f"{backend:>6}: " + ', '.join(f"{clave}={valor}" for clave, valor in resultado.items()))
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(comparacion, archivo, indent=4, ensure_ascii=False)
+
+    rechazados = [backend for backend, resultado in comparacion.items()
+                  if min(resultado['coincidencia_qa'], resultado['coincidencia_ner']) < args.umbral]
+    for backend in rechazados:
+        print(f"Backend '{backend}' por debajo del umbral de coincidencia {args.umbral}")
+    sys.exit(1 if rechazados else 0)
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+from threading import Lock
+
+from file_types import EXTENSIONES_SOPORTADAS
+
+# Segundos estimados (fijo, por MB) de cada formato hasta tener observaciones propias
+COSTES_INICIALES = {
+    'pdf': (0.05, 0.05),
+    'docx': (0.02, 0.02),
+    'epub': (0.005, 0.005),
+    'doc': (0.003, 0.003),
+    'rtf': (0.003, 0.003),
+    # Para OCR la unidad es la página, no el MB
+    'ocr': (0.5, 2.0),
+}
+# Observaciones necesarias antes de fiarse de la regresión aprendida
+MIN_OBSERVACIONES = 20
+# Pool al que va cada formato: 'pesado' para el parseo intensivo en CPU, 'ligero' para los lectores rápidos
+POOL_POR_FORMATO = {'pdf': 'pesado', 'docx': 'pesado', 'epub': 'ligero', 'doc': 'ligero', 'rtf': 'ligero'}
+
+def medir_tarea(funcion, *args):
+    # Se ejecuta en el worker; devuelve el resultado y los segundos que tardó la tarea sin contar la espera en cola
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+class ModeloCostes:
+    # Regresión lineal por formato (segundos = fijo + por_unidad * unidades) acumulada entre ejecuciones
+    def __init__(self, sumas=None):
+        self.lock = Lock()
+        self.sumas = sumas or {}
+
+    def estimar(self, formato, unidades):
+        fijo, por_unidad = self.coeficientes(formato)
+        return fijo + por_unidad * unidades
+
+    def coeficientes(self, formato):
+        with self.lock:
+            n, sx, sy, sxx, sxy = self.sumas.get(formato, (0, 0.0, 0.0, 0.0, 0.0))
+        if n < MIN_OBSERVACIONES:
+            return COSTES_INICIALES.get(formato, (0.05, 0.05))
+        varianza = n * sxx - sx * sx
+        if varianza <= 0:
+            return sy / n, 0.0
+        por_unidad = max(0.0, (n * sxy - sx * sy) / varianza)
+        return max(0.0, (sy - por_unidad * sx) / n), por_unidad
+
+    def observar(self, formato, unidades, segundos):
+        with self.lock:
+            n, sx, sy, sxx, sxy = self.sumas.get(formato, (0, 0.0, 0.0, 0.0, 0.0))
+            self.sumas[formato] = (n + 1, sx + unidades, sy + segundos, sxx + unidades * unidades, sxy + unidades * segundos)
+
+    def estimar_archivo(self, ext, tamano):
+        # Solo tamaño y coste aprendido del formato: se llama desde el hilo que despacha, que no debe abrir archivos.
+        # Las páginas que necesitan OCR las detecta el worker de extracción y su coste se aprende en la etapa de OCR.
+        formato = EXTENSIONES_SOPORTADAS.get(ext.lower(), ext)
+        return self.estimar(formato, tamano / (1024 * 1024))
+
+    def resumen(self):
+        with self.lock:
+            formatos = list(self.sumas)
+        return {formato: dict(zip(('fijo_s', 'por_unidad_s'), (round(c, 4) for c in self.coeficientes(formato))),
+                              observaciones=self.sumas[formato][0]) for formato in formatos}
+
+    def save(self, path):
+        temporal = f"{path}.tmp"
+        with self.lock, open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(self.sumas, archivo)
+        os.replace(temporal, path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as archivo:
+            return cls({formato: tuple(sumas) for formato, sumas in json.load(archivo).items()})
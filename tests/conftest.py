@@ -0,0 +1,16 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+@pytest.fixture
+def eventos(tmp_path):
+    ruta_eventos = tmp_path / 'eventos.jsonl'
+    metrics.configurar_eventos(str(ruta_eventos))
+    yield lambda: [json.loads(linea) for linea in ruta_eventos.read_text().splitlines()]
+    metrics.configurar_eventos(None)
@@ -0,0 +1,16 @@
+import analysis
+
+RELLENO = "el viento soplaba sobre los campos mientras la tarde caía despacio sobre el pueblo " * 60
+CREDITOS = "Edición original © 1967 Gabriel García Márquez. Título original: Cien años de soledad. Traducción revisada."
+
+def test_contexto_se_elige_antes_de_quitar_los_acentos(monkeypatch):
+    # La ventana de créditos solo puntúa por '©', las pistas con tilde y el nombre acentuado
+    contextos = []
+    def qa(entradas, batch_size=1):
+        contextos.extend(entrada['context'] for entrada in entradas)
+        return [{'answer': 'no', 'score': 0.0} for _ in entradas]
+    monkeypatch.setattr(analysis, 'extraer_autor_reglas', lambda texto, nombre_archivo: (None, 0, []))
+    monkeypatch.setattr(analysis, 'obtener_modelo', lambda nombre: qa if nombre == 'qa' else (lambda textos, batch_size=1: [[] for _ in textos]))
+
+    analysis.extract_authors_batch([RELLENO + CREDITOS + ' ' + RELLENO], [''], ['libro.pdf'], [{'filename': 'libro.pdf'}], 1)
+    assert contextos and all('1967 Gabriel Garc' in contexto for contexto in contextos)
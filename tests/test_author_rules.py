@@ -0,0 +1,43 @@
+import pytest
+
+from author_rules import extraer_autor_reglas, regla_nombre_archivo, UMBRAL_CONFIANZA_REGLAS
+
+@pytest.mark.parametrize('nombre_archivo', [
+    'Cien años de soledad - Gabriel García Márquez.pdf',
+    'Curso de Python - 2ª edición.pdf',
+    'Informe anual - 2023.pdf',
+    'Apuntes de clase - Tema 1.pdf',
+    'Historia de España - Tomo II.epub',
+])
+def test_titulo_primero_no_supera_el_umbral(nombre_archivo):
+    autor, confianza, _ = extraer_autor_reglas('', nombre_archivo)
+    assert confianza < UMBRAL_CONFIANZA_REGLAS
+
+@pytest.mark.parametrize('nombre_archivo', [
+    'Cien años de soledad - Gabriel García Márquez.pdf',
+    'Informe anual - 2023.pdf',
+    'apuntes de clase - tema 1.pdf',
+])
+def test_nombre_archivo_sin_forma_de_nombre(nombre_archivo):
+    assert regla_nombre_archivo('', nombre_archivo) is None
+
+def test_nombre_archivo_invertido():
+    autor, confianza = regla_nombre_archivo('', 'García Márquez, Gabriel - Cien años de soledad.pdf')
+    assert autor == 'Gabriel García Márquez'
+    assert confianza < UMBRAL_CONFIANZA_REGLAS
+
+def test_nombre_archivo_confirmado_por_el_texto():
+    autor, confianza, reglas = extraer_autor_reglas('Rayuela. Novela escrita por Julio Cortázar.', 'Julio Cortázar - Rayuela.epub')
+    assert autor == 'Julio Cortázar'
+    assert confianza >= UMBRAL_CONFIANZA_REGLAS
+    assert reglas == ['archivo', 'por']
+
+def test_etiqueta_en_el_texto():
+    autor, confianza, reglas = extraer_autor_reglas('Rayuela. Autor: Julio Cortázar. Editorial Sudamericana, 1963.', 'rayuela.pdf')
+    assert autor == 'Julio Cortázar'
+    assert confianza >= UMBRAL_CONFIANZA_REGLAS
+    assert reglas == ['etiqueta']
+
+def test_copyright_de_editorial_descartado():
+    autor, _, _ = extraer_autor_reglas('© 2001 Editorial Planeta S.A. ISBN 978-84-08-00000-0', 'libro.pdf')
+    assert autor is None
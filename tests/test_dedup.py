@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+from corpus_sintetico import escribir_epub
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EJECUTAR_MAIN = (
+    "import sys, main; from benchmark import instalar_modelos_stub; instalar_modelos_stub(); "
+    "main.CARPETA_ENTRADA = sys.argv[1]; main.MAX_WORKERS = 2; main.main(duplicados_una_vez=True)"
+)
+
+def _ejecutar(carpeta, entrada):
+    proceso = subprocess.run([sys.executable, '-c', EJECUTAR_MAIN, str(entrada)], cwd=carpeta, capture_output=True, text=True,
+                             env={**os.environ, 'PYTHONPATH': RAIZ, 'TQDM_DISABLE': '1'}, timeout=300)
+    assert 'correctamente' in proceso.stdout, proceso.stdout + proceso.stderr
+    with open(os.path.join(carpeta, 'errores_procesamiento.json'), encoding='utf-8') as log_file:
+        return json.load(log_file)
+
+def _colocados(carpeta):
+    return sorted(nombre for _, _, nombres in os.walk(os.path.join(carpeta, 'Libros_Organizados')) for nombre in nombres)
+
+def test_duplicados_una_vez_se_respeta_con_la_cache(tmp_path):
+    entrada = tmp_path / 'entrada'
+    entrada.mkdir()
+    escribir_epub(str(entrada / 'libro.epub'), ["Capítulo uno."], 'Julio Cortázar', 'Rayuela', True)
+    shutil.copy2(entrada / 'libro.epub', entrada / 'copia.epub')
+
+    primera = _ejecutar(tmp_path, entrada)
+    colocados = _colocados(tmp_path)
+    assert len(colocados) == 1
+    assert sum(len(copias) for copias in primera['duplicados'].values()) == 1
+
+    # La segunda ejecución toma ambos archivos de la caché
+    shutil.rmtree(tmp_path / 'Libros_Organizados')
+    segunda = _ejecutar(tmp_path, entrada)
+    assert 'ruta_rapida_metadata' not in segunda['contadores']
+    assert segunda['duplicados'] == primera['duplicados']
+    assert segunda['contadores'].get('duplicados') == 1
+    assert _colocados(tmp_path) == colocados
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import subprocess
+
+from cola_trabajo import ColaTrabajo
+from corpus_sintetico import generar_corpus
+from file_types import EXTENSIONES_SOPORTADAS
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DISTRIBUIDO = os.path.join(RAIZ, 'distribuido.py')
+ARCHIVOS_LOTE = [('/libros/a.pdf', '.pdf', 10), ('/libros/b.epub', '.epub', 20)]
+
+def _distribuido(carpeta, *argumentos):
+    return subprocess.Popen([sys.executable, DISTRIBUIDO, *argumentos], cwd=carpeta,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            env={**os.environ, 'TQDM_DISABLE': '1'})
+
+def _esperar(proceso, timeout=300):
+    salida, _ = proceso.communicate(timeout=timeout)
+    assert proceso.returncode == 0, salida
+    return salida
+
+def test_lease_vencido_lo_retoma_otro_worker(tmp_path):
+    cola = ColaTrabajo(str(tmp_path / 'cola.sqlite'))
+    cola.crear([ARCHIVOS_LOTE])
+    id_lote, archivos = cola.arrendar('caido', duracion=0.2)
+    assert archivos == ARCHIVOS_LOTE
+    assert cola.arrendar('vivo') is None
+    time.sleep(0.3)
+    assert cola.arrendar('vivo') == (id_lote, ARCHIVOS_LOTE)
+    assert not cola.renovar(id_lote, 'caido')
+    cola.cerrar()
+
+def test_completar_obsoleto_no_sobrescribe(tmp_path):
+    cola = ColaTrabajo(str(tmp_path / 'cola.sqlite'))
+    cola.crear([ARCHIVOS_LOTE])
+    id_lote, _ = cola.arrendar('caido', duracion=0.1)
+    time.sleep(0.2)
+    cola.arrendar('vivo')
+    assert cola.completar(id_lote, 'vivo', [(ruta, 'Autor Vivo', {}, 'qa', None) for ruta, _, _ in ARCHIVOS_LOTE])
+    assert not cola.completar(id_lote, 'caido', [(ruta, 'Autor Caido', {}, 'qa', None) for ruta, _, _ in ARCHIVOS_LOTE])
+    assert {autor for _, autor, _, _, _ in cola.resultados()} == {'Autor Vivo'}
+    assert cola.estado() == {'hecho': 1}
+    cola.cerrar()
+
+def test_coordinar_trabajar_fusionar(tmp_path):
+    # Coordinador, varios workers locales con modelos de prueba y fusión, como en varios hosts con un montaje compartido.
+    # Uno de los lotes lo arrienda antes un worker que "se cae": su lease vence y otro worker lo retoma.
+    entrada = tmp_path / 'entrada'
+    generar_corpus(str(entrada), por_formato=2, formatos=['pdf', 'epub', 'docx', 'rtf', 'doc'])
+    ruta_cola = str(tmp_path / 'cola.sqlite')
+    _esperar(_distribuido(tmp_path, 'coordinar', '--cola', ruta_cola, '--carpeta', str(entrada), '--tamano-lote', '3'))
+
+    cola = ColaTrabajo(ruta_cola)
+    id_caido, _ = cola.arrendar('caido', duracion=0.5)
+    time.sleep(0.6)
+    workers = [_distribuido(tmp_path, 'trabajar', '--cola', ruta_cola, '--modelos', 'stub') for _ in range(3)]
+    for worker in workers:
+        _esperar(worker)
+
+    assert not cola.completar(id_caido, 'caido', [])
+    assert cola.sin_terminar() == 0 and not cola.lotes_fallidos()
+    cola.cerrar()
+    _esperar(_distribuido(tmp_path, 'fusionar', '--cola', ruta_cola))
+
+    libros = [nombre for _, _, nombres in os.walk(entrada) for nombre in nombres if os.path.splitext(nombre)[1].lower() in EXTENSIONES_SOPORTADAS]
+    colocados = [nombre for _, _, nombres in os.walk(tmp_path / 'Libros_Organizados') for nombre in nombres]
+    assert sorted(colocados) == sorted(libros)
@@ -0,0 +1,69 @@
+import unicodedata
+
+import fitz
+import pytest
+
+import file_reader
+from file_reader import process_pdf, process_epub, process_file_metadata_first
+from corpus_sintetico import escribir_epub
+
+RELLENO = "Lorem ipsum dolor sit amet consectetur adipiscing elit. " * 10
+
+def _pdf(ruta, paginas):
+    documento = fitz.open()
+    for texto in paginas:
+        documento.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), texto, fontsize=9)
+    documento.save(str(ruta))
+
+def test_pdf_se_detiene_con_pista_de_autor_en_el_texto(tmp_path, eventos):
+    ruta = tmp_path / 'rayuela.pdf'
+    _pdf(ruta, ["Rayuela. Autor: Julio Cortázar. Editorial Sudamericana."] + [RELLENO] * 4)
+    texto, _ = process_pdf(str(ruta))
+    assert 'Julio Cort' in texto and 'Lorem' not in texto
+    salidas = [evento['salida'] for evento in eventos() if evento['tipo'] == 'pdf_paginas']
+    assert salidas == ['pista_autor']
+
+def test_pdf_no_se_detiene_por_el_nombre_de_archivo(tmp_path, eventos):
+    ruta = tmp_path / 'Julio Cortázar - Rayuela.pdf'
+    _pdf(ruta, [RELLENO] * 3)
+    texto, _ = process_pdf(str(ruta))
+    assert texto.count('Lorem ipsum') == 30
+    salidas = [evento['salida'] for evento in eventos() if evento['tipo'] == 'pdf_paginas']
+    assert salidas == ['fin_documento']
+
+def test_pdf_mide_motor_y_reglas_por_separado(tmp_path, eventos):
+    ruta = tmp_path / 'libro.pdf'
+    _pdf(ruta, [RELLENO] * 2)
+    process_pdf(str(ruta))
+    etapas = [evento['etapa'] for evento in eventos() if evento['tipo'] == 'etapa']
+    assert etapas.count('pdf_pymupdf') == 1
+    assert etapas.count('pdf_pista_autor') == 1
+
+@pytest.mark.parametrize('tamano_bloque', [3, 5, 7])
+def test_epub_conserva_caracteres_partidos_entre_bloques(tmp_path, monkeypatch, tamano_bloque):
+    monkeypatch.setattr(file_reader, 'EPUB_CHUNK_SIZE', tamano_bloque)
+    texto_original = "Cortázar, Núñez y Gómez: «añoranza» — 東京"
+    ruta = tmp_path / 'libro.epub'
+    escribir_epub(str(ruta), [texto_original], 'Julio Cortázar', 'Rayuela', True)
+    texto, _ = process_epub(str(ruta))
+    assert texto == unicodedata.normalize('NFKD', texto_original)
+
+def test_pdf_se_abre_una_vez_con_o_sin_metadata(tmp_path, monkeypatch):
+    sin_autor = tmp_path / 'sin_autor.pdf'
+    _pdf(sin_autor, [RELLENO])
+    con_autor = tmp_path / 'con_autor.pdf'
+    documento = fitz.open()
+    documento.new_page().insert_text((50, 50), RELLENO[:60])
+    documento.set_metadata({'author': 'Julio Cortázar'})
+    documento.save(str(con_autor))
+
+    aperturas = []
+    abrir = fitz.open
+    monkeypatch.setattr(file_reader.fitz, 'open', lambda *args, **kwargs: aperturas.append(args) or abrir(*args, **kwargs))
+    texto, metadata = process_file_metadata_first(str(sin_autor), '.pdf')
+    assert 'Lorem' in texto and not metadata['author']
+    assert len(aperturas) == 1
+
+    aperturas.clear()
+    assert process_file_metadata_first(str(con_autor), '.pdf') == (None, {'author': 'Julio Cortázar', 'title': '', 'filename': 'con_autor.pdf'})
+    assert len(aperturas) == 1
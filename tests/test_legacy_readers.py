@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import legacy_readers
+import file_reader
+from legacy_readers import leer_doc, texto_rtf
+from file_reader import process_doc, process_file_metadata_first
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def _fixture(nombre):
+    return os.path.join(FIXTURES, nombre)
+
+def test_rtf_usa_la_pagina_de_codigos_declarada():
+    assert texto_rtf(_fixture('ansicpg1251.rtf')).strip() == 'Война и мир'
+
+def test_rtf_con_pagina_de_codigos_desconocida_usa_cp1252():
+    assert texto_rtf(_fixture('ansicpg_invalida.rtf')).strip() == 'Capítulo de Cortázar'
+
+def test_doc_texto_y_metadata_en_una_lectura():
+    texto, (autor, titulo) = leer_doc(_fixture('rayuela.doc'))
+    assert texto.split('\n')[:4] == ['Rayuela', 'Julio Cortázar', 'Capítulo 1', '¿Encontraría a la Maga?']
+    assert (autor, titulo) == ('Julio Cortázar', 'Rayuela')
+    assert leer_doc(_fixture('rayuela.doc'), basta_autor=bool) == (None, ('Julio Cortázar', 'Rayuela'))
+
+def test_doc_con_pagina_de_codigos_desconocida_usa_cp1252():
+    assert leer_doc(_fixture('pagina_codigos_invalida.doc'), basta_autor=bool)[1] == ('Julio Cortázar', 'Rayuela')
+
+def _contar_aperturas(monkeypatch):
+    aperturas = []
+    original = legacy_readers.ArchivoOLE.__init__
+    def contar(self, archivo):
+        aperturas.append(archivo.name)
+        original(self, archivo)
+    monkeypatch.setattr(legacy_readers.ArchivoOLE, '__init__', contar)
+    return aperturas
+
+def test_process_doc_abre_el_contenedor_una_vez(monkeypatch):
+    aperturas = _contar_aperturas(monkeypatch)
+    texto, metadata = process_doc(_fixture('rayuela.doc'))
+    assert 'Rayuela' in texto and metadata['author'] == 'Julio Cortázar'
+    assert len(aperturas) == 1
+
+def test_metadata_primero_abre_el_contenedor_una_vez(monkeypatch):
+    aperturas = _contar_aperturas(monkeypatch)
+    assert process_file_metadata_first(_fixture('rayuela.doc'), '.doc') == \
+        (None, {'author': 'Julio Cortázar', 'title': 'Rayuela', 'filename': 'rayuela.doc'})
+    assert len(aperturas) == 1
+
+    # Sin un autor utilizable en la metadata el texto sale de la misma lectura
+    aperturas.clear()
+    monkeypatch.setattr(file_reader, 'is_usable_author', lambda autor: False)
+    texto, metadata = process_file_metadata_first(_fixture('rayuela.doc'), '.doc')
+    assert 'Rayuela' in texto and metadata['author'] == 'Julio Cortázar'
+    assert len(aperturas) == 1
+
+def test_doc_sin_firma_ole_falla():
+    with pytest.raises(ValueError):
+        leer_doc(_fixture('ansicpg1251.rtf'))
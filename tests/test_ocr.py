@@ -0,0 +1,34 @@
+import fitz
+
+import ocr
+from file_reader import process_pdf
+from utils import clean_input_text
+
+RELLENO = "Lorem ipsum dolor sit amet consectetur adipiscing elit. " * 30
+
+class LectorOcrPrueba:
+    def readtext_batched(self, imagenes, n_width=None, n_height=None, batch_size=1, detail=0):
+        return [['Rayuela', 'Julio Cortazar'] for _ in imagenes]
+
+def _pdf_portada_escaneada(ruta, paginas_texto):
+    with fitz.open() as origen, fitz.open() as documento:
+        portada = origen.new_page()
+        portada.insert_textbox(fitz.Rect(56, 56, 540, 790), "Rayuela\nJulio Cortazar", fontsize=24)
+        pixmap = portada.get_pixmap(dpi=72, colorspace=fitz.csGRAY)
+        nueva = documento.new_page(width=portada.rect.width, height=portada.rect.height)
+        nueva.insert_image(nueva.rect, stream=pixmap.tobytes('png'))
+        for _ in range(paginas_texto):
+            documento.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), RELLENO, fontsize=7)
+        documento.save(str(ruta))
+
+def test_ocr_de_la_portada_queda_al_principio(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, 'obtener_modelo', lambda nombre: LectorOcrPrueba())
+    ruta = tmp_path / 'rayuela.pdf'
+    _pdf_portada_escaneada(ruta, 9)
+    texto, metadata = process_pdf(str(ruta))
+    assert metadata['paginas_ocr'] == [0]
+
+    texto, metadata = ocr.process_ocr(str(ruta), texto, metadata)
+    assert texto.startswith('Rayuela Julio Cortazar Lorem')
+    assert 'Julio Cortazar' in clean_input_text(texto)
+    assert 'textos_paginas' not in metadata and 'paginas_ocr' not in metadata
@@ -0,0 +1,27 @@
+import pytest
+
+import organizer
+from utils import log_data
+
+@pytest.fixture
+def salida(tmp_path, monkeypatch):
+    monkeypatch.setattr(organizer, 'CARPETA_SALIDA', str(tmp_path / 'salida'))
+    return tmp_path / 'salida'
+
+def test_mismo_libro_ya_colocado_es_existente(tmp_path, salida):
+    libro = tmp_path / 'libro.epub'
+    libro.write_bytes(b'contenido')
+    assert organizer.organize_file(str(libro), 'Julio Cortazar') == 'copia'
+    assert organizer.organize_file(str(libro), 'Julio Cortazar') == 'existente'
+    assert (salida / 'Julio Cortazar' / 'libro.epub').read_bytes() == b'contenido'
+
+def test_fallo_se_propaga_y_organize_files_lo_registra(tmp_path, salida):
+    inexistente = str(tmp_path / 'no_existe.pdf')
+    with pytest.raises(FileNotFoundError):
+        organizer.organize_file(inexistente, 'Julio Cortazar')
+
+    libro = tmp_path / 'libro.pdf'
+    libro.write_bytes(b'contenido')
+    inicio_errores = len(log_data["archivos_error"])
+    assert organizer.organize_files([inexistente, str(libro)], 'Julio Cortazar') == ['error', 'copia']
+    assert [error["archivo"] for error in log_data["archivos_error"][inicio_errores:]] == [inexistente]
@@ -0,0 +1,24 @@
+import time
+from queue import Queue
+
+import utils
+from pipeline import FIN
+
+ESPERA_RECORRIDO = 0.05
+
+def test_escaneo_mide_el_recorrido(tmp_path, monkeypatch, eventos):
+    # Un recorrido lento (p. ej. un montaje de red) debe aparecer en la etapa 'escaneo', no solo la consulta a la caché
+    def recorrido_lento(carpeta_entrada):
+        for nombre in ('a.pdf', 'b.epub'):
+            time.sleep(ESPERA_RECORRIDO)
+            yield str(tmp_path / nombre), '.' + nombre.split('.')[1], None
+        time.sleep(ESPERA_RECORRIDO)
+    monkeypatch.setattr(utils, '_entradas_directorio', recorrido_lento)
+
+    cola_archivos = Queue()
+    utils.cargar_archivos(cola_archivos, str(tmp_path))
+    assert list(iter(cola_archivos.get, FIN)) == [(str(tmp_path / 'a.pdf'), '.pdf'), (str(tmp_path / 'b.epub'), '.epub')]
+
+    escaneo = [evento for evento in eventos() if evento['tipo'] == 'etapa' and evento['etapa'] == 'escaneo']
+    assert [evento['archivos'] for evento in escaneo] == [1, 1, 0]
+    assert all(evento['segundos'] >= ESPERA_RECORRIDO for evento in escaneo)
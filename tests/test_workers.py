@@ -0,0 +1,54 @@
+import errno
+from concurrent.futures import wait
+
+import pytest
+
+import workers
+from workers import PoolReciclable, TareaAbortada
+
+class ErrorSinPickle(Exception):
+    # Se serializa sin problema en el worker, pero no se puede reconstruir en el padre
+    def __init__(self, a, b):
+        super().__init__(f"{a} {b}")
+
+def lanzar_error_sin_pickle():
+    raise ErrorSinPickle(1, 2)
+
+def doble(x):
+    return 2 * x
+
+def initializer_roto():
+    raise RuntimeError("sin modelos")
+
+def test_resultado_ilegible_falla_solo_su_tarea():
+    with PoolReciclable(1, nombre='prueba') as pool:
+        with pytest.raises(RuntimeError, match='ilegible'):
+            pool.submit(lanzar_error_sin_pickle).result(timeout=30)
+        assert pool.submit(doble, 21).result(timeout=30) == 42
+
+def test_fork_fallido_se_reintenta(monkeypatch):
+    pool = PoolReciclable(1, nombre='prueba')
+    original = pool._iniciar_worker
+    fallos = []
+    def iniciar():
+        if len(fallos) < 2:
+            fallos.append(1)
+            raise OSError(errno.ENOMEM, "Cannot allocate memory")
+        original()
+    monkeypatch.setattr(pool, '_iniciar_worker', iniciar)
+    try:
+        assert pool.submit(doble, 4).result(timeout=30) == 8
+        assert pool.reporte()['fallos_arranque'] == 2
+    finally:
+        pool.shutdown()
+
+def test_initializer_roto_falla_la_cola(monkeypatch):
+    monkeypatch.setattr(workers, 'MAX_FALLOS_ARRANQUE', 3)
+    pool = PoolReciclable(2, initializer=initializer_roto, nombre='prueba')
+    futuros = [pool.submit(doble, i) for i in range(4)]
+    terminados, pendientes = wait(futuros, timeout=60)
+    assert not pendientes
+    assert all(isinstance(futuro.exception(), TareaAbortada) for futuro in futuros)
+    with pytest.raises(RuntimeError, match='se detuvo'):
+        pool.submit(doble, 1)
+    pool.shutdown()
@@ -2,17 +2,26 @@ import re
 import unicodedata
 from difflib import SequenceMatcher
 import os
-from file_types import FORMATOS_ARCHIVOS
+import json
+from file_types import EXTENSIONES_SOPORTADAS, AUTORES_NO_VALIDOS
+from author_index import AuthorIndex
+from pipeline import FIN
+from metrics import registrar_evento, Cronometro
 
 MAX_CHARACTERS = 15000  # Added MAX_CHARACTERS definition
 
 log_data = {
     "archivos_error": [],
-    "archivos_no_soportados": []
+    "archivos_no_soportados": [],
+    "contadores": {}
 }
 
 def log_error(ruta_archivo, mensaje):
     log_data["archivos_error"].append({"archivo": ruta_archivo, "error": mensaje})
+    registrar_evento('error', archivo=ruta_archivo, mensaje=mensaje)
+
+def incrementar_contador(nombre, cantidad=1):
+    log_data["contadores"][nombre] = log_data["contadores"].get(nombre, 0) + cantidad
 
 def clean_text(text):
     text = text.encode('utf-8', 'ignore').decode('utf-8', 'ignore')
@@ -26,7 +35,16 @@ def normalize_author_name(name):
     name = re.sub(r'[^a-z\s]', '', name)
     return ' '.join(name.split())
 
+def is_usable_author(author):
+    if not author or not isinstance(author, str):
+        return False
+    normalized = normalize_author_name(author)
+    return bool(normalized) and normalized not in AUTORES_NO_VALIDOS
+
 def get_best_matching_author(name, known_authors):
+    if isinstance(known_authors, AuthorIndex):
+        return known_authors.best_match(name)
+
     def similarity(a, b):
         return SequenceMatcher(None, a, b).ratio()
 
@@ -44,36 +62,112 @@ def get_best_matching_author(name, known_authors):
         known_authors.append(name)
         return name
 
-def cargar_archivos(cola_archivos, CARPETA_ENTRADA, BATCH_SIZE):
-    archivos_para_procesar = []
-    for root, _, files in os.walk(CARPETA_ENTRADA):
-        for nombre_archivo in files:
-            ruta_archivo = os.path.join(root, nombre_archivo)
-            if os.path.isfile(ruta_archivo):
-                ext = os.path.splitext(ruta_archivo)[1].lower()
-                if any(ext in formatos for formatos in FORMATOS_ARCHIVOS.values()):
-                    archivos_para_procesar.append((ruta_archivo, ext))
-                else:
-                    log_data["archivos_no_soportados"].append(ruta_archivo)
-
-    for i in range(0, len(archivos_para_procesar), BATCH_SIZE):
-        batch_archivos = archivos_para_procesar[i:i+BATCH_SIZE]
-        cola_archivos.put(batch_archivos)
-
-def contar_archivos(CARPETA_ENTRADA):
-    total_archivos = 0
-    for root, _, files in os.walk(CARPETA_ENTRADA):
-        for nombre_archivo in files:
-            ruta_archivo = os.path.join(root, nombre_archivo)
-            if os.path.isfile(ruta_archivo):
-                ext = os.path.splitext(ruta_archivo)[1].lower()
-                if any(ext in formatos for formatos in FORMATOS_ARCHIVOS.values()):
-                    total_archivos += 1
-    return total_archivos
-
-def clean_input_text(text):
+def escanear_directorio(carpeta):
+    pendientes = [carpeta]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with os.scandir(actual) as entradas:
+                for entrada in entradas:
+                    try:
+                        if entrada.is_dir():
+                            if not entrada.is_symlink():
+                                pendientes.append(entrada.path)
+                        elif entrada.is_file():
+                            yield entrada
+                    except OSError as e:
+                        log_error(entrada.path, str(e))
+        except OSError as e:
+            log_error(actual, str(e))
+
+def leer_manifiesto(ruta_manifiesto, carpeta_entrada):
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    if manifiesto.get('carpeta') != carpeta_entrada:
+        return None
+    return manifiesto
+
+def escribir_manifiesto(ruta_manifiesto, carpeta_entrada, archivos):
+    temporal = f"{ruta_manifiesto}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump({'carpeta': carpeta_entrada, 'total': len(archivos), 'archivos': archivos}, archivo, ensure_ascii=False)
+    os.replace(temporal, ruta_manifiesto)
+
+def _entradas_manifiesto(manifiesto):
+    for ruta_archivo, ext in manifiesto['archivos']:
+        try:
+            yield ruta_archivo, ext, os.stat(ruta_archivo)
+        except OSError:
+            continue
+
+def _entradas_directorio(carpeta_entrada):
+    for entrada in escanear_directorio(carpeta_entrada):
+        ext = os.path.splitext(entrada.name)[1].lower()
+        if ext in EXTENSIONES_SOPORTADAS:
+            yield entrada.path, ext, entrada
+        else:
+            log_data["archivos_no_soportados"].append(entrada.path)
+
+def cargar_archivos(cola_archivos, CARPETA_ENTRADA, cache=None, cola_organizacion=None, ruta_manifiesto=None, usar_manifiesto=False):
+    try:
+        manifiesto = leer_manifiesto(ruta_manifiesto, CARPETA_ENTRADA) if ruta_manifiesto and usar_manifiesto else None
+        entradas = _entradas_manifiesto(manifiesto) if manifiesto else _entradas_directorio(CARPETA_ENTRADA)
+
+        archivos_vistos = []
+        total_cache = 0
+        iterador = iter(entradas)
+        while True:
+            # Cada archivo se lleva el tiempo del recorrido (scandir o stat del manifiesto) que lo produjo y el de
+            # su consulta a la caché; la espera en las colas por contrapresión no cuenta como escaneo
+            cronometro = Cronometro('escaneo')
+            with cronometro.tramo():
+                siguiente = next(iterador, None)
+            if siguiente is None:
+                # Lo recorrido después del último archivo admitido (carpetas vacías, formatos no soportados)
+                cronometro.archivo, cronometro.archivos = CARPETA_ENTRADA, 0
+                cronometro.registrar()
+                break
+            ruta_archivo, ext, entrada = siguiente
+            cronometro.archivo = ruta_archivo
+            archivos_vistos.append((ruta_archivo, ext))
+            resultado = None
+            with cronometro.tramo():
+                if cache is not None:
+                    stat = entrada if isinstance(entrada, os.stat_result) else entrada.stat()
+                    resultado = cache.buscar(ruta_archivo, stat.st_size, stat.st_mtime)
+            cronometro.registrar()
+            if resultado is not None and resultado['etapa'] == 'duplicado' and resultado['metadata'].get('representante'):
+                # Las copias conocidas pasan por la deduplicación para que su grupo se restaure y se respete --duplicados-una-vez
+                cola_archivos.put((ruta_archivo, ext, resultado['metadata']['representante'], resultado['author']))
+                total_cache += 1
+            elif resultado is not None:
+                cola_organizacion.put((ruta_archivo, resultado['author']))
+                total_cache += 1
+            else:
+                cola_archivos.put((ruta_archivo, ext))
+
+        if ruta_manifiesto and not manifiesto:
+            escribir_manifiesto(ruta_manifiesto, CARPETA_ENTRADA, archivos_vistos)
+
+        if cache is not None:
+            eliminados = cache.purgar_eliminados({ruta_archivo for ruta_archivo, _ in archivos_vistos}, CARPETA_ENTRADA)
+            log_error("cargar_archivos", f"{total_cache} archivos sin cambios tomados de la caché, {eliminados} entradas eliminadas.")
+    except Exception as e:
+        log_error("cargar_archivos", str(e))
+    finally:
+        cola_archivos.put(FIN)
+
+def contar_archivos(ruta_manifiesto, CARPETA_ENTRADA):
+    manifiesto = leer_manifiesto(ruta_manifiesto, CARPETA_ENTRADA)
+    return manifiesto['total'] if manifiesto else None
+
+def clean_input_text(text, solo_ascii=True):
     if not text:
         return ''
     text = re.sub(r'\s+', ' ', text).strip()
-    text = re.sub(r'[^\x00-\x7F]+', ' ', text)
+    if solo_ascii:
+        text = re.sub(r'[^\x00-\x7F]+', ' ', text)
     return text[:MAX_CHARACTERS]
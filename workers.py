@@ -0,0 +1,295 @@
+import os
+import time
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as esperar_conexiones
+from concurrent.futures import Future
+from collections import deque
+
+from metrics import registrar_evento
+from utils import log_error
+
+# Cada cuánto se mide la memoria de los workers ocupados y se revisan los plazos
+INTERVALO_SUPERVISION = 0.5
+# Arranques fallidos seguidos (fork denegado, initializer que falla) sin ningún worker vivo tras los que el pool
+# se da por perdido y falla todas sus tareas en lugar de reintentar para siempre
+MAX_FALLOS_ARRANQUE = 5
+
+class TareaAbortada(Exception):
+    pass
+
+def memoria_privada_mb(pid='self'):
+    # USS: páginas que solo tiene este proceso. El RSS de un hijo creado con fork incluye todas las páginas que
+    # comparte con el padre (p. ej. los modelos de QA/NER), así que no sirve para saber cuánto ha crecido el worker.
+    try:
+        privada_kb = 0
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as smaps:
+            for linea in smaps:
+                if linea.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    privada_kb += int(linea.split()[1])
+        return privada_kb / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _bucle_worker(conexion, initializer, initargs, max_tareas, limite_reciclaje_mb):
+    # Ejecuta tareas de una en una. Tras el initializer envía su memoria privada como base; los límites se aplican
+    # al crecimiento sobre esa base. Sale por su cuenta al cumplir max_tareas o al superar limite_reciclaje_mb
+    # después de una tarea, para que el pool lo sustituya por un proceso limpio.
+    if initializer is not None:
+        initializer(*initargs)
+    base = memoria_privada_mb() or 0.0
+    conexion.send(base)
+    tareas = 0
+    while True:
+        tarea = conexion.recv()
+        if tarea is None:
+            return
+        funcion, args = tarea
+        try:
+            resultado, error = funcion(*args), None
+        except BaseException as e:
+            resultado, error = None, e
+        tareas += 1
+        crecimiento = max(0.0, (memoria_privada_mb() or base) - base)
+        reciclar = (max_tareas is not None and tareas >= max_tareas) or (limite_reciclaje_mb is not None and crecimiento > limite_reciclaje_mb)
+        try:
+            conexion.send((resultado, error, crecimiento, reciclar))
+        except Exception as e:
+            conexion.send((None, RuntimeError(f"Resultado no serializable: {e}"), crecimiento, reciclar))
+        if reciclar:
+            return
+
+class _Worker:
+    def __init__(self, proceso, conexion):
+        self.proceso = proceso
+        self.conexion = conexion
+        self.base = None
+        self.tarea = None
+        self.inicio = None
+        self.pico_muestreado = 0.0
+
+class PoolReciclable:
+    # Pool de procesos con un worker por tarea en ejecución. A diferencia de ProcessPoolExecutor, un worker
+    # colgado, que crece demasiado o que muere solo hace fallar su propio archivo: se mata, se sustituye
+    # y el resto de tareas sigue su curso. submit() devuelve un Future normal, compatible con wait().
+    # La memoria se mide como memoria privada (USS) por encima de la que el worker tenía al arrancar.
+    def __init__(self, max_workers, initializer=None, initargs=(), max_tareas_por_worker=None, limite_reciclaje_mb=None,
+                 timeout_tarea=None, limite_memoria_tarea_mb=None, nombre='pool'):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_tareas_por_worker = max_tareas_por_worker
+        self.limite_reciclaje_mb = limite_reciclaje_mb
+        self.timeout_tarea = timeout_tarea
+        self.limite_memoria_tarea_mb = limite_memoria_tarea_mb
+        self.nombre = nombre
+        self._contexto = multiprocessing.get_context('fork')
+        self._pendientes = deque()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._despertar_lectura, self._despertar_escritura = self._contexto.Pipe(duplex=False)
+        self._cerrando = False
+        self._error = None
+        self._fallos_arranque = 0
+        self.estadisticas = {'workers_iniciados': 0, 'reciclados': 0, 'timeouts': 0, 'limite_memoria': 0, 'caidas': 0, 'fallos_arranque': 0}
+        self.memoria_por_etiqueta = {}
+        self._supervisor = threading.Thread(target=self._supervisar, daemon=True, name=f"supervisor-{nombre}")
+        self._supervisor.start()
+
+    def submit(self, funcion, *args, etiqueta=None):
+        futuro = Future()
+        with self._lock:
+            if self._error is not None:
+                raise RuntimeError(f"El pool '{self.nombre}' se detuvo: {self._error}")
+            if self._cerrando:
+                raise RuntimeError(f"El pool '{self.nombre}' ya está cerrado.")
+            self._pendientes.append((futuro, funcion, args, etiqueta))
+        self._despertar_escritura.send_bytes(b'')
+        return futuro
+
+    def shutdown(self):
+        with self._lock:
+            self._cerrando = True
+        self._despertar_escritura.send_bytes(b'')
+        self._supervisor.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def _iniciar_worker(self):
+        conexion_padre, conexion_hijo = self._contexto.Pipe()
+        proceso = self._contexto.Process(target=_bucle_worker, daemon=True, args=(
+            conexion_hijo, self.initializer, self.initargs, self.max_tareas_por_worker, self.limite_reciclaje_mb))
+        try:
+            proceso.start()
+        finally:
+            conexion_hijo.close()
+        self.estadisticas['workers_iniciados'] += 1
+        self._workers.append(_Worker(proceso, conexion_padre))
+
+    def _retirar_worker(self, worker, matar=False):
+        if matar and worker.proceso.is_alive():
+            worker.proceso.kill()
+        worker.proceso.join()
+        worker.conexion.close()
+        self._workers.remove(worker)
+
+    def _asignar(self):
+        for worker in [worker for worker in self._workers if worker.tarea is None and not worker.proceso.is_alive()]:
+            self._retirar_worker(worker)
+        while True:
+            with self._lock:
+                if not self._pendientes:
+                    return
+                libre = next((worker for worker in self._workers if worker.base is not None and worker.tarea is None), None)
+                if libre is None:
+                    # Los workers que aún ejecutan el initializer recibirán tarea cuando envíen su base
+                    arrancando = sum(1 for worker in self._workers if worker.base is None)
+                    if arrancando < len(self._pendientes) and len(self._workers) < self.max_workers:
+                        try:
+                            self._iniciar_worker()
+                        except OSError as e:
+                            # Sin memoria o sin procesos disponibles: se reintenta en la siguiente vuelta del supervisor
+                            self._fallo_arranque(f"No se pudo crear un worker: {e}")
+                            return
+                        continue
+                    return
+                futuro, funcion, args, etiqueta = self._pendientes.popleft()
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            libre.tarea = (futuro, etiqueta)
+            libre.inicio = time.monotonic()
+            libre.pico_muestreado = 0.0
+            try:
+                libre.conexion.send((funcion, args))
+            except Exception as e:
+                libre.tarea = None
+                futuro.set_exception(e)
+
+    def _fallo_arranque(self, mensaje):
+        self.estadisticas['fallos_arranque'] += 1
+        self._fallos_arranque += 1
+        log_error(self.nombre, mensaje)
+        if self._fallos_arranque >= MAX_FALLOS_ARRANQUE and not any(worker.base is not None for worker in self._workers):
+            raise RuntimeError(f"{self._fallos_arranque} arranques de worker fallidos seguidos; último: {mensaje}")
+
+    def _registrar_memoria(self, etiqueta, pico_mb):
+        if etiqueta is None or pico_mb is None:
+            return
+        memoria = self.memoria_por_etiqueta.setdefault(etiqueta, {'tareas': 0, 'pico_mb': 0.0, 'suma_pico_mb': 0.0})
+        memoria['tareas'] += 1
+        memoria['pico_mb'] = max(memoria['pico_mb'], pico_mb)
+        memoria['suma_pico_mb'] += pico_mb
+
+    def _abortar(self, worker, motivo, mensaje):
+        futuro, etiqueta = worker.tarea
+        self.estadisticas[motivo] += 1
+        self._registrar_memoria(etiqueta, worker.pico_muestreado or None)
+        registrar_evento('worker_abortado', pool=self.nombre, motivo=motivo, pid=worker.proceso.pid)
+        self._retirar_worker(worker, matar=True)
+        futuro.set_exception(TareaAbortada(mensaje))
+
+    def _recibir(self, worker):
+        if worker.base is None:
+            try:
+                worker.base = worker.conexion.recv()
+                self._fallos_arranque = 0
+            except (EOFError, OSError):
+                # Normalmente un initializer que lanzó una excepción
+                self._retirar_worker(worker, matar=True)
+                self._fallo_arranque(f"Un worker terminó durante el arranque (código {worker.proceso.exitcode}).")
+            return
+
+        futuro, etiqueta = worker.tarea
+        try:
+            resultado, error, crecimiento, reciclar = worker.conexion.recv()
+        except (EOFError, OSError):
+            # El proceso murió durante la tarea (p. ej. un segfault en una librería nativa)
+            self.estadisticas['caidas'] += 1
+            self._retirar_worker(worker, matar=True)
+            futuro.set_exception(TareaAbortada(f"El worker terminó inesperadamente (código {worker.proceso.exitcode})."))
+            return
+        except Exception as e:
+            # El mensaje se leyó entero pero no se pudo reconstruir (p. ej. una excepción que no admite pickle);
+            # el worker sigue sincronizado y, si salió para reciclarse, _asignar lo retira
+            worker.tarea = None
+            futuro.set_exception(RuntimeError(f"Resultado del worker ilegible: {type(e).__name__}: {e}"))
+            return
+        worker.tarea = None
+        self._registrar_memoria(etiqueta, max(crecimiento, worker.pico_muestreado))
+        if reciclar:
+            self.estadisticas['reciclados'] += 1
+            self._retirar_worker(worker)
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(resultado)
+
+    def _vigilar(self):
+        ahora = time.monotonic()
+        for worker in [worker for worker in self._workers if worker.tarea is not None]:
+            if self.timeout_tarea is not None and ahora - worker.inicio > self.timeout_tarea:
+                self._abortar(worker, 'timeouts', f"Tarea cancelada tras {self.timeout_tarea}s sin terminar.")
+                continue
+            privada = memoria_privada_mb(worker.proceso.pid)
+            if privada is None:
+                continue
+            crecimiento = max(0.0, privada - worker.base)
+            worker.pico_muestreado = max(worker.pico_muestreado, crecimiento)
+            if self.limite_memoria_tarea_mb is not None and crecimiento > self.limite_memoria_tarea_mb:
+                self._abortar(worker, 'limite_memoria', f"Tarea cancelada al crecer más de {self.limite_memoria_tarea_mb} MB ({crecimiento:.0f} MB).")
+
+    def _supervisar(self):
+        try:
+            while True:
+                self._asignar()
+                atentos = [worker for worker in self._workers if worker.base is None or worker.tarea is not None]
+                with self._lock:
+                    if self._cerrando and not self._pendientes and not any(worker.tarea is not None for worker in self._workers):
+                        break
+                    # Con tareas pendientes y sin workers (p. ej. tras un fork fallido) también hay que volver a intentarlo
+                    esperando = bool(atentos or self._pendientes)
+                listos = esperar_conexiones([self._despertar_lectura] + [worker.conexion for worker in atentos],
+                                            timeout=INTERVALO_SUPERVISION if esperando else None)
+                if self._despertar_lectura in listos:
+                    while self._despertar_lectura.poll():
+                        self._despertar_lectura.recv_bytes()
+                for worker in atentos:
+                    if worker.conexion in listos:
+                        self._recibir(worker)
+                self._vigilar()
+        except Exception as e:
+            # Error irrecuperable: el pool deja de aceptar tareas y falla las que tenía, para que nadie espere para siempre
+            log_error(self.nombre, f"Supervisor del pool detenido: {e}")
+            with self._lock:
+                self._cerrando = True
+                self._error = e
+                pendientes = [futuro for futuro, *_ in self._pendientes]
+                self._pendientes.clear()
+            for futuro in pendientes + [worker.tarea[0] for worker in self._workers if worker.tarea is not None]:
+                if not futuro.done():
+                    futuro.set_exception(TareaAbortada(str(e)))
+        finally:
+            for worker in list(self._workers):
+                try:
+                    worker.conexion.send(None)
+                except OSError:
+                    pass
+                worker.proceso.join(timeout=5)
+                self._retirar_worker(worker, matar=True)
+
+    def reporte(self):
+        return {
+            **self.estadisticas,
+            'memoria_por_formato': {etiqueta: {'tareas': memoria['tareas'], 'pico_crecimiento_mb': round(memoria['pico_mb'], 1),
+                                               'crecimiento_medio_mb': round(memoria['suma_pico_mb'] / memoria['tareas'], 1)}
+                                    for etiqueta, memoria in self.memoria_por_etiqueta.items()},
+        }